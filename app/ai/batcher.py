@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Set, Tuple
+
+
+class GradingBatcher:
+    """
+    Groups concurrent grading requests that share a key (the same question) into a single call.
+
+    The first request for a key opens a batching window of `window_ms` milliseconds. Every request
+    for the same key arriving inside the window joins the batch, which is flushed when the window
+    closes or as soon as it holds `max_size` items. `grade_batch(key, items)` runs in the default
+    executor (it makes a blocking HTTP call) and must return one result per item, in order; each
+    waiting caller receives its own result.
+
+    All bookkeeping happens on the event loop thread, so no locking is needed. The event loop only
+    keeps weak references to tasks, so running batches are held in `_tasks` until they finish.
+    """
+
+    def __init__(
+        self,
+        window_ms: int,
+        max_size: int,
+        grade_batch: Callable[[Hashable, List[Dict[str, Any]]], List[Any]],
+    ):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.grade_batch = grade_batch
+        self._pending: Dict[Hashable, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, item: Dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+        if len(batch) >= self.max_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.ensure_future(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self, key: Hashable, batch: List[Tuple[Dict[str, Any], asyncio.Future]]
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(None, self.grade_batch, key, items)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Expected {len(items)} grading results, received {len(results)}"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,185 @@
+import json
+from typing import Any, Dict, Iterable, List, Set
+from sqlalchemy.orm import Session
+from app.models import GradingResult
+from app.params import AI_MODEL, DELETED
+from database import SessionLocal
+
+
+GRADING_FIELDS = (
+    "rating",
+    "explanation",
+    "answer_evaluation",
+    "area_of_improvement",
+    "area_of_focus",
+    "correct_answer",
+    "feedback",
+)
+
+
+def to_rating(value: Any) -> float:
+    """
+    The function `to_rating` converts the rating returned by the AI model into a float. Missing or
+    non numeric ratings are stored as 0.
+    """
+    if value is None:
+        return 0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def as_text(value: Any):
+    """
+    The function `as_text` keeps text fields as they are and serialises the lists or objects the AI
+    model sometimes returns in their place.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def save_grading_results(
+    db: Session,
+    user_response_id: int,
+    evaluations: Iterable[Dict[str, Any]],
+    created_by_id: int,
+    user_id: int = None,
+    prompt_versions: Dict[int, int] = None,
+    model: str = AI_MODEL,
+) -> List[GradingResult]:
+    """
+    This function stores one `GradingResult` row per evaluated question of a user response. The rows
+    are only added to the session, the caller commits them together with the user response.
+
+    :param evaluations: The parsed AI evaluations, each one carrying a `question_id` and any of the
+    grading fields (rating, explanation, answer_evaluation, area_of_improvement, area_of_focus,
+    correct_answer, feedback)
+    :param prompt_versions: The prompt version of each graded question, recorded so results can be
+    traced back to the evaluation criteria they were produced under
+    :return: The list of `GradingResult` rows added to the session.
+    """
+    evaluations_by_question = {}
+    for evaluation in evaluations:
+        question_id = evaluation.get("question_id")
+        if question_id is None:
+            continue
+        try:
+            evaluations_by_question[int(question_id)] = evaluation
+        except (TypeError, ValueError):
+            continue
+
+    rows = []
+    for question_id, evaluation in evaluations_by_question.items():
+        area_of_improvement = evaluation.get("area_of_improvement")
+        if isinstance(area_of_improvement, str):
+            area_of_improvement = [area_of_improvement]
+        rows.append(
+            GradingResult(
+                user_response_id=user_response_id,
+                question_id=question_id,
+                user_id=user_id,
+                rating=to_rating(evaluation.get("rating")),
+                explanation=as_text(evaluation.get("explanation")),
+                answer_evaluation=as_text(evaluation.get("answer_evaluation")),
+                area_of_improvement=area_of_improvement,
+                area_of_focus=as_text(evaluation.get("area_of_focus")),
+                correct_answer=as_text(evaluation.get("correct_answer")),
+                feedback=as_text(evaluation.get("feedback")),
+                model=model,
+                prompt_version=(prompt_versions or {}).get(question_id),
+                created_by_id=created_by_id,
+            )
+        )
+    db.add_all(rows)
+    return rows
+
+
+def save_pending_grading_result(
+    user_id: int,
+    question_id: int,
+    rating: float,
+    feedback: str,
+    prompt_version: int = None,
+    model: str = AI_MODEL,
+) -> None:
+    """
+    This function persists an instant-mode evaluation before the attempt has been submitted. The row
+    has no user response yet, `attach_pending_grading_results` links it once the attempt is stored.
+    """
+    db = SessionLocal()
+    try:
+        db.add(
+            GradingResult(
+                user_id=user_id,
+                question_id=question_id,
+                rating=to_rating(rating),
+                feedback=feedback,
+                model=model,
+                prompt_version=prompt_version,
+                created_by_id=user_id,
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def attach_pending_grading_results(
+    db: Session, user_id: int, user_response_id: int, question_ids: Iterable[int]
+) -> Set[int]:
+    """
+    The function `attach_pending_grading_results` links the streamed evaluations of a user to the
+    user response they were produced for. Only the latest evaluation of each question is kept, older
+    ones (the student asked for feedback more than once) are marked as deleted.
+
+    :return: The ids of the questions that already have a grading result attached.
+    """
+    pending = (
+        db.query(GradingResult)
+        .filter(
+            GradingResult.user_id == user_id,
+            GradingResult.user_response_id.is_(None),
+            GradingResult.question_id.in_(list(question_ids)),
+            GradingResult.deleted == DELETED,
+        )
+        .order_by(GradingResult.id)
+        .all()
+    )
+    latest = {}
+    for row in pending:
+        if row.question_id in latest:
+            latest[row.question_id].deleted = True
+        latest[row.question_id] = row
+    for row in latest.values():
+        row.user_response_id = user_response_id
+    return set(latest)
+
+
+def load_grading_results(db: Session, user_response_id: int) -> Dict[int, Dict[str, Any]]:
+    """
+    The function `load_grading_results` reads the grading rows of a user response with a single
+    indexed lookup and returns them keyed by question id. Empty fields are left out so callers can
+    fall back to their own defaults with `dict.get`.
+    """
+    rows = (
+        db.query(GradingResult)
+        .filter(
+            GradingResult.user_response_id == user_response_id,
+            GradingResult.deleted == DELETED,
+        )
+        .all()
+    )
+    results = {}
+    for row in rows:
+        evaluation = {"question_id": row.question_id}
+        for field in GRADING_FIELDS:
+            value = getattr(row, field)
+            if value is not None:
+                evaluation[field] = value
+        results[row.question_id] = evaluation
+    return results
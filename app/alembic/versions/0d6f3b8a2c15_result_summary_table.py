@@ -0,0 +1,57 @@
+"""result_summary table, one precomputed summary per submitted attempt
+
+Revision ID: 0d6f3b8a2c15
+Revises: 2e8b4f6c1a93
+Create Date: 2026-10-19 13:18:44.207356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0d6f3b8a2c15"
+down_revision: Union[str, None] = "2e8b4f6c1a93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The table is also created at application startup, create it here when the migration runs first
+    if not sa.inspect(op.get_bind()).has_table("result_summary"):
+        op.create_table(
+            "result_summary",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+            sa.Column("user_response_id", sa.Integer(), sa.ForeignKey("user_response.id"), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=True),
+            sa.Column("question_paper_id", sa.Integer(), sa.ForeignKey("question_paper.id"), nullable=True),
+            sa.Column("subject_id", sa.Integer(), sa.ForeignKey("subject.id"), nullable=True),
+            sa.Column("year", sa.Integer(), nullable=True),
+            sa.Column("attempted", sa.Integer(), nullable=False),
+            sa.Column("correct", sa.Integer(), nullable=False),
+            sa.Column("wrong", sa.Integer(), nullable=False),
+            sa.Column("score", sa.Float(), nullable=True),
+            sa.Column("time_taken", mysql.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("deleted", sa.SmallInteger(), nullable=False, server_default=sa.text("0")),
+            sa.Column("record_status", sa.SmallInteger(), nullable=False, server_default=sa.text("1")),
+            sa.Column("created_by_id", sa.Integer(), nullable=False),
+            sa.Column("updated_by_id", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_result_summary_id", "result_summary", ["id"])
+        op.create_index(
+            "ix_result_summary_user_response_id",
+            "result_summary",
+            ["user_response_id"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_result_summary_user_response_id", table_name="result_summary")
+    op.drop_index("ix_result_summary_id", table_name="result_summary")
+    op.drop_table("result_summary")
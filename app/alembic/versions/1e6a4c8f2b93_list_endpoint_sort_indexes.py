@@ -0,0 +1,36 @@
+"""indexes backing the sort keys of the keyset-paginated list endpoints
+
+Revision ID: 1e6a4c8f2b93
+Revises: 7d2c9e4b1f60
+Create Date: 2026-10-19 21:02:18.664013
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1e6a4c8f2b93"
+down_revision: Union[str, None] = "7d2c9e4b1f60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /students/list filters on role_id and deleted and sorts by id (the implicit suffix) or email
+    op.create_index("ix_user_role_id_deleted", "user", ["role_id", "deleted"])
+    op.create_index("ix_user_role_id_email", "user", ["role_id", "email"])
+    op.create_index(
+        "ix_subject_deleted_subject_name", "subject", ["deleted", "subject_name"]
+    )
+    # Also serves the distinct years of /question-paper/listyear
+    op.create_index("ix_question_paper_deleted_year", "question_paper", ["deleted", "year"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_question_paper_deleted_year", table_name="question_paper")
+    op.drop_index("ix_subject_deleted_subject_name", table_name="subject")
+    op.drop_index("ix_user_role_id_email", table_name="user")
+    op.drop_index("ix_user_role_id_deleted", table_name="user")
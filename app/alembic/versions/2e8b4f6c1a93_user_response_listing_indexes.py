@@ -0,0 +1,34 @@
+"""indexes backing the keyset-paginated /questions/alluser filters
+
+Revision ID: 2e8b4f6c1a93
+Revises: d7a3c91e2f58
+Create Date: 2026-10-19 12:40:52.016233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2e8b4f6c1a93"
+down_revision: Union[str, None] = "d7a3c91e2f58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_user_response_user_id_id", "user_response", ["user_id", "id"])
+    op.create_index(
+        "ix_user_response_question_paper_id_id",
+        "user_response",
+        ["question_paper_id", "id"],
+    )
+    op.create_index("ix_user_response_created_at", "user_response", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_response_created_at", table_name="user_response")
+    op.drop_index("ix_user_response_question_paper_id_id", table_name="user_response")
+    op.drop_index("ix_user_response_user_id_id", table_name="user_response")
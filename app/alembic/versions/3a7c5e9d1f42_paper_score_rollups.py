@@ -0,0 +1,86 @@
+"""paper_score rollup columns, backfilled from user_response
+
+Revision ID: 3a7c5e9d1f42
+Revises: 8c4e2a6f9b17
+Create Date: 2026-10-19 16:02:44.871530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3a7c5e9d1f42"
+down_revision: Union[str, None] = "8c4e2a6f9b17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCORED_RESPONSES = (
+    "FROM user_response WHERE question_paper_id IS NOT NULL AND user_id IS NOT NULL "
+    "AND total_score IS NOT NULL AND deleted = 0"
+)
+
+
+def upgrade() -> None:
+    op.alter_column("paper_score", "user_id", existing_type=sa.Integer(), nullable=True)
+    op.add_column("paper_score", sa.Column("best_score", sa.Float(), nullable=True))
+    op.add_column("paper_score", sa.Column("latest_score", sa.Float(), nullable=True))
+    op.add_column(
+        "paper_score",
+        sa.Column("attempt_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "paper_score",
+        sa.Column("mean_score", sa.Float(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "paper_score",
+        sa.Column("m2", sa.Float(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "paper_score",
+        sa.Column("student_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+
+    # Nothing wrote paper_score before the rollups, any row left in it is stale
+    op.execute("DELETE FROM paper_score")
+    op.create_unique_constraint(
+        "uq_paper_score_paper_user", "paper_score", ["paper_id", "user_id"]
+    )
+
+    op.execute(
+        "INSERT INTO paper_score (paper_id, user_id, best_score, latest_score, attempt_count, "
+        "mean_score, m2, created_by_id) "
+        "SELECT agg.paper_id, agg.user_id, agg.best_score, latest.total_score, agg.attempt_count, "
+        "agg.mean_score, agg.m2, agg.user_id FROM ("
+        "SELECT question_paper_id AS paper_id, user_id, MAX(total_score) AS best_score, "
+        "COUNT(*) AS attempt_count, AVG(total_score) AS mean_score, "
+        "VAR_POP(total_score) * COUNT(*) AS m2, MAX(id) AS last_id "
+        f"{SCORED_RESPONSES} GROUP BY question_paper_id, user_id"
+        ") agg JOIN user_response latest ON latest.id = agg.last_id"
+    )
+    op.execute(
+        "INSERT INTO paper_score (paper_id, user_id, best_score, latest_score, attempt_count, "
+        "mean_score, m2, student_count, created_by_id) "
+        "SELECT agg.paper_id, NULL, agg.best_score, latest.total_score, agg.attempt_count, "
+        "agg.mean_score, agg.m2, agg.student_count, 1 FROM ("
+        "SELECT question_paper_id AS paper_id, MAX(total_score) AS best_score, "
+        "COUNT(*) AS attempt_count, AVG(total_score) AS mean_score, "
+        "VAR_POP(total_score) * COUNT(*) AS m2, COUNT(DISTINCT user_id) AS student_count, "
+        f"MAX(id) AS last_id {SCORED_RESPONSES} GROUP BY question_paper_id"
+        ") agg JOIN user_response latest ON latest.id = agg.last_id"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM paper_score WHERE user_id IS NULL")
+    op.drop_constraint("uq_paper_score_paper_user", "paper_score", type_="unique")
+    op.drop_column("paper_score", "student_count")
+    op.drop_column("paper_score", "m2")
+    op.drop_column("paper_score", "mean_score")
+    op.drop_column("paper_score", "attempt_count")
+    op.drop_column("paper_score", "latest_score")
+    op.drop_column("paper_score", "best_score")
+    op.alter_column("paper_score", "user_id", existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,135 @@
+"""grading_result table, backfilled from user_response.ai_response
+
+Revision ID: 4c1e7a2b9d01
+Revises:
+Create Date: 2026-10-19 09:12:41.118201
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4c1e7a2b9d01"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    # The table is also created at application startup, create it here when the migration runs first
+    if not sa.inspect(connection).has_table("grading_result"):
+        op.create_table(
+            "grading_result",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+            sa.Column("user_response_id", sa.Integer(), sa.ForeignKey("user_response.id"), nullable=False),
+            sa.Column("question_id", sa.Integer(), sa.ForeignKey("question.id"), nullable=False),
+            sa.Column("rating", sa.Float(), nullable=True),
+            sa.Column("explanation", sa.Text(), nullable=True),
+            sa.Column("answer_evaluation", sa.Text(), nullable=True),
+            sa.Column("area_of_improvement", mysql.JSON(), nullable=True),
+            sa.Column("area_of_focus", sa.Text(), nullable=True),
+            sa.Column("correct_answer", sa.Text(), nullable=True),
+            sa.Column("feedback", sa.Text(), nullable=True),
+            sa.Column("model", sa.String(100), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("deleted", sa.SmallInteger(), nullable=False, server_default=sa.text("0")),
+            sa.Column("record_status", sa.SmallInteger(), nullable=False, server_default=sa.text("1")),
+            sa.Column("created_by_id", sa.Integer(), nullable=False),
+            sa.Column("updated_by_id", sa.Integer(), nullable=True),
+            sa.UniqueConstraint(
+                "user_response_id", "question_id", name="uq_grading_result_response_question"
+            ),
+        )
+        op.create_index("ix_grading_result_id", "grading_result", ["id"])
+        op.create_index("ix_grading_result_question_id", "grading_result", ["question_id"])
+
+    grading_result = sa.table(
+        "grading_result",
+        sa.column("user_response_id"),
+        sa.column("question_id"),
+        sa.column("rating"),
+        sa.column("explanation"),
+        sa.column("answer_evaluation"),
+        sa.column("area_of_improvement", mysql.JSON),
+        sa.column("area_of_focus"),
+        sa.column("correct_answer"),
+        sa.column("model"),
+        sa.column("created_by_id"),
+    )
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            sa.text(
+                "SELECT id, ai_response, created_by_id FROM user_response "
+                "WHERE id > :last_id AND ai_response IS NOT NULL AND NOT EXISTS "
+                "(SELECT 1 FROM grading_result gr WHERE gr.user_response_id = user_response.id) "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not batch:
+            break
+
+        rows = []
+        for user_response_id, ai_response, created_by_id in batch:
+            last_id = user_response_id
+            if isinstance(ai_response, str):
+                try:
+                    ai_response = json.loads(ai_response)
+                except ValueError:
+                    continue
+            if not isinstance(ai_response, list):
+                continue
+            seen = set()
+            for item in ai_response:
+                question_id = item.get("question_id") if isinstance(item, dict) else None
+                if question_id is None or question_id in seen:
+                    continue
+                seen.add(question_id)
+                try:
+                    rating = float(item.get("rating"))
+                except (TypeError, ValueError):
+                    rating = 0
+                area_of_improvement = item.get("area_of_improvement")
+                if isinstance(area_of_improvement, str):
+                    area_of_improvement = [area_of_improvement]
+                text_fields = {
+                    field: item.get(field)
+                    for field in (
+                        "explanation",
+                        "answer_evaluation",
+                        "area_of_focus",
+                        "correct_answer",
+                    )
+                }
+                for field, value in text_fields.items():
+                    if value is not None and not isinstance(value, str):
+                        text_fields[field] = json.dumps(value, ensure_ascii=False)
+                rows.append(
+                    {
+                        "user_response_id": user_response_id,
+                        "question_id": question_id,
+                        "rating": rating,
+                        "area_of_improvement": area_of_improvement,
+                        **text_fields,
+                        "model": "gpt-4o",
+                        "created_by_id": created_by_id,
+                    }
+                )
+        if rows:
+            op.bulk_insert(grading_result, rows)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_grading_result_question_id", table_name="grading_result")
+    op.drop_index("ix_grading_result_id", table_name="grading_result")
+    op.drop_table("grading_result")
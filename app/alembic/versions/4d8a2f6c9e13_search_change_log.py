@@ -0,0 +1,60 @@
+"""search_change log of the question search index, filled by triggers
+
+Revision ID: 4d8a2f6c9e13
+Revises: 9e3b7d1c5a24
+Create Date: 2026-10-19 23:18:52.604731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4d8a2f6c9e13"
+down_revision: Union[str, None] = "9e3b7d1c5a24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows whose id is logged for every action, as in app.questions.searchIndex.search_change_triggers
+LOGGED = {
+    "question_paper": {"INSERT": ["NEW"], "UPDATE": ["NEW"], "DELETE": ["OLD"]},
+    "question": {"INSERT": ["NEW"], "UPDATE": ["NEW"], "DELETE": ["OLD"]},
+    "option": {"INSERT": ["NEW"], "UPDATE": ["OLD", "NEW"], "DELETE": ["OLD"]},
+}
+
+
+def upgrade() -> None:
+    # The table and its triggers are also created at application startup, create them here when the
+    # migration runs first
+    if sa.inspect(op.get_bind()).has_table("search_change"):
+        return
+    op.create_table(
+        "search_change",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("table_name", sa.String(20), nullable=False),
+        sa.Column("row_id", sa.Integer(), nullable=False),
+        sa.Column("question_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+    op.create_index("ix_search_change_created_at", "search_change", ["created_at"])
+    for table, actions in LOGGED.items():
+        for action, rows in actions.items():
+            inserts = " ".join(
+                "INSERT INTO search_change (table_name, row_id, question_id) VALUES "
+                f"('{table}', {row}.id, {f'{row}.question_id' if table == 'option' else 'NULL'});"
+                for row in rows
+            )
+            op.execute(
+                f"CREATE TRIGGER search_change_{table}_{action.lower()} AFTER {action} ON `{table}` "
+                f"FOR EACH ROW BEGIN {inserts} END"
+            )
+
+
+def downgrade() -> None:
+    for table, actions in LOGGED.items():
+        for action in actions:
+            op.execute(f"DROP TRIGGER IF EXISTS search_change_{table}_{action.lower()}")
+    op.drop_index("ix_search_change_created_at", table_name="search_change")
+    op.drop_table("search_change")
@@ -0,0 +1,65 @@
+"""question.path and question.depth, the materialized path of the question hierarchy
+
+Revision ID: 5f1d8c2a7b36
+Revises: 0d6f3b8a2c15
+Create Date: 2026-10-19 14:05:37.482910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5f1d8c2a7b36"
+down_revision: Union[str, None] = "0d6f3b8a2c15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match PATH_SEGMENT_WIDTH in app/questions/tree.py
+PATH_SEGMENT_WIDTH = 10
+
+
+def upgrade() -> None:
+    op.add_column("question", sa.Column("path", sa.String(255), nullable=True))
+    op.add_column(
+        "question",
+        sa.Column("depth", sa.SmallInteger(), nullable=False, server_default=sa.text("0")),
+    )
+
+    connection = op.get_bind()
+    connection.execute(
+        sa.text(
+            "UPDATE question SET path = CONCAT(LPAD(id, :width, '0'), '/'), depth = 0 "
+            "WHERE parent_id IS NULL"
+        ),
+        {"width": PATH_SEGMENT_WIDTH},
+    )
+    # One level of the hierarchy per pass, until no child is left without a path
+    while True:
+        result = connection.execute(
+            sa.text(
+                "UPDATE question child JOIN question parent ON child.parent_id = parent.id "
+                "SET child.path = CONCAT(parent.path, LPAD(child.id, :width, '0'), '/'), "
+                "child.depth = parent.depth + 1 "
+                "WHERE child.path IS NULL AND parent.path IS NOT NULL"
+            ),
+            {"width": PATH_SEGMENT_WIDTH},
+        )
+        if not result.rowcount:
+            break
+
+    op.create_index("ix_question_paper_id_path", "question", ["paper_id", "path"])
+    op.create_index(
+        "ix_question_paper_ordering",
+        "question",
+        ["paper_id", "question_number", "subquestion_label", "order"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_question_paper_ordering", table_name="question")
+    op.drop_index("ix_question_paper_id_path", table_name="question")
+    op.drop_column("question", "depth")
+    op.drop_column("question", "path")
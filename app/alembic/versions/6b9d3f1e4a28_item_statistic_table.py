@@ -0,0 +1,49 @@
+"""item_statistic table for the scheduled item analysis
+
+Revision ID: 6b9d3f1e4a28
+Revises: 3a7c5e9d1f42
+Create Date: 2026-10-19 17:10:18.290457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6b9d3f1e4a28"
+down_revision: Union[str, None] = "3a7c5e9d1f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The table is also created at application startup, create it here when the migration runs first
+    if not sa.inspect(op.get_bind()).has_table("item_statistic"):
+        op.create_table(
+            "item_statistic",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+            sa.Column("question_id", sa.Integer(), sa.ForeignKey("question.id"), nullable=False, unique=True),
+            sa.Column("paper_id", sa.Integer(), sa.ForeignKey("question_paper.id"), nullable=False),
+            sa.Column("response_count", sa.Integer(), nullable=False),
+            sa.Column("p_value", sa.Float(), nullable=True),
+            sa.Column("point_biserial", sa.Float(), nullable=True),
+            sa.Column("flags", mysql.JSON(), nullable=True),
+            sa.Column("computed_at", sa.DateTime(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("deleted", sa.SmallInteger(), nullable=False, server_default=sa.text("0")),
+            sa.Column("record_status", sa.SmallInteger(), nullable=False, server_default=sa.text("1")),
+            sa.Column("created_by_id", sa.Integer(), nullable=False),
+            sa.Column("updated_by_id", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_item_statistic_id", "item_statistic", ["id"])
+        op.create_index("ix_item_statistic_paper_id", "item_statistic", ["paper_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_item_statistic_paper_id", table_name="item_statistic")
+    op.drop_index("ix_item_statistic_id", table_name="item_statistic")
+    op.drop_table("item_statistic")
@@ -0,0 +1,158 @@
+"""move Stripe payload snapshots to the compressed stripe_payload table
+
+Revision ID: 7d2c9e4b1f60
+Revises: f3b8d6a2c517
+Create Date: 2026-10-19 20:31:47.582904
+
+"""
+import json
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2c9e4b1f60"
+down_revision: Union[str, None] = "f3b8d6a2c517"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+# (table, column, kind) of every snapshot moved out of the payment tables
+PAYLOAD_COLUMNS = (
+    ("payment_history", "checkout_detail", "checkout_session"),
+    ("payment_history", "payment_intent_detail", "payment_intent"),
+    ("invoice", "invoice_detail", "invoice"),
+)
+
+
+def load_json(value):
+    # The payment columns hold json.dumps output stored in a JSON column, so decode until an object
+    while isinstance(value, (str, bytes)):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    # The table is also created at application startup, create it here when the migration runs first
+    if not sa.inspect(connection).has_table("stripe_payload"):
+        op.create_table(
+            "stripe_payload",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+            sa.Column("owner_table", sa.String(50), nullable=False),
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            sa.Column("kind", sa.String(50), nullable=False),
+            sa.Column("stripe_object_id", sa.String(255), nullable=True),
+            sa.Column("codec", sa.String(10), nullable=False, server_default=sa.text("'zlib'")),
+            sa.Column("payload", mysql.MEDIUMBLOB(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.UniqueConstraint("owner_table", "owner_id", "kind", name="uq_stripe_payload_owner_kind"),
+        )
+        op.create_index("ix_stripe_payload_id", "stripe_payload", ["id"])
+    stripe_payload = sa.table(
+        "stripe_payload",
+        sa.column("owner_table"),
+        sa.column("owner_id"),
+        sa.column("kind"),
+        sa.column("stripe_object_id"),
+        sa.column("codec"),
+        sa.column("payload"),
+    )
+
+    # payment_history.invoice_detail only ever held the id of the Stripe invoice
+    op.add_column(
+        "payment_history", sa.Column("stripe_invoice_id", sa.String(255), nullable=True)
+    )
+    op.execute(
+        "UPDATE payment_history SET stripe_invoice_id = JSON_UNQUOTE(invoice_detail) "
+        "WHERE JSON_TYPE(invoice_detail) = 'STRING'"
+    )
+    op.create_index(
+        "ix_payment_history_stripe_invoice_id", "payment_history", ["stripe_invoice_id"]
+    )
+
+    for table, column, kind in PAYLOAD_COLUMNS:
+        last_id = 0
+        while True:
+            batch = connection.execute(
+                sa.text(
+                    f"SELECT id, {column} FROM {table} "
+                    f"WHERE id > :last_id AND {column} IS NOT NULL ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).fetchall()
+            if not batch:
+                break
+            rows = []
+            for owner_id, value in batch:
+                last_id = owner_id
+                payload = load_json(value)
+                if payload is None:
+                    continue
+                rows.append(
+                    {
+                        "owner_table": table,
+                        "owner_id": owner_id,
+                        "kind": kind,
+                        "stripe_object_id": (
+                            payload.get("id") if isinstance(payload, dict) else None
+                        ),
+                        "codec": "zlib",
+                        "payload": zlib.compress(
+                            json.dumps(payload, separators=(",", ":")).encode("utf-8"), 6
+                        ),
+                    }
+                )
+            if rows:
+                op.bulk_insert(stripe_payload, rows)
+
+    for table, column, _ in PAYLOAD_COLUMNS:
+        op.drop_column(table, column)
+    op.drop_column("payment_history", "invoice_detail")
+
+
+def downgrade() -> None:
+    op.add_column("payment_history", sa.Column("invoice_detail", mysql.JSON(), nullable=True))
+    for table, column, _ in PAYLOAD_COLUMNS:
+        op.add_column(table, sa.Column(column, mysql.JSON(), nullable=True))
+    op.execute(
+        "UPDATE payment_history SET invoice_detail = JSON_QUOTE(stripe_invoice_id) "
+        "WHERE stripe_invoice_id IS NOT NULL"
+    )
+
+    connection = op.get_bind()
+    for table, column, kind in PAYLOAD_COLUMNS:
+        last_id = 0
+        while True:
+            batch = connection.execute(
+                sa.text(
+                    "SELECT id, owner_id, payload FROM stripe_payload "
+                    "WHERE owner_table = :table AND kind = :kind AND id > :last_id "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"table": table, "kind": kind, "last_id": last_id, "limit": BATCH_SIZE},
+            ).fetchall()
+            if not batch:
+                break
+            for payload_id, owner_id, payload in batch:
+                last_id = payload_id
+                value = zlib.decompress(payload).decode("utf-8")
+                if table == "payment_history":
+                    # Restore the json.dumps string these columns were written with
+                    value = json.dumps(value)
+                connection.execute(
+                    sa.text(f"UPDATE {table} SET {column} = :value WHERE id = :owner_id"),
+                    {"value": value, "owner_id": owner_id},
+                )
+
+    op.drop_index("ix_payment_history_stripe_invoice_id", table_name="payment_history")
+    op.drop_column("payment_history", "stripe_invoice_id")
+    op.drop_index("ix_stripe_payload_id", table_name="stripe_payload")
+    op.drop_table("stripe_payload")
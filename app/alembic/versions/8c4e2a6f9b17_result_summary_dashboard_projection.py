@@ -0,0 +1,126 @@
+"""result_summary (user_id, created_at) index for the student dashboard, backfilled for old attempts
+
+Revision ID: 8c4e2a6f9b17
+Revises: 5f1d8c2a7b36
+Create Date: 2026-10-19 15:21:09.603145
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4e2a6f9b17"
+down_revision: Union[str, None] = "5f1d8c2a7b36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def answer_option_id(answer):
+    # Same rules as app.questions.summary.answer_option_id
+    if isinstance(answer, list):
+        answer = answer[0] if answer else None
+    if isinstance(answer, int):
+        return answer
+    if isinstance(answer, str) and answer.isdigit():
+        return int(answer)
+    return None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    indexes = sa.inspect(connection).get_indexes("result_summary")
+    # A table created from the current model at application startup already has the index
+    if "ix_result_summary_user_id_created_at" not in {index["name"] for index in indexes}:
+        op.create_index(
+            "ix_result_summary_user_id_created_at", "result_summary", ["user_id", "created_at"]
+        )
+
+    result_summary = sa.table(
+        "result_summary",
+        sa.column("user_response_id"),
+        sa.column("user_id"),
+        sa.column("question_paper_id"),
+        sa.column("subject_id"),
+        sa.column("year"),
+        sa.column("attempted"),
+        sa.column("correct"),
+        sa.column("wrong"),
+        sa.column("score"),
+        sa.column("time_taken", mysql.JSON),
+        sa.column("created_at"),
+        sa.column("created_by_id"),
+    )
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            sa.text(
+                "SELECT ur.id, ur.user_id, ur.question_paper_id, ur.subject_id, ur.year, "
+                "ur.user_response, ur.total_score, ur.created_at, ur.created_by_id "
+                "FROM user_response ur LEFT JOIN result_summary rs ON rs.user_response_id = ur.id "
+                "WHERE ur.id > :last_id AND rs.id IS NULL ORDER BY ur.id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        parsed = {}
+        option_ids = set()
+        for row in batch:
+            response_json = row.user_response
+            if isinstance(response_json, str):
+                try:
+                    response_json = json.loads(response_json)
+                except ValueError:
+                    response_json = {}
+            if not isinstance(response_json, dict):
+                response_json = {}
+            responses = response_json.get("responses") or []
+            chosen = [answer_option_id(r.get("answer")) for r in responses if isinstance(r, dict)]
+            option_ids.update(option_id for option_id in chosen if option_id is not None)
+            parsed[row.id] = (response_json, responses, chosen)
+
+        is_correct = {}
+        if option_ids:
+            is_correct = dict(
+                connection.execute(
+                    sa.text("SELECT id, is_correct FROM `option` WHERE id IN :ids").bindparams(
+                        sa.bindparam("ids", expanding=True)
+                    ),
+                    {"ids": list(option_ids)},
+                ).fetchall()
+            )
+
+        rows = []
+        for row in batch:
+            response_json, responses, chosen = parsed[row.id]
+            answered = [is_correct[o] for o in chosen if o in is_correct]
+            rows.append(
+                {
+                    "user_response_id": row.id,
+                    "user_id": row.user_id,
+                    "question_paper_id": row.question_paper_id,
+                    "subject_id": row.subject_id,
+                    "year": row.year,
+                    "attempted": len(responses),
+                    "correct": sum(1 for correct in answered if correct),
+                    "wrong": sum(1 for correct in answered if not correct),
+                    "score": row.total_score,
+                    "time_taken": response_json.get("time"),
+                    "created_at": row.created_at,
+                    "created_by_id": row.created_by_id,
+                }
+            )
+        op.bulk_insert(result_summary, rows)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_result_summary_user_id_created_at", table_name="result_summary")
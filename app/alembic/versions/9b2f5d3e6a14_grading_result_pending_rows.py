@@ -0,0 +1,49 @@
+"""grading_result rows for streamed evaluations not yet attached to a user response
+
+Revision ID: 9b2f5d3e6a14
+Revises: 4c1e7a2b9d01
+Create Date: 2026-10-19 10:03:27.540918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b2f5d3e6a14"
+down_revision: Union[str, None] = "4c1e7a2b9d01"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = sa.inspect(op.get_bind()).get_columns("grading_result")
+    if "user_id" in {column["name"] for column in columns}:
+        # grading_result was created from the current model at application startup
+        return
+    op.alter_column(
+        "grading_result", "user_response_id", existing_type=sa.Integer(), nullable=True
+    )
+    op.add_column("grading_result", sa.Column("user_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "fk_grading_result_user_id", "grading_result", "user", ["user_id"], ["id"]
+    )
+    op.create_index(
+        "ix_grading_result_user_question", "grading_result", ["user_id", "question_id"]
+    )
+    op.execute(
+        "UPDATE grading_result gr JOIN user_response ur ON ur.id = gr.user_response_id "
+        "SET gr.user_id = ur.user_id"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM grading_result WHERE user_response_id IS NULL")
+    op.drop_index("ix_grading_result_user_question", table_name="grading_result")
+    op.drop_constraint("fk_grading_result_user_id", "grading_result", type_="foreignkey")
+    op.drop_column("grading_result", "user_id")
+    op.alter_column(
+        "grading_result", "user_response_id", existing_type=sa.Integer(), nullable=False
+    )
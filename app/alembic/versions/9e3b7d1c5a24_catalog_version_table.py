@@ -0,0 +1,49 @@
+"""catalog_version table shared by the catalog caches of all processes
+
+Revision ID: 9e3b7d1c5a24
+Revises: b5e9f2a7c064
+Create Date: 2026-10-19 22:41:07.518246
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9e3b7d1c5a24"
+down_revision: Union[str, None] = "b5e9f2a7c064"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The table is also created at application startup, create it here when the migration runs first
+    if not sa.inspect(op.get_bind()).has_table("catalog_version"):
+        catalog_version = op.create_table(
+            "catalog_version",
+            sa.Column("namespace", sa.String(50), primary_key=True, nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        )
+    else:
+        catalog_version = sa.table(
+            "catalog_version", sa.column("namespace", sa.String), sa.column("version", sa.Integer)
+        )
+    # Seed every namespace, so concurrent first writes only ever update an existing row
+    existing = {
+        row.namespace
+        for row in op.get_bind().execute(sa.select(catalog_version.c.namespace))
+    }
+    op.bulk_insert(
+        catalog_version,
+        [
+            {"namespace": namespace, "version": 0}
+            for namespace in ("subject", "question_paper", "section")
+            if namespace not in existing
+        ],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_version")
@@ -0,0 +1,35 @@
+"""index user.stripe_id, now written through at checkout
+
+Revision ID: a8d5e2f1c379
+Revises: e4a1b7c3d962
+Create Date: 2026-10-19 19:40:26.914382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a8d5e2f1c379"
+down_revision: Union[str, None] = "e4a1b7c3d962"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_user_stripe_id", "user", ["stripe_id"])
+    # Payments already record the customer of each user
+    op.execute(
+        "UPDATE `user` u JOIN ("
+        "SELECT created_by_id, MAX(id) AS id FROM payment_history "
+        "WHERE customer_id IS NOT NULL GROUP BY created_by_id"
+        ") latest ON latest.created_by_id = u.id "
+        "JOIN payment_history ph ON ph.id = latest.id "
+        "SET u.stripe_id = ph.customer_id WHERE u.stripe_id IS NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_stripe_id", table_name="user")
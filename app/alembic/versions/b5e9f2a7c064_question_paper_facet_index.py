@@ -0,0 +1,30 @@
+"""covering index for the (subject, year) question paper facets
+
+Revision ID: b5e9f2a7c064
+Revises: 1e6a4c8f2b93
+Create Date: 2026-10-19 21:26:40.193577
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b5e9f2a7c064"
+down_revision: Union[str, None] = "1e6a4c8f2b93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_question_paper_deleted_subject_year",
+        "question_paper",
+        ["deleted", "subject_id", "year"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_question_paper_deleted_subject_year", table_name="question_paper")
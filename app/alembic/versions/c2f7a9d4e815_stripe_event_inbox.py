@@ -0,0 +1,54 @@
+"""stripe_event inbox for webhook events processed in the background
+
+Revision ID: c2f7a9d4e815
+Revises: 6b9d3f1e4a28
+Create Date: 2026-10-19 18:24:51.730664
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c2f7a9d4e815"
+down_revision: Union[str, None] = "6b9d3f1e4a28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The table is also created at application startup, create it here when the migration runs first
+    if not sa.inspect(op.get_bind()).has_table("stripe_event"):
+        op.create_table(
+            "stripe_event",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+            sa.Column("event_id", sa.String(255), nullable=False),
+            sa.Column("event_type", sa.String(100), nullable=False),
+            sa.Column("payload", mysql.JSON(), nullable=False),
+            sa.Column("stripe_created_at", sa.DateTime(), nullable=True),
+            sa.Column("status", sa.String(20), nullable=False, server_default=sa.text("'pending'")),
+            sa.Column("attempts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+            sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+            sa.Column("locked_at", sa.DateTime(), nullable=True),
+            sa.Column("processed_at", sa.DateTime(), nullable=True),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("deleted", sa.SmallInteger(), nullable=False, server_default=sa.text("0")),
+            sa.Column("record_status", sa.SmallInteger(), nullable=False, server_default=sa.text("1")),
+        )
+        op.create_index("ix_stripe_event_id", "stripe_event", ["id"])
+        op.create_index("ix_stripe_event_event_id", "stripe_event", ["event_id"])
+        op.create_index(
+            "ix_stripe_event_status_next_attempt", "stripe_event", ["status", "next_attempt_at"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_stripe_event_status_next_attempt", table_name="stripe_event")
+    op.drop_index("ix_stripe_event_event_id", table_name="stripe_event")
+    op.drop_index("ix_stripe_event_id", table_name="stripe_event")
+    op.drop_table("stripe_event")
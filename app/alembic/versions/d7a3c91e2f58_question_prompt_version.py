@@ -0,0 +1,35 @@
+"""prompt_version on question and grading_result
+
+Revision ID: d7a3c91e2f58
+Revises: 9b2f5d3e6a14
+Create Date: 2026-10-19 11:21:09.377604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d7a3c91e2f58"
+down_revision: Union[str, None] = "9b2f5d3e6a14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "question",
+        sa.Column(
+            "prompt_version", sa.Integer(), nullable=False, server_default=sa.text("1")
+        ),
+    )
+    op.add_column(
+        "grading_result", sa.Column("prompt_version", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("grading_result", "prompt_version")
+    op.drop_column("question", "prompt_version")
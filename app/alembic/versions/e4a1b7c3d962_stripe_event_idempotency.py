@@ -0,0 +1,39 @@
+"""unique stripe_event.event_id and indexed Stripe ids for idempotent webhook handling
+
+Revision ID: e4a1b7c3d962
+Revises: c2f7a9d4e815
+Create Date: 2026-10-19 19:02:13.558071
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a1b7c3d962"
+down_revision: Union[str, None] = "c2f7a9d4e815"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the first delivery of every event
+    op.execute(
+        "DELETE duplicate FROM stripe_event duplicate JOIN stripe_event kept "
+        "ON kept.event_id = duplicate.event_id AND kept.id < duplicate.id"
+    )
+    op.drop_index("ix_stripe_event_event_id", table_name="stripe_event")
+    op.create_index("ix_stripe_event_event_id", "stripe_event", ["event_id"], unique=True)
+    op.create_index(
+        "ix_payment_history_stripe_checkout_id", "payment_history", ["stripe_checkout_id"]
+    )
+    op.create_index("ix_invoice_stripe_invoice_id", "invoice", ["stripe_invoice_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_invoice_stripe_invoice_id", table_name="invoice")
+    op.drop_index("ix_payment_history_stripe_checkout_id", table_name="payment_history")
+    op.drop_index("ix_stripe_event_event_id", table_name="stripe_event")
+    op.create_index("ix_stripe_event_event_id", "stripe_event", ["event_id"])
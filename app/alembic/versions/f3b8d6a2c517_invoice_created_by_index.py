@@ -0,0 +1,30 @@
+"""index invoice.created_by_id for the billing page
+
+Revision ID: f3b8d6a2c517
+Revises: a8d5e2f1c379
+Create Date: 2026-10-19 20:05:12.407318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b8d6a2c517"
+down_revision: Union[str, None] = "a8d5e2f1c379"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_invoice_created_by_id_payment_date",
+        "invoice",
+        ["created_by_id", "payment_date"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_invoice_created_by_id_payment_date", table_name="invoice")
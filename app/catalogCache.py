@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List
+from cachetools import TTLCache
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session
+from app.models import CatalogVersion
+
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2000"))
+
+SUBJECTS = "subject"
+QUESTION_PAPERS = "question_paper"
+SECTIONS = "section"
+CATALOG_NAMESPACES = (SUBJECTS, QUESTION_PAPERS, SECTIONS)
+# Versions the correct options and marks that result views are rendered with
+ANSWER_KEYS = "answer_key"
+
+# Entries are keyed by the version of their namespace at the time they were read. The versions
+# live in the catalog_version table, so a write in any application process retires the entries of
+# every process at once; each read costs one primary key lookup of the version.
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL_SECONDS)
+catalog_lock = threading.Lock()
+
+
+def catalog_version(db: Session, namespace: str) -> int:
+    version = (
+        db.query(CatalogVersion.version)
+        .filter(CatalogVersion.namespace == namespace)
+        .scalar()
+    )
+    return version or 0
+
+
+def bump_catalog(db: Session, *namespaces: str) -> None:
+    """
+    Called before a write to the catalog is committed, in the same transaction, so the new version
+    becomes visible exactly when the write does; the next read of the namespace goes to the
+    database.
+    """
+    for namespace in namespaces:
+        updated = db.execute(
+            update(CatalogVersion)
+            .where(CatalogVersion.namespace == namespace)
+            .values(version=CatalogVersion.version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            # The migration seeds every namespace; a table created at startup starts empty
+            db.add(CatalogVersion(namespace=namespace, version=1))
+
+
+def cached_catalog(
+    db: Session, namespace: str, key: Hashable, load: Callable[[], Any]
+) -> Any:
+    """
+    The function `cached_catalog` returns the cached result of `load` for `key`, or calls it and
+    caches the result. The version is read before loading, so a result loaded while a write commits
+    is stored under the old version and never served.
+
+    `load` must return plain data (see `as_dicts`), not ORM objects bound to a session.
+    """
+    cache_key = (namespace, catalog_version(db, namespace), key)
+    with catalog_lock:
+        if cache_key in catalog_cache:
+            return catalog_cache[cache_key]
+    value = load()
+    with catalog_lock:
+        catalog_cache[cache_key] = value
+    return value
+
+
+def as_dicts(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Copies the column values of ORM objects into dictionaries, the same fields FastAPI returns for
+    the objects themselves.
+    """
+    return [
+        {attr.key: getattr(row, attr.key) for attr in inspect(row).mapper.column_attrs}
+        for row in rows
+    ]
@@ -0,0 +1,170 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models import ItemStatistic, Options, Question, UserResponse
+from app.params import (
+    DELETED,
+    ITEM_ANALYSIS_MIN_RESPONSES,
+    ITEM_EASY_P_VALUE,
+    ITEM_HARD_P_VALUE,
+    ITEM_MIN_DISCRIMINATION,
+)
+from app.questions.summary import answer_option_id
+from database import SessionLocal
+
+STREAM_BATCH_SIZE = 500
+
+
+def item_statistics(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The function `item_statistics` computes the classical statistics of every item (column) of a
+    response matrix with one row per attempt and 1 for a correct answer, 0 otherwise.
+
+    :return: The p-value (proportion of correct answers) of each item and its corrected point-biserial
+    correlation, the correlation between the item and the total score of the other items. Items whose
+    correlation is undefined (everyone or no one answered correctly) get NaN.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if not matrix.size:
+        return np.full(matrix.shape[1], np.nan), np.full(matrix.shape[1], np.nan)
+    p_values = matrix.mean(axis=0)
+    rest = matrix.sum(axis=1, keepdims=True) - matrix
+    item_deviation = matrix - p_values
+    rest_deviation = rest - rest.mean(axis=0)
+    covariance = (item_deviation * rest_deviation).sum(axis=0)
+    spread = np.sqrt((item_deviation**2).sum(axis=0) * (rest_deviation**2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        point_biserial = np.where(spread > 0, covariance / spread, np.nan)
+    return p_values, point_biserial
+
+
+def item_flags(p_value: float, point_biserial: float, response_count: int) -> List[str]:
+    if response_count < ITEM_ANALYSIS_MIN_RESPONSES:
+        return []
+    flags = []
+    if p_value > ITEM_EASY_P_VALUE:
+        flags.append("too_easy")
+    if p_value < ITEM_HARD_P_VALUE:
+        flags.append("too_hard")
+    if not np.isnan(point_biserial) and point_biserial < ITEM_MIN_DISCRIMINATION:
+        flags.append("negative_discrimination")
+    return flags
+
+
+def response_matrix(
+    db: Session, paper_id: int, options: Dict[int, Tuple[int, bool]], columns: Dict[int, int]
+) -> np.ndarray:
+    """
+    Streams the user responses of a paper in batches and scores them into a response matrix. Only
+    the chosen option ids are kept from each submission, so the JSON documents never pile up in
+    memory; an unanswered item counts as incorrect.
+    """
+    rows = []
+    responses = (
+        db.query(UserResponse.user_response)
+        .filter(
+            UserResponse.question_paper_id == paper_id,
+            UserResponse.deleted == DELETED,
+        )
+        .order_by(UserResponse.id)
+        .execution_options(stream_results=True)
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+    for (user_response,) in responses:
+        if isinstance(user_response, str):
+            try:
+                user_response = json.loads(user_response)
+            except ValueError:
+                continue
+        if not isinstance(user_response, dict):
+            continue
+        row = np.zeros(len(columns), dtype=np.uint8)
+        for response in user_response.get("responses") or []:
+            if not isinstance(response, dict):
+                continue
+            option = options.get(answer_option_id(response.get("answer")))
+            if option is None:
+                continue
+            question_id, is_correct = option
+            column = columns.get(question_id)
+            if column is not None and str(response.get("id")) == str(question_id):
+                row[column] = 1 if is_correct else 0
+        rows.append(row)
+    if not rows:
+        return np.zeros((0, len(columns)), dtype=np.uint8)
+    return np.vstack(rows)
+
+
+def analyse_paper(db: Session, paper_id: int) -> List[ItemStatistic]:
+    """
+    This function recomputes the item statistics of the option questions of one paper and replaces
+    its stored `ItemStatistic` rows. The caller commits.
+    """
+    options = {
+        option_id: (question_id, bool(is_correct))
+        for option_id, question_id, is_correct in db.query(
+            Options.id, Options.question_id, Options.is_correct
+        )
+        .join(Question, Question.id == Options.question_id)
+        .filter(Question.paper_id == paper_id, Question.deleted == DELETED)
+        .all()
+    }
+    question_ids = sorted({question_id for question_id, _ in options.values()})
+    columns = {question_id: index for index, question_id in enumerate(question_ids)}
+    matrix = response_matrix(db, paper_id, options, columns)
+    p_values, point_biserial = item_statistics(matrix)
+
+    db.query(ItemStatistic).filter(ItemStatistic.paper_id == paper_id).delete(
+        synchronize_session=False
+    )
+    computed_at = datetime.now()
+    response_count = matrix.shape[0]
+    rows = []
+    for question_id, index in columns.items():
+        p_value = float(p_values[index]) if response_count else None
+        correlation = point_biserial[index]
+        rows.append(
+            ItemStatistic(
+                question_id=question_id,
+                paper_id=paper_id,
+                response_count=response_count,
+                p_value=p_value,
+                point_biserial=None if np.isnan(correlation) else float(correlation),
+                flags=item_flags(p_value or 0, correlation, response_count),
+                computed_at=computed_at,
+                created_by_id=1,
+            )
+        )
+    db.add_all(rows)
+    return rows
+
+
+def run_item_analysis(paper_ids: Optional[List[int]] = None) -> None:
+    """
+    The scheduled item analysis job. Every paper with submissions is analysed and committed on its
+    own, so one failing paper does not discard the statistics of the others.
+    """
+    db = SessionLocal()
+    try:
+        if paper_ids is None:
+            paper_ids = [
+                paper_id
+                for (paper_id,) in db.query(UserResponse.question_paper_id)
+                .filter(
+                    UserResponse.question_paper_id.isnot(None),
+                    UserResponse.deleted == DELETED,
+                )
+                .distinct()
+                .all()
+            ]
+        for paper_id in paper_ids:
+            try:
+                analyse_paper(db, paper_id)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Item analysis failed for paper {paper_id}: {e}")
+    finally:
+        db.close()
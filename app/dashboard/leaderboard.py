@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models import PaperScore
+from app.params import DELETED
+
+LEADERBOARD_TTL_SECONDS = int(os.getenv("LEADERBOARD_TTL_SECONDS", "300"))
+
+
+class PaperDistribution:
+    """
+    The best score of every student of one question paper, kept as a sorted NumPy array with the
+    matching user ids alongside. Percentile ranks are two binary searches, top-N is a slice of the
+    tail and histograms are one `np.histogram` call; a new best score is an O(n) array insert.
+    """
+
+    def __init__(self, best_scores: Dict[int, float]):
+        user_ids = np.fromiter(best_scores.keys(), dtype=np.int64, count=len(best_scores))
+        scores = np.fromiter(best_scores.values(), dtype=np.float64, count=len(best_scores))
+        order = np.argsort(scores, kind="stable")
+        # Replaced as one tuple so readers never see scores and user ids from different updates
+        self.sorted = (scores[order], user_ids[order])
+        self.best_scores = dict(best_scores)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.sorted[0])
+
+    def record(self, user_id: int, score: float) -> None:
+        """
+        Applies a new attempt; only a better score than the student's current best moves them.
+        """
+        previous = self.best_scores.get(user_id)
+        scores, user_ids = self.sorted
+        if previous is not None:
+            if score <= previous:
+                return
+            start = np.searchsorted(scores, previous, side="left")
+            end = np.searchsorted(scores, previous, side="right")
+            index = start + int(np.flatnonzero(user_ids[start:end] == user_id)[0])
+            scores = np.delete(scores, index)
+            user_ids = np.delete(user_ids, index)
+        index = np.searchsorted(scores, score, side="right")
+        self.sorted = (
+            np.insert(scores, index, score),
+            np.insert(user_ids, index, user_id),
+        )
+        self.best_scores[user_id] = score
+
+    def percentile_rank(self, score: float) -> float:
+        """
+        The percentage of students scoring below `score`, counting ties as half.
+        """
+        scores = self.sorted[0]
+        if not len(scores):
+            return 0.0
+        below = np.searchsorted(scores, score, side="left")
+        not_above = np.searchsorted(scores, score, side="right")
+        return float((below + (not_above - below) / 2) * 100 / len(scores))
+
+    def rank(self, score: float) -> int:
+        """
+        The 1-based position of `score`, students with the same score share a rank.
+        """
+        scores = self.sorted[0]
+        return int(len(scores) - np.searchsorted(scores, score, side="right")) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        if limit <= 0:
+            return []
+        scores, user_ids = self.sorted
+        return [
+            (int(user_id), float(score))
+            for user_id, score in zip(user_ids[::-1][:limit], scores[::-1][:limit])
+        ]
+
+    def histogram(
+        self, bins: int, score_range: Optional[Tuple[float, float]] = None
+    ) -> Tuple[List[int], List[float]]:
+        scores = self.sorted[0]
+        if not len(scores):
+            return [0] * bins, []
+        counts, edges = np.histogram(scores, bins=bins, range=score_range)
+        return counts.tolist(), edges.tolist()
+
+
+class Leaderboard:
+    """
+    The in-memory score distributions of every question paper queried so far. A distribution is
+    loaded from the per-student `PaperScore` rollups on first use and updated in place as new
+    attempts are submitted. Distributions are reloaded after `LEADERBOARD_TTL_SECONDS`, so every
+    worker process also picks up the submissions handled by the others.
+    """
+
+    def __init__(self, ttl_seconds: int = LEADERBOARD_TTL_SECONDS):
+        self.ttl = ttl_seconds
+        self._papers: Dict[int, PaperDistribution] = {}
+        self._lock = threading.Lock()
+
+    def distribution(self, db: Session, paper_id: int) -> PaperDistribution:
+        with self._lock:
+            distribution = self._papers.get(paper_id)
+            if distribution is not None and time.monotonic() - distribution.loaded_at < self.ttl:
+                return distribution
+        rows = (
+            db.query(PaperScore.user_id, PaperScore.best_score)
+            .filter(
+                PaperScore.paper_id == paper_id,
+                PaperScore.user_id.isnot(None),
+                PaperScore.best_score.isnot(None),
+                PaperScore.deleted == DELETED,
+            )
+            .all()
+        )
+        distribution = PaperDistribution({user_id: best for user_id, best in rows})
+        with self._lock:
+            self._papers[paper_id] = distribution
+        return distribution
+
+    def record_score(self, paper_id: int, user_id: int, score: Optional[float]) -> None:
+        """
+        Applies a committed attempt to the paper's distribution when it is already loaded; papers
+        not loaded yet read the attempt from the rollups on first use.
+        """
+        if paper_id is None or user_id is None or score is None:
+            return
+        with self._lock:
+            distribution = self._papers.get(paper_id)
+            if distribution is not None:
+                distribution.record(user_id, float(score))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._papers.clear()
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from typing import Iterator, Optional
+import xlsxwriter
+from sqlalchemy.orm import Session
+from app.models import QuestionPaper, ResultSummary, Subject, User
+from app.params import DELETED
+from database import SessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_COLUMNS = [
+    "Result ID",
+    "Student ID",
+    "Student Name",
+    "Email",
+    "Subject",
+    "Paper",
+    "Year",
+    "Attempted",
+    "Correct",
+    "Wrong",
+    "Score",
+    "Time Taken",
+    "Submitted At",
+]
+
+
+def class_results_query(
+    db: Session,
+    subject_id: Optional[int] = None,
+    paper_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """
+    The function `class_results_query` selects one narrow row per submission from the result summaries,
+    with the student, subject and paper names, streamed from a server-side cursor in batches.
+    """
+    query = (
+        db.query(
+            ResultSummary.user_response_id,
+            ResultSummary.user_id,
+            User.name,
+            User.email,
+            Subject.subject_name,
+            QuestionPaper.assessment_specification,
+            ResultSummary.year,
+            ResultSummary.attempted,
+            ResultSummary.correct,
+            ResultSummary.wrong,
+            ResultSummary.score,
+            ResultSummary.time_taken,
+            ResultSummary.created_at,
+        )
+        .outerjoin(User, ResultSummary.user_id == User.id)
+        .outerjoin(Subject, ResultSummary.subject_id == Subject.id)
+        .outerjoin(QuestionPaper, ResultSummary.question_paper_id == QuestionPaper.id)
+        .filter(ResultSummary.deleted == DELETED)
+    )
+    if subject_id is not None:
+        query = query.filter(ResultSummary.subject_id == subject_id)
+    if paper_id is not None:
+        query = query.filter(ResultSummary.question_paper_id == paper_id)
+    if date_from is not None:
+        query = query.filter(ResultSummary.created_at >= date_from)
+    if date_to is not None:
+        query = query.filter(ResultSummary.created_at < date_to + timedelta(days=1))
+    return (
+        query.order_by(ResultSummary.id)
+        .execution_options(stream_results=True)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+
+
+def export_row(row) -> list:
+    time_taken = row.time_taken
+    if time_taken is not None and not isinstance(time_taken, str):
+        time_taken = json.dumps(time_taken)
+    return [
+        row.user_response_id,
+        row.user_id,
+        row.name,
+        row.email,
+        row.subject_name,
+        row.assessment_specification,
+        row.year,
+        row.attempted,
+        row.correct,
+        row.wrong,
+        row.score,
+        time_taken,
+        row.created_at.strftime("%Y-%m-%d %H:%M:%S") if row.created_at else None,
+    ]
+
+
+def export_results_csv(**filters) -> Iterator[str]:
+    """
+    Streams the class results as CSV, one chunk per batch of rows fetched from the cursor.
+    """
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for count, row in enumerate(class_results_query(db, **filters), start=1):
+            writer.writerow(export_row(row))
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def export_results_xlsx(**filters) -> Iterator[bytes]:
+    """
+    Writes the class results to a temporary XLSX file with XlsxWriter in constant memory mode, where
+    every row is flushed to disk as soon as it is written, then streams the file and deletes it.
+    """
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    db = SessionLocal()
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("Results")
+        worksheet.write_row(0, 0, EXPORT_COLUMNS, workbook.add_format({"bold": True}))
+        for row_number, row in enumerate(class_results_query(db, **filters), start=1):
+            worksheet.write_row(row_number, 0, export_row(row))
+        workbook.close()
+        db.close()
+        with open(path, "rb") as file:
+            while True:
+                chunk = file.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        db.close()
+        os.remove(path)
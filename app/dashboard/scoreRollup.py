@@ -0,0 +1,62 @@
+import math
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.models import PaperScore, QuestionPaper
+
+
+def apply_score(rollup: PaperScore, score: float) -> None:
+    """
+    The function `apply_score` folds one attempt into a rollup: best and latest score, attempt count
+    and the running mean and sum of squared deviations (Welford's algorithm), so the variance never
+    needs the earlier attempts.
+    """
+    count = (rollup.attempt_count or 0) + 1
+    mean = rollup.mean_score or 0
+    delta = score - mean
+    mean += delta / count
+    rollup.m2 = (rollup.m2 or 0) + delta * (score - mean)
+    rollup.mean_score = mean
+    rollup.attempt_count = count
+    rollup.latest_score = score
+    if rollup.best_score is None or score > rollup.best_score:
+        rollup.best_score = score
+
+
+def score_std_dev(rollup: PaperScore) -> Optional[float]:
+    if not rollup.attempt_count:
+        return None
+    return math.sqrt(max(rollup.m2 or 0, 0) / rollup.attempt_count)
+
+
+def record_paper_score(
+    db: Session, paper_id: int, user_id: int, score: Optional[float], created_by_id: int
+) -> None:
+    """
+    This function updates the per-student and per-paper rollups of a paper with a new attempt. It is
+    called when the submission is saved and committed together with it.
+
+    The question paper row is locked first, so concurrent submissions for the same paper apply their
+    updates one after the other and never create the same rollup twice.
+    """
+    if paper_id is None or user_id is None or score is None:
+        return
+    db.query(QuestionPaper.id).filter(QuestionPaper.id == paper_id).with_for_update().first()
+    rollups = (
+        db.query(PaperScore)
+        .filter(
+            PaperScore.paper_id == paper_id,
+            (PaperScore.user_id == user_id) | PaperScore.user_id.is_(None),
+        )
+        .all()
+    )
+    student = next((r for r in rollups if r.user_id == user_id), None)
+    paper = next((r for r in rollups if r.user_id is None), None)
+    if paper is None:
+        paper = PaperScore(paper_id=paper_id, user_id=None, created_by_id=created_by_id)
+        db.add(paper)
+    if student is None:
+        student = PaperScore(paper_id=paper_id, user_id=user_id, created_by_id=created_by_id)
+        db.add(student)
+        paper.student_count = (paper.student_count or 0) + 1
+    apply_score(student, float(score))
+    apply_score(paper, float(score))
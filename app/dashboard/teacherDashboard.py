@@ -1,41 +1,90 @@
-import json
+from datetime import date
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette import status
 from app.login.auth import JWTBearer
-from app.models import PaperScore, QuestionPaper, Subject, User, UserResponse
+from app.models import (
+    ItemStatistic,
+    PaperScore,
+    Question,
+    QuestionPaper,
+    ResultSummary,
+    Subject,
+    User,
+)
+from app.dashboard.leaderboard import leaderboard
+from app.dashboard.resultExport import export_results_csv, export_results_xlsx
+from app.dashboard.scoreRollup import score_std_dev
+from app.pagination import ListSpec, PageParams, paginate
 from app.params import DELETED
 from database import get_db
 
 studentsroute = APIRouter(prefix="/students", tags=["students"])
 
 
+STUDENT_LIST = ListSpec(
+    fields={
+        "id": User.id,
+        "name": User.name,
+        "email": User.email,
+        "picture_url": User.picture_url,
+        "role_id": User.role_id,
+        "created_at": User.created_at,
+    },
+    sort_keys=("id", "email"),
+)
+
+
 @studentsroute.get("/list")
 def get_students(
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     user_data: dict = Depends(JWTBearer()),
-    page: int = Query(1, ge=1),
-    per_page: int = Query(10, le=100),
 ):
     """
-    Retrieve all students data from the database with pagination.
+    Retrieve the students from the database one page at a time, with keyset pagination; see
+    `app.pagination` for the cursor, sort (id, email) and fields parameters.
     """
-    students = (
-        db.query(User)
-        .filter(User.deleted == DELETED,User.role_id ==1)
-        .limit(per_page)
-        .offset((page - 1) * per_page)
-        .all()
+    return paginate(
+        db.query(User).filter(User.deleted == DELETED, User.role_id == 1),
+        STUDENT_LIST,
+        page,
     )
-    return students
+
+
+STUDENT_DASHBOARD_LIST = ListSpec(
+    fields={
+        "id": ResultSummary.id,
+        "user_response_id": ResultSummary.user_response_id,
+        "question_paper_id": ResultSummary.question_paper_id,
+        "subject_id": ResultSummary.subject_id,
+        "score": ResultSummary.score,
+        "time_taken": ResultSummary.time_taken,
+        "year": ResultSummary.year,
+        "created_at": ResultSummary.created_at,
+        "subject_name": Subject.subject_name,
+        "topic_name": QuestionPaper.topic_name,
+        "assessment_specification": QuestionPaper.assessment_specification,
+    },
+    sort_keys=("created_at",),
+    default_sort="-created_at",
+)
 
 
 @studentsroute.get("/student_dashbord")
 def get_user_response_details(
-    user_id: int, db: Session = Depends(get_db), user_data: dict = Depends(JWTBearer())
+    user_id: int,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+    page: PageParams = Depends(),
 ):
     """
     This function retrieves user response details along with related subject and question paper
-    information based on the user ID.
+    information based on the user ID. It reads the narrow `result_summary` projection stored at
+    submission, newest attempt first, one page at a time; see `app.pagination` for the cursor and
+    sort (created_at) parameters. Every item is built from all fields, so `fields` is ignored.
 
     :param user_id: The `user_id` parameter is used to identify the specific user for whom we want to
     retrieve response details. This parameter is of type integer and is passed to the
@@ -46,9 +95,9 @@ def get_user_response_details(
     to user responses, subjects, and question papers. The `db` parameter is injected into the function
     using `Depends
     :type db: Session
-    :return: The function `get_user_response_details` returns a list of dictionaries containing details
-    of user responses along with related subject and question paper information. Each dictionary in the
-    list includes the following keys:
+    :return: The function `get_user_response_details` returns a page of dictionaries, under "data",
+    containing details of user responses along with related subject and question paper information,
+    and the cursor of the next page under "next_cursor". Each dictionary includes the following keys:
     - "question_paper_id": ID of the question paper
     - "subject_id": ID of the subject
     - "total_score": Total score of the user response
@@ -59,37 +108,281 @@ def get_user_response_details(
         # if not user_responses:
         #     raise HTTPException(status_code=404, detail="User responses not found")
 
-        user_responses_with_related = (
-            db.query(UserResponse, Subject, QuestionPaper)
-            .join(Subject, UserResponse.subject_id == Subject.id, isouter=True)
+        page.fields = None
+        summaries_with_related = paginate(
+            db.query(ResultSummary)
+            .join(Subject, ResultSummary.subject_id == Subject.id, isouter=True)
             .join(
                 QuestionPaper,
-                UserResponse.question_paper_id == QuestionPaper.id,
+                ResultSummary.question_paper_id == QuestionPaper.id,
                 isouter=True,
             )
-            .filter(UserResponse.user_id == user_id)
-            .all()
+            .filter(
+                ResultSummary.user_id == user_id,
+                ResultSummary.deleted == DELETED,
+            ),
+            STUDENT_DASHBOARD_LIST,
+            page,
         )
 
         response_details = []
-        for response, subject, question_paper in user_responses_with_related:
-            user_response_data = json.loads(response.user_response)
+        for summary in summaries_with_related["data"]:
             response_detail = {
-                "question_paper_id": response.question_paper_id,
-                "subject_id": response.subject_id,
-                "total_score": response.total_score,
-                "time": user_response_data.get("time"),
-                "year": response.year,
-                "exam_date": response.created_at,
-                "subject_name": subject.subject_name if subject else None,
-                "topic_name": question_paper.topic_name if question_paper else None,
-                "assessment_specification": (
-                    question_paper.assessment_specification if question_paper else None
-                ),
-                "result_id": response.id,
+                "question_paper_id": summary["question_paper_id"],
+                "subject_id": summary["subject_id"],
+                "total_score": summary["score"],
+                "time": summary["time_taken"],
+                "year": summary["year"],
+                "exam_date": summary["created_at"],
+                "subject_name": summary["subject_name"],
+                "topic_name": summary["topic_name"],
+                "assessment_specification": summary["assessment_specification"],
+                "result_id": summary["user_response_id"],
             }
             response_details.append(response_detail)
 
-        return response_details
+        return {
+            "data": response_details,
+            "next_cursor": summaries_with_related["next_cursor"],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@studentsroute.get("/class_statistics")
+def get_class_statistics(
+    subject_id: int = None,
+    paper_id: int = None,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    This function returns the class statistics of every question paper (number of students, number
+    of attempts, mean score, standard deviation, best and latest score). They are read from the
+    per-paper rollups kept up to date at submission, one row per paper, so no user response is
+    scanned.
+
+    :param subject_id: Only return the papers of this subject
+    :type subject_id: int
+    :param paper_id: Only return this paper
+    :type paper_id: int
+    :return: A list with the statistics of each paper.
+    """
+    try:
+        query = (
+            db.query(PaperScore, QuestionPaper)
+            .join(QuestionPaper, PaperScore.paper_id == QuestionPaper.id)
+            .filter(
+                PaperScore.user_id.is_(None),
+                PaperScore.deleted == DELETED,
+                QuestionPaper.deleted == DELETED,
+            )
+        )
+        if subject_id is not None:
+            query = query.filter(QuestionPaper.subject_id == subject_id)
+        if paper_id is not None:
+            query = query.filter(PaperScore.paper_id == paper_id)
+
+        statistics = []
+        for rollup, question_paper in query.order_by(PaperScore.paper_id).all():
+            statistics.append(
+                {
+                    "paper_id": rollup.paper_id,
+                    "subject_id": question_paper.subject_id,
+                    "year": question_paper.year,
+                    "topic_name": question_paper.topic_name,
+                    "assessment_specification": question_paper.assessment_specification,
+                    "student_count": rollup.student_count,
+                    "attempt_count": rollup.attempt_count,
+                    "mean_score": rollup.mean_score,
+                    "std_dev": score_std_dev(rollup),
+                    "best_score": rollup.best_score,
+                    "latest_score": rollup.latest_score,
+                }
+            )
+        return statistics
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@studentsroute.get("/percentile")
+def get_percentile(
+    paper_id: int,
+    user_id: int = None,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    This function tells a student how their best score on a question paper compares with the other
+    students of the paper, using the in-memory score distribution of the paper.
+
+    :param paper_id: The question paper to rank the student in
+    :type paper_id: int
+    :param user_id: The student to rank, defaults to the logged in user
+    :type user_id: int
+    :return: The student's best score, rank, percentile rank and the number of students.
+    """
+    user_id = user_id if user_id is not None else user_data["id"]
+    distribution = leaderboard.distribution(db, paper_id)
+    score = distribution.best_scores.get(user_id)
+    if score is None:
+        response = JSONResponse(
+            content={
+                "success": False,
+                "message": "No attempt found for this paper",
+                "status": status.HTTP_404_NOT_FOUND,
+            }
+        )
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return response
+    return {
+        "paper_id": paper_id,
+        "user_id": user_id,
+        "score": score,
+        "rank": distribution.rank(score),
+        "percentile": distribution.percentile_rank(score),
+        "student_count": len(distribution),
+    }
+
+
+@studentsroute.get("/leaderboard")
+def get_leaderboard(
+    paper_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    This function returns the students with the best scores on a question paper, best first.
+    """
+    top = leaderboard.distribution(db, paper_id).top(limit)
+    names = {}
+    if top:
+        names = dict(
+            db.query(User.id, User.name)
+            .filter(User.id.in_([user_id for user_id, _ in top]))
+            .all()
+        )
+    leaders = []
+    for user_id, score in top:
+        # Students with the same score share a rank
+        if leaders and leaders[-1]["score"] == score:
+            rank = leaders[-1]["rank"]
+        else:
+            rank = len(leaders) + 1
+        leaders.append(
+            {"rank": rank, "user_id": user_id, "name": names.get(user_id), "score": score}
+        )
+    return leaders
+
+
+@studentsroute.get("/histogram")
+def get_score_histogram(
+    paper_id: int,
+    bins: int = Query(10, ge=1, le=100),
+    min_score: float = None,
+    max_score: float = None,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    This function returns the distribution of the students' best scores on a question paper as a
+    histogram. `counts[i]` students scored between `edges[i]` and `edges[i + 1]`.
+    """
+    distribution = leaderboard.distribution(db, paper_id)
+    score_range = None
+    if min_score is not None and max_score is not None and min_score < max_score:
+        score_range = (min_score, max_score)
+    counts, edges = distribution.histogram(bins, score_range)
+    return {
+        "paper_id": paper_id,
+        "student_count": len(distribution),
+        "counts": counts,
+        "edges": edges,
+    }
+
+
+@studentsroute.get("/item_analysis")
+def get_item_analysis(
+    paper_id: int,
+    flagged_only: bool = False,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    This function returns the item statistics of the questions of a paper, as computed by the
+    scheduled item analysis job: the p-value (share of correct answers), the corrected point-biserial
+    correlation with the rest of the paper and the flags raised for too easy, too hard or negatively
+    discriminating questions.
+
+    :param paper_id: The question paper to report on
+    :type paper_id: int
+    :param flagged_only: Only return the questions with at least one flag
+    :type flagged_only: bool
+    """
+    rows = (
+        db.query(ItemStatistic, Question.question_number, Question.subquestion_label)
+        .join(Question, ItemStatistic.question_id == Question.id)
+        .filter(ItemStatistic.paper_id == paper_id, ItemStatistic.deleted == DELETED)
+        .order_by(Question.question_number, Question.subquestion_label, Question.id)
+        .all()
+    )
+    items = []
+    for statistic, question_number, subquestion_label in rows:
+        if flagged_only and not statistic.flags:
+            continue
+        items.append(
+            {
+                "question_id": statistic.question_id,
+                "question_number": question_number,
+                "sub_question_label": subquestion_label,
+                "response_count": statistic.response_count,
+                "p_value": statistic.p_value,
+                "point_biserial": statistic.point_biserial,
+                "flags": statistic.flags or [],
+                "computed_at": statistic.computed_at,
+            }
+        )
+    return items
+
+
+@studentsroute.get("/export")
+def export_class_results(
+    file_format: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    subject_id: Optional[int] = None,
+    paper_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    This function exports the results of a class (every submission, optionally limited to a subject,
+    a paper or a date range) as a CSV or XLSX file. Rows are read from a server-side cursor in batches
+    and the file is streamed, so large exports use constant memory.
+
+    :param file_format: `csv` (default) or `xlsx`
+    :type file_format: str
+    :param subject_id: Only export the results of this subject
+    :param paper_id: Only export the results of this question paper
+    :param date_from: Only export results submitted on or after this date
+    :param date_to: Only export results submitted on or before this date
+    """
+    filters = {
+        "subject_id": subject_id,
+        "paper_id": paper_id,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    if file_format == "xlsx":
+        return StreamingResponse(
+            export_results_xlsx(**filters),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="class_results.xlsx"'},
+        )
+    return StreamingResponse(
+        export_results_csv(**filters),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="class_results.csv"'},
+    )
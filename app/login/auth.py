@@ -53,8 +53,9 @@ class JWTBearer(HTTPBearer):
             )
 
     def has_permissions(self, payload, request, db):
+        # Read on every request, so a role change or deactivation applies at once in every process
         user = (
-            db.query(User)
+            db.query(User.role_id)
             .filter(
                 User.id == payload, User.deleted == DELETED, User.record_status == 1
             )
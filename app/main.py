@@ -12,9 +12,12 @@ from app.questions.introtextApi import introtextroute
 from app.questions.question import question_route
 
 from app.payment.paymentApi import payments
+from app.payment.invoiceRenderer import shutdown_invoice_renderer
 from app.dashboard.teacherDashboard import studentsroute
 from app.ai.api import *
 from app.rolemanagement.api import rolemanager
+from app.scheduler import start_scheduler, stop_scheduler
+from app.questions.searchIndex import start_search_index
 
 
 app = FastAPI()
@@ -56,3 +59,15 @@ app.include_router(studentsroute)
 app.include_router(question_route)
 app.include_router(ai_route)
 app.include_router(rolemanager)
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    start_scheduler()
+    start_search_index()
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    stop_scheduler()
+    shutdown_invoice_renderer()
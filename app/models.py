@@ -12,7 +12,11 @@ from sqlalchemy import (
     Enum,
     Date,
     TIMESTAMP,
+    UniqueConstraint,
+    Index,
+    LargeBinary,
 )
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from database import Base
 from sqlalchemy.dialects.mysql import JSON
@@ -20,6 +24,10 @@ from sqlalchemy.dialects.mysql import JSON
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        Index("ix_user_role_id_deleted", "role_id", "deleted"),
+        Index("ix_user_role_id_email", "role_id", "email"),
+    )
     id = Column(Integer, primary_key=True)
     name = Column(String(255))
     email = Column(String(100), unique=True, nullable=False)
@@ -27,7 +35,7 @@ class User(Base):
     authentication_type = Column(String(255), nullable=False)
     external_login_id = Column(String(255), unique=True)
     role_id = Column(Integer, default="1", nullable=False)
-    stripe_id = Column(String(100))
+    stripe_id = Column(String(100), index=True)
     created_at = Column(
         DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
     )
@@ -42,6 +50,9 @@ class User(Base):
 
 class Subject(Base):
     __tablename__ = "subject"
+    __table_args__ = (
+        Index("ix_subject_deleted_subject_name", "deleted", "subject_name"),
+    )
 
     id = Column(
         Integer, primary_key=True, index=True, nullable=False, autoincrement=True
@@ -62,6 +73,10 @@ class Subject(Base):
 
 class QuestionPaper(Base):
     __tablename__ = "question_paper"
+    __table_args__ = (
+        Index("ix_question_paper_deleted_year", "deleted", "year"),
+        Index("ix_question_paper_deleted_subject_year", "deleted", "subject_id", "year"),
+    )
 
     id = Column(
         Integer, primary_key=True, index=True, nullable=False, autoincrement=True
@@ -125,11 +140,25 @@ class IntroText(Base):
 
 class Question(Base):
     __tablename__ = "question"
+    __table_args__ = (
+        Index("ix_question_paper_id_path", "paper_id", "path"),
+        Index(
+            "ix_question_paper_ordering",
+            "paper_id",
+            "question_number",
+            "subquestion_label",
+            "order",
+        ),
+    )
 
     id = Column(
         Integer, primary_key=True, index=True, nullable=False, autoincrement=True
     )
     parent_id = Column(Integer, ForeignKey("question.id"), nullable=True)
+    # Materialized path of zero padded ancestor ids, e.g. "0000000012/0000000034/", kept up to date
+    # by the listeners in app.questions.tree; rows written outside the ORM are filled before reads
+    path = Column(String(255), nullable=True)
+    depth = Column(SmallInteger, nullable=False, server_default=text("0"))
     paper_id = Column(Integer, ForeignKey("question_paper.id"), nullable=False)
     question_text = Column(Text, nullable=False)
     question_type_id = Column(Integer, ForeignKey("question_paper.id"), nullable=False)
@@ -153,17 +182,29 @@ class Question(Base):
     created_by_id = Column(Integer, nullable=False)
     updated_by_id = Column(Integer)
     prompt_text = Column(Text, nullable=True)
+    prompt_version = Column(Integer, nullable=False, server_default=text("1"))
 
 
 class PaperScore(Base):
     __tablename__ = "paper_score"
+    __table_args__ = (
+        UniqueConstraint("paper_id", "user_id", name="uq_paper_score_paper_user"),
+    )
 
     id = Column(
         Integer, primary_key=True, index=True, nullable=False, autoincrement=True
     )
     paper_id = Column(Integer, ForeignKey("question_paper.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    # NULL for the per-paper rollup of all students, set for the per-student rollups
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=True)
     score = Column(Integer, nullable=True)
+    best_score = Column(Float, nullable=True)
+    latest_score = Column(Float, nullable=True)
+    attempt_count = Column(Integer, nullable=False, server_default=text("0"))
+    # Running mean and sum of squared deviations (Welford), variance = m2 / attempt_count
+    mean_score = Column(Float, nullable=False, server_default=text("0"))
+    m2 = Column(Float, nullable=False, server_default=text("0"))
+    student_count = Column(Integer, nullable=False, server_default=text("0"))
     created_at = Column(
         DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
     )
@@ -265,19 +306,20 @@ class PaymentHistory(Base):
     created_by_id = Column(Integer, nullable=False)
     updated_by_id = Column(Integer, nullable=True)
     stripe_payment_intent_id = Column(String(length=255), nullable=True)
-    stripe_checkout_id = Column(String(length=255), nullable=False)
+    stripe_checkout_id = Column(String(length=255), nullable=False, index=True)
     customer_id = Column(String(length=255), nullable=True)
     stripe_transaction_status = Column(String(length=255), nullable=False)
     cancelled_date = Column(Date, nullable=True)
     cancellation_type = Column(Integer, nullable=True)
     next_payment_date = Column(Date, nullable=True)
-    payment_intent_detail = Column(JSON)
-    checkout_detail = Column(JSON)
-    invoice_detail = Column(JSON)
+    stripe_invoice_id = Column(String(length=255), nullable=True, index=True)
 
 
 class Invoice(Base):
     __tablename__ = "invoice"
+    __table_args__ = (
+        Index("ix_invoice_created_by_id_payment_date", "created_by_id", "payment_date"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, unique=True)
     payment_id = Column(Integer, nullable=False, index=True)
@@ -289,15 +331,75 @@ class Invoice(Base):
     record_status = Column(SmallInteger, nullable=False, default=1)
     created_by_id = Column(Integer, nullable=False)
     updated_by_id = Column(Integer, nullable=True)
-    stripe_invoice_id = Column(String(length=255), nullable=False)
-    invoice_detail = Column(JSON)
+    stripe_invoice_id = Column(String(length=255), nullable=False, index=True)
     next_invoice_date = Column(Date, nullable=True)
     invoice_status = Column(String(length=255), nullable=True)
     file_path = Column(String(length=500), nullable=True)
 
 
+class StripePayload(Base):
+    """
+    Snapshots of the Stripe objects behind a payment or an invoice, compressed and kept out of the
+    payment tables. Only read when a payment is audited.
+    """
+
+    __tablename__ = "stripe_payload"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_table", "owner_id", "kind", name="uq_stripe_payload_owner_kind"
+        ),
+    )
+
+    id = Column(
+        Integer, primary_key=True, index=True, nullable=False, autoincrement=True
+    )
+    owner_table = Column(String(50), nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    kind = Column(String(50), nullable=False)
+    stripe_object_id = Column(String(255), nullable=True)
+    codec = Column(String(10), nullable=False, server_default=text("'zlib'"))
+    payload = deferred(Column(LargeBinary(length=2**24 - 1), nullable=False))
+    created_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+
+class StripeEvent(Base):
+    __tablename__ = "stripe_event"
+    __table_args__ = (
+        Index("ix_stripe_event_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(
+        Integer, primary_key=True, index=True, nullable=False, autoincrement=True
+    )
+    event_id = Column(String(255), nullable=False, index=True, unique=True)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    stripe_created_at = Column(DateTime, nullable=True)
+    status = Column(String(20), nullable=False, server_default=text("'pending'"))
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    next_attempt_at = Column(DateTime, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    updated_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    deleted = Column(SmallInteger, nullable=False, server_default=text("0"))
+    record_status = Column(SmallInteger, nullable=False, server_default=text("1"))
+
+
 class UserResponse(Base):
     __tablename__ = "user_response"
+    __table_args__ = (
+        Index("ix_user_response_user_id_id", "user_id", "id"),
+        Index("ix_user_response_question_paper_id_id", "question_paper_id", "id"),
+        Index("ix_user_response_created_at", "created_at"),
+    )
 
     id = Column(
         Integer, primary_key=True, index=True, nullable=False, autoincrement=True
@@ -321,6 +423,135 @@ class UserResponse(Base):
     ai_response = Column(JSON)
 
 
+class GradingResult(Base):
+    __tablename__ = "grading_result"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_response_id",
+            "question_id",
+            name="uq_grading_result_response_question",
+        ),
+        Index("ix_grading_result_user_question", "user_id", "question_id"),
+    )
+
+    id = Column(
+        Integer, primary_key=True, index=True, nullable=False, autoincrement=True
+    )
+    user_response_id = Column(
+        Integer, ForeignKey("user_response.id"), nullable=True
+    )
+    question_id = Column(Integer, ForeignKey("question.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=True)
+    rating = Column(Float, nullable=True)
+    explanation = Column(Text, nullable=True)
+    answer_evaluation = Column(Text, nullable=True)
+    area_of_improvement = Column(JSON)
+    area_of_focus = Column(Text, nullable=True)
+    correct_answer = Column(Text, nullable=True)
+    feedback = Column(Text, nullable=True)
+    model = Column(String(100), nullable=True)
+    prompt_version = Column(Integer, nullable=True)
+    created_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    updated_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    deleted = Column(SmallInteger, nullable=False, server_default=text("0"))
+    record_status = Column(SmallInteger, nullable=False, server_default=text("1"))
+    created_by_id = Column(Integer, nullable=False)
+    updated_by_id = Column(Integer)
+
+
+class ResultSummary(Base):
+    __tablename__ = "result_summary"
+    __table_args__ = (
+        Index("ix_result_summary_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(
+        Integer, primary_key=True, index=True, nullable=False, autoincrement=True
+    )
+    user_response_id = Column(
+        Integer, ForeignKey("user_response.id"), nullable=False, unique=True, index=True
+    )
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=True)
+    question_paper_id = Column(Integer, ForeignKey("question_paper.id"), nullable=True)
+    subject_id = Column(Integer, ForeignKey("subject.id"), nullable=True)
+    year = Column(Integer)
+    attempted = Column(Integer, nullable=False)
+    correct = Column(Integer, nullable=False)
+    wrong = Column(Integer, nullable=False)
+    score = Column(Float, nullable=True)
+    time_taken = Column(JSON)
+    created_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    updated_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    deleted = Column(SmallInteger, nullable=False, server_default=text("0"))
+    record_status = Column(SmallInteger, nullable=False, server_default=text("1"))
+    created_by_id = Column(Integer, nullable=False)
+    updated_by_id = Column(Integer)
+
+
+class ItemStatistic(Base):
+    __tablename__ = "item_statistic"
+
+    id = Column(
+        Integer, primary_key=True, index=True, nullable=False, autoincrement=True
+    )
+    question_id = Column(Integer, ForeignKey("question.id"), nullable=False, unique=True)
+    paper_id = Column(Integer, ForeignKey("question_paper.id"), nullable=False, index=True)
+    response_count = Column(Integer, nullable=False)
+    p_value = Column(Float, nullable=True)
+    point_biserial = Column(Float, nullable=True)
+    flags = Column(JSON)
+    computed_at = Column(DateTime, nullable=False)
+    created_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    updated_at = Column(
+        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    deleted = Column(SmallInteger, nullable=False, server_default=text("0"))
+    record_status = Column(SmallInteger, nullable=False, server_default=text("1"))
+    created_by_id = Column(Integer, nullable=False)
+    updated_by_id = Column(Integer)
+
+
+class CatalogVersion(Base):
+    """
+    One version counter per cached catalog namespace, bumped in the transaction of every catalog
+    write, so the caches of all application processes retire their entries together.
+    """
+
+    __tablename__ = "catalog_version"
+
+    namespace = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, server_default=text("0"))
+
+
+class SearchChange(Base):
+    """
+    Change log of the tables in the question search index, one row per written question, option or
+    question paper. Rows are appended by database triggers (see app.questions.searchIndex), so
+    writes of other processes and direct SQL are logged as well.
+    """
+
+    __tablename__ = "search_change"
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
+    table_name = Column(String(20), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    # The question of a changed option, the previous one as well when it moved
+    question_id = Column(Integer, nullable=True)
+    created_at = Column(
+        DateTime, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+
 class QuestionType(Base):
     __tablename__ = "question_type"
 
@@ -0,0 +1,175 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query as OrmQuery
+from starlette import status
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class PageParams:
+    """
+    The paging query parameters shared by list endpoints, used as `page: PageParams = Depends()`.
+
+    :param cursor: The `next_cursor` returned by the previous page
+    :param limit: The maximum number of items in the page
+    :param sort: One of the endpoint's sort keys, prefixed with "-" for descending order
+    :param fields: A comma separated subset of the endpoint's fields; all of them by default
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        sort: Optional[str] = None,
+        fields: Optional[str] = None,
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.sort = sort
+        self.fields = fields
+
+
+class ListSpec:
+    """
+    Describes what a list endpoint exposes: the columns it may return, keyed by field name, and the
+    fields it may be sorted by. Every sort key must be NOT NULL and backed by an index. The
+    `tiebreaker` field is unique and orders rows with equal sort values; leave it out when every
+    sort key is unique on its own.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, Any],
+        sort_keys: Sequence[str],
+        default_sort: str = "id",
+        tiebreaker: Optional[str] = "id",
+    ):
+        self.fields = fields
+        self.sort_keys = tuple(sort_keys)
+        self.default_sort = default_sort
+        self.tiebreaker = tiebreaker
+
+    def selected_fields(self, fields: Optional[str]) -> List[str]:
+        if not fields:
+            return list(self.fields)
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in self.fields]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}",
+            )
+        return selected
+
+    def order_keys(self, sort: Optional[str]):
+        sort = sort or self.default_sort
+        descending = sort.startswith("-")
+        key = sort[1:] if descending else sort
+        if key not in self.sort_keys:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot sort by {key}, use one of: {', '.join(self.sort_keys)}",
+            )
+        keys = [key]
+        if self.tiebreaker and key != self.tiebreaker:
+            keys.append(self.tiebreaker)
+        return sort, keys, descending
+
+
+def encode_cursor(sort: str, values: List[Any]) -> str:
+    data = json.dumps(
+        {"sort": sort, "after": [to_cursor_value(value) for value in values]},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, columns: List[Any]) -> List[Any]:
+    """
+    Reads back the sort values of the last row of the previous page. A cursor only continues the
+    listing it was issued for; one from another sort order, or a tampered one, is rejected.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if data["sort"] != sort or len(data["after"]) != len(columns):
+            raise ValueError(cursor)
+        return [
+            from_cursor_value(value, column)
+            for value, column in zip(data["after"], columns)
+        ]
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def to_cursor_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def from_cursor_value(value: Any, column) -> Any:
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def after(columns: List[Any], values: List[Any], descending: bool):
+    """
+    The keyset condition selecting the rows that sort after `values`, written as
+    (a > x) OR (a = x AND b > y) so the index on the sort columns can be used as a range.
+    """
+    conditions = []
+    for position, column in enumerate(columns):
+        equal = [columns[i] == values[i] for i in range(position)]
+        beyond = column < values[position] if descending else column > values[position]
+        conditions.append(and_(*equal, beyond))
+    return or_(*conditions)
+
+
+def paginate(query: OrmQuery, spec: ListSpec, page: PageParams) -> Dict[str, Any]:
+    """
+    The function `paginate` returns one page of a list endpoint. It selects only the requested
+    fields, orders by the requested sort key and starts after the row encoded in the cursor, so a
+    page costs the same however deep into the listing it is.
+
+    :param query: The filtered query of the endpoint; its selected columns are replaced
+    :return: A dictionary with the page under "data" and the cursor of the next page under
+    "next_cursor" (None on the last page).
+    """
+    fields = spec.selected_fields(page.fields)
+    sort, keys, descending = spec.order_keys(page.sort)
+    columns = [spec.fields[key] for key in keys]
+    hidden = [key for key in keys if key not in fields]
+
+    query = query.with_entities(
+        *[spec.fields[name].label(name) for name in fields + hidden]
+    )
+    if page.cursor:
+        values = decode_cursor(page.cursor, sort, columns)
+        query = query.filter(after(columns, values, descending))
+    query = query.order_by(
+        *[column.desc() if descending else column.asc() for column in columns]
+    )
+    rows = query.limit(page.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[: page.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, [getattr(last, key) for key in keys])
+    return {
+        "data": [{name: getattr(row, name) for name in fields} for row in rows],
+        "next_cursor": next_cursor,
+    }
@@ -3,4 +3,9 @@ RECORD_STATUS = 1
 USER_NOT_FOUND = "USER NOT FOUND"
 ESSAY_QUESTION_TYPE_ID = 5
 INITIAL_SCORE = 0
-OPTION_SCORE =1
\ No newline at end of file
+OPTION_SCORE =1
+AI_MODEL = "gpt-4o"
+ITEM_EASY_P_VALUE = 0.9
+ITEM_HARD_P_VALUE = 0.2
+ITEM_MIN_DISCRIMINATION = 0
+ITEM_ANALYSIS_MIN_RESPONSES = 20
\ No newline at end of file
@@ -1,5 +1,14 @@
 from reportlab.lib.pagesizes import letter
 import os
+import json
+import threading
+from datetime import date, datetime, timezone
+import requests
+import stripe
+from sqlalchemy.orm import Session
+from app.models import Invoice, PaymentHistory
+from app.payment.payloadArchive import INVOICE_OWNER, INVOICE_PAYLOAD, archive_payload
+from database import SessionLocal
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Paragraph
 import os
@@ -28,3 +37,177 @@ def create_invoice_pdf(file_path, invoice_data):
     # c.drawString(50, 50, "Thank you for your business.")
 
     c.save()
+
+
+def SaveInvoiceDetail(
+    db: Session,
+    invoice_id: str,
+    invoice_data: json,
+    payment_history: dict,
+    next_payment_date: date,
+    customer_email: str,
+):
+    """
+    This function saves invoice details along with payment history and subscription data in a database.
+
+    :param db: The `db` parameter is an instance of the database session that will be used to interact
+    with the database. It is typically used to query, insert, update, and delete data from the database
+    within the context of a session
+
+    Errors are raised after rolling back, so the webhook worker retries the event later.
+    """
+    try:
+
+        # The PDF itself is rendered in the background, see app.payment.invoiceRenderer
+        pdffile = invoice_filename(invoice_id)
+        db_invoice = Invoice(
+            stripe_invoice_id=invoice_id,
+            payment_id=payment_history.id,
+            status=invoice_data["status"],
+            next_invoice_date=next_payment_date,
+            file_path=pdffile,
+            invoice_status="Success",
+        )
+        db_invoice.payment_date = payment_history.payment_date
+        db_invoice.created_by_id = payment_history.created_by_id
+        db.add(db_invoice)
+        db.flush()
+        archive_payload(db, INVOICE_OWNER, db_invoice.id, INVOICE_PAYLOAD, invoice_data)
+        db.commit()
+        db.refresh(db_invoice)
+        return db_invoice
+    except Exception as e:
+        print("error in invoice", str(e))
+        db.rollback()
+        raise
+ 
+ 
+INVOICE_DIRECTORY = "invoices"
+
+
+def invoice_filename(invoice_id: str) -> str:
+    """
+    The file name of an invoice PDF. It only depends on the invoice id, so rendering an invoice again
+    replaces its file instead of adding a new one.
+    """
+    return f"invoice_{invoice_id}.pdf"
+
+
+def retrieve_invoice_pdf(invoice_id, destination_path=INVOICE_DIRECTORY):
+    """
+    The function `retrieve_invoice_pdf` retrieves and saves an invoice PDF from Stripe API or creates a
+    custom invoice PDF if the PDF URL is not available.
+
+    :param invoice_id: The `retrieve_invoice_pdf` function you provided seems to be a Python function
+    that retrieves and saves an invoice PDF from a Stripe invoice. It first checks if the invoice has a
+    PDF URL, and if not, it creates a custom PDF with invoice details. If a PDF URL is available, it
+    downloads
+    :param destination_path: The directory the PDF is written to, `invoices` by default
+    :return: The function `retrieve_invoice_pdf` returns the file name of the invoice PDF that was
+    either created or downloaded successfully. If there was an error during the process, it returns
+    `None`. The file is written under a temporary name and moved into place, so a reader never sees
+    a partly written PDF.
+    """
+    db = SessionLocal()
+    try:
+        filename = invoice_filename(invoice_id)
+        file_path = os.path.join(destination_path, filename)
+        partial_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if not os.path.exists(destination_path):
+            os.makedirs(destination_path)
+        invoice = stripe.Invoice.retrieve(invoice_id)
+        pdf_url = invoice.invoice_pdf
+        # payment_history = db.query(PaymentHistory).filter(PaymentHistory.stripe_checkout_id == session_id).first()
+
+        payments = (
+            db.query(PaymentHistory)
+            .filter(PaymentHistory.stripe_invoice_id == invoice.id)
+            .first()
+        )
+        next_payment_date = payments.next_payment_date
+        plan_active = "inactive"
+        if (
+            payments
+            and payments.next_payment_date
+            and payments.next_payment_date > datetime.now().date()
+        ):
+            plan_active = "active"
+        transaction_id = payments.stripe_payment_intent_id
+        amount = payments.total_amount
+        payment_date = payments.payment_date
+        subscription_period = (
+            next_payment_date - payment_date if next_payment_date else None
+        )
+
+        subscription_plan = (
+            "Yearly"
+            if subscription_period and subscription_period.days >= 365
+            else "Monthly"
+        )
+        subscription_period_in_months = None
+
+        if next_payment_date and payment_date:
+            difference_in_days = (next_payment_date - payment_date).days
+
+            subscription_period_in_months = round(difference_in_days / 30.4375)
+
+            subscription_period = subscription_period_in_months
+        subscription_period_str = (
+            str(subscription_period) + " Months" if subscription_period else None
+        )
+
+        if pdf_url is None:
+            utc_datetime = datetime.fromtimestamp(invoice.period_start, timezone.utc)
+            invoice_date = utc_datetime.strftime("%Y-%m-%d %H:%M:%S")
+            invoice_data = {
+                "Invoice Number": invoice.id,
+                "Date": payment_date.strftime("%d %B %Y"),
+                # "customer_info":invoice.customer_address,
+                # "Customer Information":invoice.account_name,
+                "Subscription Plan": subscription_plan,
+                "Subscription Period": f"{payment_date.strftime('%d %B %Y')} - {next_payment_date.strftime('%d %B %Y')}",
+                "Total Amount Paid": amount,
+                "Transaction ID": transaction_id,
+                # "Currency":invoice.currency,
+                # "account_country":invoice.account_country,
+                # "account_name": invoice.account_name,
+                # "currency":invoice.currency,
+                # "Customer":invoice.customer,
+                "Subscription Expiry Date": next_payment_date.strftime("%d %B %Y"),
+                "Status": plan_active,
+            }
+            try:
+                create_invoice_pdf(partial_path, invoice_data)
+                os.replace(partial_path, file_path)
+            except Exception:
+                # A failed render must not leave its partial file behind
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+
+            print("Custom invoice PDF created successfully.")
+            return filename
+        else:
+            response = requests.get(pdf_url)
+            if response.status_code == 200:
+                try:
+                    with open(partial_path, "wb") as f:
+                        f.write(response.content)
+                    os.replace(partial_path, file_path)
+                except Exception:
+                    if os.path.exists(partial_path):
+                        os.remove(partial_path)
+                    raise
+                print("Invoice PDF saved successfully.")
+            else:
+                print(
+                    f"Failed to download invoice PDF. Status code: {response.status_code}"
+                )
+                return None
+        return filename
+
+    except stripe.error.StripeError as e:
+        print(f"Failed to retrieve invoice PDF: {e}")
+        return None
+    finally:
+        db.close()
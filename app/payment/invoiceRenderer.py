@@ -0,0 +1,82 @@
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from app.payment.invoice import INVOICE_DIRECTORY, invoice_filename, retrieve_invoice_pdf
+
+INVOICE_RENDER_WORKERS = int(os.getenv("INVOICE_RENDER_WORKERS", "2"))
+# How long a download request waits for a PDF that is rendered on demand
+INVOICE_RENDER_TIMEOUT_SECONDS = int(os.getenv("INVOICE_RENDER_TIMEOUT_SECONDS", "30"))
+INVOICE_FILENAME_PATTERN = re.compile(r"^invoice_(in_[A-Za-z0-9]+)\.pdf$")
+
+# Rendering downloads from Stripe or draws with reportlab; a small pool keeps it off the request
+# threads and bounds how many invoices are produced at once
+render_pool = ThreadPoolExecutor(
+    max_workers=INVOICE_RENDER_WORKERS, thread_name_prefix="invoice-render"
+)
+# The render running or queued for each invoice, so an invoice is never rendered twice at once
+in_flight: Dict[str, Future] = {}
+in_flight_lock = threading.Lock()
+
+
+def invoice_path(invoice_id: str, destination_path: str = INVOICE_DIRECTORY) -> str:
+    return os.path.join(destination_path, invoice_filename(invoice_id))
+
+
+def invoice_id_from_filename(filename: str) -> Optional[str]:
+    """
+    Returns the Stripe invoice id an `invoice_{id}.pdf` file name was built from, or None for any
+    other name.
+    """
+    match = INVOICE_FILENAME_PATTERN.match(filename)
+    return match.group(1) if match else None
+
+
+def forget_render(invoice_id: str, future: Future) -> None:
+    with in_flight_lock:
+        if in_flight.get(invoice_id) is future:
+            del in_flight[invoice_id]
+
+
+def submit_invoice_pdf(invoice_id: str) -> Future:
+    """
+    The function `submit_invoice_pdf` queues the PDF of an invoice for rendering. A render already
+    queued or running for the same invoice is shared instead of starting a second one.
+
+    :return: A future resolving to the file name of the PDF, or None when it could not be produced.
+    """
+    with in_flight_lock:
+        future = in_flight.get(invoice_id)
+        if future is not None:
+            return future
+        future = render_pool.submit(retrieve_invoice_pdf, invoice_id)
+        in_flight[invoice_id] = future
+    future.add_done_callback(lambda done: forget_render(invoice_id, done))
+    return future
+
+
+def ensure_invoice_pdf(
+    invoice_id: str, timeout: float = INVOICE_RENDER_TIMEOUT_SECONDS
+) -> Optional[str]:
+    """
+    The function `ensure_invoice_pdf` returns the path of an invoice PDF, rendering it first when it
+    is not on disk yet. Blocks for at most `timeout` seconds.
+
+    :return: The path of the PDF, or None when it could not be rendered in time.
+    """
+    path = invoice_path(invoice_id)
+    if os.path.exists(path):
+        return path
+    try:
+        filename = submit_invoice_pdf(invoice_id).result(timeout=timeout)
+    except Exception as e:
+        print(f"Failed to render invoice PDF {invoice_id}: {e}")
+        return None
+    if filename is None or not os.path.exists(path):
+        return None
+    return path
+
+
+def shutdown_invoice_renderer() -> None:
+    render_pool.shutdown(wait=False, cancel_futures=True)
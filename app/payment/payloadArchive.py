@@ -0,0 +1,67 @@
+import json
+import zlib
+from typing import Any, Dict, Optional
+from sqlalchemy.orm import Session, undefer
+from app.models import StripePayload
+
+PAYLOAD_CODEC = "zlib"
+PAYLOAD_COMPRESSION_LEVEL = 6
+
+PAYMENT_HISTORY_OWNER = "payment_history"
+INVOICE_OWNER = "invoice"
+CHECKOUT_SESSION_PAYLOAD = "checkout_session"
+PAYMENT_INTENT_PAYLOAD = "payment_intent"
+INVOICE_PAYLOAD = "invoice"
+
+
+def compress_payload(payload: Any) -> bytes:
+    return zlib.compress(
+        json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"),
+        PAYLOAD_COMPRESSION_LEVEL,
+    )
+
+
+def decompress_payload(data: bytes, codec: str = PAYLOAD_CODEC) -> Any:
+    if codec != PAYLOAD_CODEC:
+        raise ValueError(f"Unknown payload codec {codec}")
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def archive_payload(
+    db: Session, owner_table: str, owner_id: int, kind: str, payload: Any
+) -> StripePayload:
+    """
+    The function `archive_payload` adds the compressed snapshot of a Stripe object to the session.
+    The caller commits it together with the row it belongs to, which must already have an id.
+    """
+    row = StripePayload(
+        owner_table=owner_table,
+        owner_id=owner_id,
+        kind=kind,
+        stripe_object_id=payload.get("id") if isinstance(payload, dict) else None,
+        codec=PAYLOAD_CODEC,
+        payload=compress_payload(payload),
+    )
+    db.add(row)
+    return row
+
+
+def load_payloads(
+    db: Session, owner_table: str, owner_id: int, kind: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    The function `load_payloads` reads back the Stripe snapshots of one payment or invoice.
+
+    :return: The decompressed snapshots keyed by kind (checkout_session, payment_intent, invoice).
+    """
+    query = (
+        db.query(StripePayload)
+        .options(undefer(StripePayload.payload))
+        .filter(
+            StripePayload.owner_table == owner_table,
+            StripePayload.owner_id == owner_id,
+        )
+    )
+    if kind is not None:
+        query = query.filter(StripePayload.kind == kind)
+    return {row.kind: decompress_payload(row.payload, row.codec) for row in query.all()}
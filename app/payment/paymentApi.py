@@ -1,6 +1,7 @@
 import os
 import json
-from fastapi import APIRouter, HTTPException, Request, Depends, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Depends, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, JSONResponse
 import stripe
 import requests
@@ -8,10 +9,15 @@ from sqlalchemy.orm import Session
 from datetime import datetime, date, timedelta, timezone
 from app.login.auth import JWTBearer
 from app.models import Invoice, PaymentHistory, User
+from app.pagination import ListSpec, PageParams, paginate
 from app.params import DELETED, RECORD_STATUS, USER_NOT_FOUND
 from app.payment.invoice import create_invoice_pdf
+from app.payment.invoiceRenderer import ensure_invoice_pdf, invoice_id_from_filename
+from app.payment.payloadArchive import INVOICE_OWNER, PAYMENT_HISTORY_OWNER, load_payloads
+from app.payment.stripeCache import retrieve_checkout_session, retrieve_customer
+from app.payment.webhookWorker import process_pending_events, store_stripe_event
 from database import SessionLocal, get_db
-from sqlalchemy import desc
+from sqlalchemy import desc, or_
  
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 stripeprice_id = os.getenv("stripe_price_id")
@@ -46,14 +52,20 @@ def create_checkout_session(
     """
     try:
         email = request.get("email")
-        stripe_id = create_customer(email)
-
         user = db.query(User).filter(User.email == email).first()
 
         if user is None:
             db.close()
             return {"error": "User not found"}
 
+        # The Stripe customer is looked up once and written through to the user
+        stripe_id = user.stripe_id
+        if not stripe_id:
+            stripe_id = create_customer(email)
+            if stripe_id:
+                user.stripe_id = stripe_id
+                db.commit()
+
         latest_payment_history = (
             db.query(PaymentHistory)
             .filter(PaymentHistory.customer_id == user.stripe_id)
@@ -121,9 +133,9 @@ def check_payment_status(
         if user_payment_history and user_payment_history.status == "paid":
             session_id = user_payment_history.stripe_checkout_id
             transaction_date_time = user_payment_history.created_at
-            session = stripe.checkout.Session.retrieve(session_id)
+            session = retrieve_checkout_session(session_id)
             customer_id = session.customer
-            customer = stripe.Customer.retrieve(customer_id)
+            customer = retrieve_customer(customer_id)
             customer_name = customer.name if customer and customer.name else None
             billing_details = session.metadata.get("billing_details", {})
             payment_date = user_payment_history.payment_date
@@ -156,14 +168,13 @@ def check_payment_status(
 
 
 @payments.post("/webhook")
-async def webhook(request: Request):
+async def webhook(request: Request, background_tasks: BackgroundTasks):
     """
-    The function processes a Stripe webhook event for completed checkout sessions and generates and
-    saves invoice details.
+    The function receives Stripe webhook events. It only verifies the signature and stores the event
+    before answering, so Stripe gets its acknowledgement at once; the event is applied by the webhook
+    worker (`app.payment.webhookWorker`) in the background, with retries.
 
-    :param request: The code snippet you provided is a Python FastAPI endpoint for handling a webhook
-    from Stripe. The endpoint processes a checkout session completed event and saves relevant payment
-    and invoice details to a database
+    :param request: The webhook request sent by Stripe
     :type request: Request
     :return: The code snippet is returning a JSONResponse with content {"success": True}.
     """
@@ -179,103 +190,10 @@ async def webhook(request: Request):
         raise HTTPException(status_code=400, detail=str(e))
     except stripe.error.SignatureVerificationError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    customer_id = event["data"]["object"]["customer"]
-    customer = stripe.Customer.retrieve(customer_id)
-    customer_email = customer.get("email", None)
-    db = SessionLocal()
-    user_details = (
-        db.query(User)
-        .filter(
-            User.email == customer_email,
-            User.record_status == RECORD_STATUS,
-            User.deleted == DELETED,
-        )
-        .first()
-    )
-    if user_details is None:
-        db.close()
-        response = JSONResponse(
-            content={
-                "success": False,
-                "message": "USER_NOT_FOUND",
-                "translation_key": "USER_NOT_FOUND",
-                "status": status.HTTP_400_BAD_REQUEST,
-            }
-        )
-        response.status_code = status.HTTP_400_BAD_REQUEST
-        return response
-
-    if event["type"] == "invoice.created":
-        invoice = event["data"]["object"]
-        expiry_date_timestamp = invoice["period_end"]
-        next_payment_date = (datetime.now() + timedelta(days=365)).date()
-        created_by_id = user_details.id
-        expires_at_datetime = datetime.fromtimestamp(
-            expiry_date_timestamp, timezone.utc
-        )
-        next_payment_formatted_date = expires_at_datetime.strftime("%Y-%m-%d %H:%M:%S")
-        payment_history = (
-            db.query(PaymentHistory)
-            .filter(PaymentHistory.invoice_detail == invoice.id)
-            .first()
-        )
-        invoiceObject = SaveInvoiceDetail(
-            db,
-            event["data"]["object"].id,
-            invoice,
-            payment_history,
-            next_payment_formatted_date,
-            customer_email,
-        )
-
-    if event["type"] == "checkout.session.completed":
- 
-        session = event["data"]["object"]
-        payment_intent_id = session["payment_intent"]
-        checkout_id = session["id"]
-        customer_id = session["customer"]
-        payment_status = session.get("payment_status")
-        payment_transaction_status = session["status"]
-        payment_intent_ids = session["payment_intent"]
-        payment_intents = stripe.PaymentIntent.retrieve(payment_intent_ids)
-        next_payment_date = (datetime.now() + timedelta(days=365)).date()
-        paid_amount = payment_intents["amount_received"] / 100
-        total_amount = paid_amount
-        customer_name = session.customer_details.name
-        payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
- 
-        payment_history = PaymentHistory(
-            payment_date=datetime.now().date(),
-            total_amount=total_amount,
-            next_payment_date=next_payment_date,
-            status=payment_status,
-            created_by_id=user_details.id,
-            stripe_payment_intent_id=payment_intent_id,
-            stripe_checkout_id=checkout_id,
-            customer_id=customer_id,
-            stripe_transaction_status=payment_transaction_status,
-            checkout_detail=json.dumps(session),
-            payment_intent_detail=json.dumps(payment_intent),
-            # stripe_subscription_id= customer_name,
-        )
- 
-        db.add(payment_history)
-        db.commit()
-        invoice = stripe.Invoice.create(
-            customer=customer_id,
-            auto_advance=(
-                False if payment_intent["payment_method_types"][0] == "card" else True
-            ),
-        )
-        payment_history.invoice_detail = invoice.id
-        db.add(payment_history)
- 
-        db.commit()
-        # user = db.query(User).filter(User.email == customer_email).first()
-        # if user:
-        #     user.role_id = 2
-        #     db.commit()
-    db.close()
+    stored = await run_in_threadpool(store_stripe_event, event, json.loads(payload))
+    # A redelivered event is acknowledged again without being processed twice
+    if stored is not None:
+        background_tasks.add_task(process_pending_events)
     return JSONResponse(content={"success": True})
 
 
@@ -306,14 +224,37 @@ def create_customer(email):
         print(f"Error creating customer: {e}")
         return None
  
+INVOICE_LIST = ListSpec(
+    fields={
+        "id": Invoice.id,
+        "created_at": Invoice.created_at,
+        "payment_id": Invoice.payment_id,
+        "payment_date": Invoice.payment_date,
+        "created_by_id": Invoice.created_by_id,
+        "stripe_invoice_id": Invoice.stripe_invoice_id,
+        "status": Invoice.status,
+        "file_path": Invoice.file_path,
+        "total_amount": PaymentHistory.total_amount,
+        "next_payment_date": PaymentHistory.next_payment_date,
+        "stripe_payment_intent_id": PaymentHistory.stripe_payment_intent_id,
+    },
+    sort_keys=("payment_date",),
+    default_sort="-payment_date",
+)
+
+
 @payments.get("/invoices/")
 def get_invoices(
-    user_id: int, db: Session = Depends(get_db), user_data: dict = Depends(JWTBearer())
+    user_id: int,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
 ):
     """
-    This Python function retrieves all invoices from the database filtered by user_id, along with the
-    This Python function retrieves all invoices from the database filtered by user_id, along with the
-    amount_paid from the payment_history table.
+    This Python function retrieves the invoices of a user from the database one page at a time, newest
+    first, along with the amount_paid from the payment_history table; see `app.pagination` for the
+    cursor and sort (payment_date) parameters. Every invoice is built from all fields, so `fields` is
+    ignored. Only the listed columns are read; the Stripe payloads are never loaded.
 
     :param user_id: The ID of the user whose invoices are to be retrieved.
     :type user_id: int
@@ -321,56 +262,47 @@ def get_invoices(
     using the `Depends` function with the `get_db` function as a dependency. This parameter represents a
     database session that will be used to query the database for invoices.
     :type db: Session
-    :return: A list of dictionaries containing invoice details and amount_paid.
+    :return: A page of dictionaries containing invoice details and amount_paid under "data", and the
+    cursor of the next page under "next_cursor".
     """
-    results = (
-        db.query(
-            Invoice,
-            PaymentHistory.total_amount,
-            Invoice.payment_date,
-            PaymentHistory.next_payment_date,
-            PaymentHistory.stripe_payment_intent_id,
-        )
+    page.fields = None
+    results = paginate(
+        db.query(Invoice)
         .join(PaymentHistory, Invoice.payment_id == PaymentHistory.id)
-        .filter(Invoice.created_by_id == user_id)
-        .all()
+        .filter(Invoice.created_by_id == user_id),
+        INVOICE_LIST,
+        page,
     )
 
-
     invoices = []
-    for (
-        invoice_obj,
-        amount_paid,
-        payment_date,
-        next_payment_date,
-        stripe_payment_intent_id,
-    ) in results:
+    for row in results["data"]:
+        payment_date = row["payment_date"]
+        next_payment_date = row["next_payment_date"]
         # Calculate subscription period
-        subscription_period = None
-        subscription_period_str = None
+        subscription_plan = "Monthly"
         if next_payment_date and payment_date:
             difference_in_days = (next_payment_date - payment_date).days
-            subscription_period_in_months = round(difference_in_days / 30.4375)
-            subscription_period_str = f"{subscription_period_in_months} Months"
+            if difference_in_days >= 365:
+                subscription_plan = "Yearly"
 
         invoice = {
             "invoice": {
-                "created_at": invoice_obj.created_at,
-                "payment_id": invoice_obj.payment_id,
+                "created_at": row["created_at"],
+                "payment_id": row["payment_id"],
                 "payment_date": payment_date.strftime("%Y-%m-%d"),
-                "created_by_id": invoice_obj.created_by_id,
-                "stripe_invoice_id": invoice_obj.stripe_invoice_id,
+                "created_by_id": row["created_by_id"],
+                "stripe_invoice_id": row["stripe_invoice_id"],
                 "next_invoice_date": (
                     next_payment_date.strftime("%Y-%m-%d")
                     if next_payment_date
                     else None
                 ),
-                "id": invoice_obj.id,
-                "status": invoice_obj.status,
+                "id": row["id"],
+                "status": row["status"],
                 "invoice_status": "Success",
-                "file_path": invoice_obj.file_path,
+                "file_path": row["file_path"],
             },
-            "amount_paid": amount_paid,
+            "amount_paid": row["total_amount"],
             "start_date": payment_date.strftime("%d %B %Y"),
             "renewal_date": (
                 next_payment_date.strftime("%d %B %Y") if next_payment_date else None
@@ -380,189 +312,90 @@ def get_invoices(
                 if next_payment_date and next_payment_date > datetime.now().date()
                 else "inactive"
             ),
-            "transaction_id": stripe_payment_intent_id,
-            "subscription_plan": (
-                "Yearly"
-                if next_payment_date and difference_in_days >= 365
-                else "Monthly"
+            "transaction_id": row["stripe_payment_intent_id"],
+            "subscription_plan": subscription_plan,
+            "subscription_period": (
+                f"{payment_date.strftime('%d %B %Y')} - {next_payment_date.strftime('%d %B %Y')}"
+                if next_payment_date
+                else payment_date.strftime("%d %B %Y")
             ),
-            "subscription_period": f"{payment_date.strftime('%d %B %Y')} - {next_payment_date.strftime('%d %B %Y')}",
         }
         invoices.append(invoice)
-    db.close()
-    return invoices
+    return {"data": invoices, "next_cursor": results["next_cursor"]}
 
 
-def SaveInvoiceDetail(
-    db: Session,
-    invoice_id: str,
-    invoice_data: json,
-    payment_history: dict,
-    next_payment_date: date,
-    customer_email: str,
+@payments.get("/audit/{payment_id}")
+def get_payment_audit(
+    payment_id: int, db: Session = Depends(get_db), user_data: dict = Depends(JWTBearer())
 ):
     """
-    This function saves invoice details along with payment history and subscription data in a database.
-
-    :param db: The `db` parameter is an instance of the database session that will be used to interact
-    with the database. It is typically used to query, insert, update, and delete data from the database
-    within the context of a session
-
-    """
-    try:
-
-        pdffile = retrieve_invoice_pdf(invoice_id)
-        db_invoice = Invoice(
-            stripe_invoice_id=invoice_id,
-            invoice_detail=invoice_data,
-            payment_id=payment_history.id,
-            status=invoice_data["status"],
-            next_invoice_date=next_payment_date,
-            file_path=pdffile,
-            invoice_status="Success",
-        )
-        db_invoice.payment_date = payment_history.payment_date
-        db_invoice.created_by_id = payment_history.created_by_id
-        db_invoice.invoice_detail = invoice_data
-        db.add(db_invoice)
-        db.commit()
-        db.refresh(db_invoice)
-        return db_invoice
-    except Exception as e:
-        print("error in invoice", str(e))
-        response = JSONResponse(
-            content={
-                "success": False,
-                "message": "An error occurred.",
-                "translation_key": "INTERNAL_SERVER_ERROR",
-                "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
-            }
-        )
-        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-        return response
-    finally:
-        db.close()
- 
- 
-def retrieve_invoice_pdf(invoice_id):
-    """
-    The function `retrieve_invoice_pdf` retrieves and saves an invoice PDF from Stripe API or creates a
-    custom invoice PDF if the PDF URL is not available.
-
-    :param invoice_id: The `retrieve_invoice_pdf` function you provided seems to be a Python function
-    that retrieves and saves an invoice PDF from a Stripe invoice. It first checks if the invoice has a
-    PDF URL, and if not, it creates a custom PDF with invoice details. If a PDF URL is available, it
-    downloads
-    :return: The function `retrieve_invoice_pdf` returns the file path of the invoice PDF that was
-    either created or downloaded successfully. If there was an error during the process, it returns
-    `None`.
+    The function `get_payment_audit` returns the Stripe snapshots recorded for a payment of the
+    current user: the checkout session and payment intent of the payment, and the Stripe invoice of
+    each of its invoices. The snapshots are read from the compressed `stripe_payload` table.
     """
-    try:
-        db = SessionLocal()
-        destination_path = "invoices"
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        if not os.path.exists(destination_path):
-            os.makedirs(destination_path)
-        invoice = stripe.Invoice.retrieve(invoice_id)
-        pdf_url = invoice.invoice_pdf
-        # payment_history = db.query(PaymentHistory).filter(PaymentHistory.stripe_checkout_id == session_id).first()
-
-        payments = (
-            db.query(PaymentHistory)
-            .filter(PaymentHistory.invoice_detail == invoice.id)
-            .first()
-        )
-        next_payment_date = payments.next_payment_date
-        plan_active = "inactive"
-        if (
-            payments
-            and payments.next_payment_date
-            and payments.next_payment_date > datetime.now().date()
-        ):
-            plan_active = "active"
-        transaction_id = payments.stripe_payment_intent_id
-        amount = payments.total_amount
-        payment_date = payments.payment_date
-        subscription_period = (
-            next_payment_date - payment_date if next_payment_date else None
-        )
-
-        subscription_plan = (
-            "Yearly"
-            if subscription_period and subscription_period.days >= 365
-            else "Monthly"
-        )
-        subscription_period_in_months = None
-
-        if next_payment_date and payment_date:
-            difference_in_days = (next_payment_date - payment_date).days
-
-            subscription_period_in_months = round(difference_in_days / 30.4375)
-
-            subscription_period = subscription_period_in_months
-        subscription_period_str = (
-            str(subscription_period) + " Months" if subscription_period else None
+    payment = (
+        db.query(PaymentHistory.id, PaymentHistory.stripe_invoice_id)
+        .filter(
+            PaymentHistory.id == payment_id,
+            PaymentHistory.created_by_id == user_data.get("id"),
         )
-
-        if pdf_url is None:
-            utc_datetime = datetime.fromtimestamp(invoice.period_start, timezone.utc)
-            invoice_date = utc_datetime.strftime("%Y-%m-%d %H:%M:%S")
-            invoice_data = {
-                "Invoice Number": invoice.id,
-                "Date": payment_date.strftime("%d %B %Y"),
-                # "customer_info":invoice.customer_address,
-                # "Customer Information":invoice.account_name,
-                "Subscription Plan": subscription_plan,
-                "Subscription Period": f"{payment_date.strftime('%d %B %Y')} - {next_payment_date.strftime('%d %B %Y')}",
-                "Total Amount Paid": amount,
-                "Transaction ID": transaction_id,
-                # "Currency":invoice.currency,
-                # "account_country":invoice.account_country,
-                # "account_name": invoice.account_name,
-                # "currency":invoice.currency,
-                # "Customer":invoice.customer,
-                "Subscription Expiry Date": next_payment_date.strftime("%d %B %Y"),
-                "Status": plan_active,
+        .first()
+    )
+    if payment is None:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    invoices = (
+        db.query(Invoice.id, Invoice.stripe_invoice_id)
+        .filter(Invoice.payment_id == payment.id)
+        .order_by(Invoice.id)
+        .all()
+    )
+    return {
+        "payment_id": payment.id,
+        "stripe_invoice_id": payment.stripe_invoice_id,
+        "payloads": load_payloads(db, PAYMENT_HISTORY_OWNER, payment.id),
+        "invoices": [
+            {
+                "id": invoice.id,
+                "stripe_invoice_id": invoice.stripe_invoice_id,
+                "payloads": load_payloads(db, INVOICE_OWNER, invoice.id),
             }
-            file_path = os.path.join(
-                destination_path, f"invoice_{invoice_id}_{timestamp}.pdf"
-            )
-            create_invoice_pdf(file_path, invoice_data)
-
-            print("Custom invoice PDF created successfully.")
-            return file_path
-        else:
-            response = requests.get(pdf_url)
-            if response.status_code == 200:
-                file_path = os.path.join(
-                    destination_path, f"invoice_{invoice.id}_{timestamp}.pdf"
-                )
-                with open(file_path, "wb") as f:
-                    f.write(response.content)
-                print("Invoice PDF saved successfully.")
-            else:
-                print(
-                    f"Failed to download invoice PDF. Status code: {response.status_code}"
-                )
-        return f"invoice_{invoice.id}_{timestamp}.pdf"
-
-    except stripe.error.StripeError as e:
-        print(f"Failed to retrieve invoice PDF: {e}")
-        return None
+            for invoice in invoices
+        ],
+    }
 
 
 @payments.get("/download-invoice-pdf/{filename}")
-async def get_invoice(
+def get_invoice(
     filename: str,
-    # user_data: dict = Depends(JWTBearer())
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
 ):
     """
     The function `get_invoice` retrieves and returns an invoice file specified by the filename
-    parameter.
+    parameter, for invoices of the current user only. An `invoice_{id}.pdf` that has not been
+    rendered yet is rendered on this first request and kept on disk for the next ones; ids the
+    database does not know never reach Stripe.
     """
+    invoice_id = invoice_id_from_filename(filename)
+    conditions = [Invoice.file_path == filename]
+    if invoice_id is not None:
+        conditions.append(Invoice.stripe_invoice_id == invoice_id)
+    invoice = (
+        db.query(Invoice.stripe_invoice_id, Invoice.file_path)
+        .filter(or_(*conditions), Invoice.created_by_id == user_data.get("id"))
+        .first()
+    )
+    db.close()
+    if invoice is None or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+
     invoice_path = os.path.join("invoices", filename)
     if not os.path.exists(invoice_path):
-        raise HTTPException(status_code=404, detail="Invoice not found")
+        if invoice_id is None:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+        invoice_path = ensure_invoice_pdf(invoice.stripe_invoice_id)
+        if invoice_path is None:
+            raise HTTPException(status_code=404, detail="Invoice not found")
 
     return FileResponse(invoice_path, filename=filename)
 
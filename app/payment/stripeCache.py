@@ -0,0 +1,56 @@
+import os
+import threading
+from typing import Callable
+import stripe
+from cachetools import TTLCache
+
+STRIPE_CACHE_TTL_SECONDS = int(os.getenv("STRIPE_CACHE_TTL_SECONDS", "3600"))
+STRIPE_CACHE_SIZE = int(os.getenv("STRIPE_CACHE_SIZE", "5000"))
+
+# Only objects that no longer change are kept: completed checkout sessions, payment intents in a
+# terminal state and customers (whose name and email the application only reads)
+stripe_cache = TTLCache(maxsize=STRIPE_CACHE_SIZE, ttl=STRIPE_CACHE_TTL_SECONDS)
+stripe_cache_lock = threading.Lock()
+
+TERMINAL_PAYMENT_INTENT_STATUSES = ("succeeded", "canceled")
+
+
+def cached_retrieve(
+    kind: str, object_id: str, retrieve: Callable, is_final: Callable = lambda obj: True
+):
+    """
+    The function `cached_retrieve` returns a Stripe object from the local cache, or retrieves it from
+    Stripe and caches it when `is_final` says it can no longer change.
+    """
+    key = (kind, object_id)
+    with stripe_cache_lock:
+        obj = stripe_cache.get(key)
+    if obj is not None:
+        return obj
+    obj = retrieve(object_id)
+    if is_final(obj):
+        with stripe_cache_lock:
+            stripe_cache[key] = obj
+    return obj
+
+
+def retrieve_checkout_session(session_id: str):
+    return cached_retrieve(
+        "checkout_session",
+        session_id,
+        stripe.checkout.Session.retrieve,
+        lambda session: session.get("status") == "complete",
+    )
+
+
+def retrieve_payment_intent(payment_intent_id: str):
+    return cached_retrieve(
+        "payment_intent",
+        payment_intent_id,
+        stripe.PaymentIntent.retrieve,
+        lambda intent: intent.get("status") in TERMINAL_PAYMENT_INTENT_STATUSES,
+    )
+
+
+def retrieve_customer(customer_id: str):
+    return cached_retrieve("customer", customer_id, stripe.Customer.retrieve)
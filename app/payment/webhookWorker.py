@@ -0,0 +1,286 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+import stripe
+from cachetools import TTLCache
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Invoice, PaymentHistory, StripeEvent, User
+from app.params import DELETED, RECORD_STATUS, USER_NOT_FOUND
+from app.payment.invoice import SaveInvoiceDetail
+from app.payment.invoiceRenderer import submit_invoice_pdf
+from app.payment.payloadArchive import (
+    CHECKOUT_SESSION_PAYLOAD,
+    PAYMENT_HISTORY_OWNER,
+    PAYMENT_INTENT_PAYLOAD,
+    archive_payload,
+)
+from app.payment.stripeCache import retrieve_customer, retrieve_payment_intent
+from database import SessionLocal
+
+EVENT_PENDING = "pending"
+EVENT_PROCESSING = "processing"
+EVENT_PROCESSED = "processed"
+EVENT_FAILED = "failed"
+HANDLED_EVENT_TYPES = ("invoice.created", "checkout.session.completed")
+
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECONDS = int(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "30"))
+WEBHOOK_BATCH_SIZE = 50
+# An event left in processing this long belongs to a worker that died, it is picked up again
+WEBHOOK_LOCK_TIMEOUT = timedelta(minutes=10)
+
+worker_lock = threading.Lock()
+# Ids of the events stored recently, so Stripe's redeliveries are answered without a database write
+recent_event_ids = TTLCache(maxsize=10000, ttl=24 * 60 * 60)
+recent_event_ids_lock = threading.Lock()
+
+
+class WebhookEventError(Exception):
+    """
+    Raised when an event cannot be applied yet; the event is retried later.
+    """
+
+
+def store_stripe_event(event: stripe.Event, payload: Dict[str, Any]) -> Optional[StripeEvent]:
+    """
+    The function `store_stripe_event` persists a verified webhook event before it is acknowledged, so
+    the event survives even if the process stops before the worker handles it.
+
+    :return: The stored event, or None when the event was already received. Redeliveries are caught
+    by the recent id cache, or else by the unique index on the event id.
+    """
+    with recent_event_ids_lock:
+        if event["id"] in recent_event_ids:
+            return None
+    db = SessionLocal()
+    try:
+        stripe_event = StripeEvent(
+            event_id=event["id"],
+            event_type=event["type"],
+            payload=payload,
+            stripe_created_at=datetime.fromtimestamp(event["created"], timezone.utc).replace(
+                tzinfo=None
+            ),
+            status=EVENT_PENDING,
+        )
+        db.add(stripe_event)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        stripe_event = None
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    with recent_event_ids_lock:
+        recent_event_ids[event["id"]] = True
+    return stripe_event
+
+
+def already_applied(db: Session, event: stripe.Event) -> bool:
+    """
+    Checks, with one indexed lookup, whether the effect of an event is already committed. Stripe can
+    send the same payment in several events. A retried event whose earlier attempt failed before
+    its commit is not found here; its Stripe side effects are covered by idempotency keys instead.
+    """
+    data = event["data"]["object"]
+    if event["type"] == "checkout.session.completed":
+        model, column = PaymentHistory, PaymentHistory.stripe_checkout_id
+    elif event["type"] == "invoice.created":
+        model, column = Invoice, Invoice.stripe_invoice_id
+    else:
+        return False
+    return db.query(model.id).filter(column == data["id"]).first() is not None
+
+
+def handle_invoice_created(db: Session, event: stripe.Event, customer_email: str) -> None:
+    invoice = event["data"]["object"]
+    expiry_date_timestamp = invoice["period_end"]
+    expires_at_datetime = datetime.fromtimestamp(expiry_date_timestamp, timezone.utc)
+    next_payment_formatted_date = expires_at_datetime.strftime("%Y-%m-%d %H:%M:%S")
+    payment_history = (
+        db.query(PaymentHistory)
+        .filter(PaymentHistory.stripe_invoice_id == invoice.id)
+        .first()
+    )
+    if payment_history is None:
+        # The checkout that created the invoice has not been applied yet
+        raise WebhookEventError(f"No payment recorded for invoice {invoice.id}")
+    SaveInvoiceDetail(
+        db,
+        invoice.id,
+        invoice,
+        payment_history,
+        next_payment_formatted_date,
+        customer_email,
+    )
+    # The PDF is produced by the render pool; the download endpoint renders it if this run fails
+    submit_invoice_pdf(invoice.id)
+
+
+def handle_checkout_completed(db: Session, event: stripe.Event, user_details: User) -> None:
+    session = event["data"]["object"]
+    payment_intent_id = session["payment_intent"]
+    customer_id = session["customer"]
+    payment_intent = retrieve_payment_intent(payment_intent_id)
+    next_payment_date = (datetime.now() + timedelta(days=365)).date()
+    total_amount = payment_intent["amount_received"] / 100
+
+    payment_history = PaymentHistory(
+        payment_date=datetime.now().date(),
+        total_amount=total_amount,
+        next_payment_date=next_payment_date,
+        status=session.get("payment_status"),
+        created_by_id=user_details.id,
+        stripe_payment_intent_id=payment_intent_id,
+        stripe_checkout_id=session["id"],
+        customer_id=customer_id,
+        stripe_transaction_status=session["status"],
+    )
+    # A retry after a failed commit gets back the invoice already created for this checkout
+    invoice = stripe.Invoice.create(
+        customer=customer_id,
+        auto_advance=(
+            False if payment_intent["payment_method_types"][0] == "card" else True
+        ),
+        idempotency_key=f"checkout-invoice-{session['id']}",
+    )
+    payment_history.stripe_invoice_id = invoice.id
+    db.add(payment_history)
+    db.flush()
+    archive_payload(
+        db, PAYMENT_HISTORY_OWNER, payment_history.id, CHECKOUT_SESSION_PAYLOAD, session
+    )
+    archive_payload(
+        db, PAYMENT_HISTORY_OWNER, payment_history.id, PAYMENT_INTENT_PAYLOAD, payment_intent
+    )
+    if not user_details.stripe_id:
+        user_details.stripe_id = customer_id
+    db.commit()
+
+
+def handle_stripe_event(db: Session, event: stripe.Event) -> None:
+    """
+    Applies one Stripe event. Event types the application does not use, and events whose effect is
+    already recorded, are acknowledged without any Stripe call.
+    """
+    if event["type"] not in HANDLED_EVENT_TYPES or already_applied(db, event):
+        return
+    customer_id = event["data"]["object"]["customer"]
+    active_users = db.query(User).filter(
+        User.record_status == RECORD_STATUS, User.deleted == DELETED
+    )
+    # Customers created at checkout are mapped to their user without asking Stripe
+    user_details = active_users.filter(User.stripe_id == customer_id).first()
+    if user_details is not None:
+        customer_email = user_details.email
+    else:
+        customer = retrieve_customer(customer_id)
+        customer_email = customer.get("email", None)
+        user_details = active_users.filter(User.email == customer_email).first()
+    if user_details is None:
+        raise WebhookEventError(USER_NOT_FOUND)
+
+    if event["type"] == "invoice.created":
+        handle_invoice_created(db, event, customer_email)
+    elif event["type"] == "checkout.session.completed":
+        handle_checkout_completed(db, event, user_details)
+
+
+def claim_event(db: Session, event: StripeEvent, now: datetime) -> bool:
+    """
+    Marks an event as processing unless another worker claimed it first.
+    """
+    claimable = (
+        StripeEvent.status == EVENT_PENDING
+        if event.status == EVENT_PENDING
+        else and_(
+            StripeEvent.status == EVENT_PROCESSING,
+            StripeEvent.locked_at < now - WEBHOOK_LOCK_TIMEOUT,
+        )
+    )
+    claimed = (
+        db.query(StripeEvent)
+        .filter(StripeEvent.id == event.id, claimable)
+        .update(
+            {StripeEvent.status: EVENT_PROCESSING, StripeEvent.locked_at: now},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return claimed == 1
+
+
+def process_event(db: Session, event: StripeEvent) -> None:
+    try:
+        handle_stripe_event(db, stripe.Event.construct_from(event.payload, stripe.api_key))
+        event.status = EVENT_PROCESSED
+        event.processed_at = datetime.now()
+        event.last_error = None
+    except Exception as e:
+        db.rollback()
+        event.attempts += 1
+        event.last_error = str(e)
+        if event.attempts >= WEBHOOK_MAX_ATTEMPTS:
+            event.status = EVENT_FAILED
+        else:
+            event.status = EVENT_PENDING
+            event.next_attempt_at = datetime.now() + timedelta(
+                seconds=WEBHOOK_RETRY_BASE_SECONDS * 2 ** (event.attempts - 1)
+            )
+        print(f"Stripe event {event.event_id} failed (attempt {event.attempts}): {e}")
+    event.locked_at = None
+    db.commit()
+
+
+def process_pending_events() -> int:
+    """
+    The webhook worker. Handles the stored events that are due, oldest Stripe event first, one at a
+    time. A failing event is retried with exponential backoff and marked as failed after
+    `WEBHOOK_MAX_ATTEMPTS` attempts. Runs after each webhook delivery and periodically from the
+    scheduler; a run already in progress in this process makes the others return at once.
+
+    :return: The number of events handled.
+    """
+    if not worker_lock.acquire(blocking=False):
+        return 0
+    handled = 0
+    db = SessionLocal()
+    try:
+        while True:
+            now = datetime.now()
+            events = (
+                db.query(StripeEvent)
+                .filter(
+                    or_(
+                        and_(
+                            StripeEvent.status == EVENT_PENDING,
+                            or_(
+                                StripeEvent.next_attempt_at.is_(None),
+                                StripeEvent.next_attempt_at <= now,
+                            ),
+                        ),
+                        and_(
+                            StripeEvent.status == EVENT_PROCESSING,
+                            StripeEvent.locked_at < now - WEBHOOK_LOCK_TIMEOUT,
+                        ),
+                    )
+                )
+                .order_by(StripeEvent.stripe_created_at, StripeEvent.id)
+                .limit(WEBHOOK_BATCH_SIZE)
+                .all()
+            )
+            for event in events:
+                if claim_event(db, event, now):
+                    process_event(db, event)
+                    handled += 1
+            if len(events) < WEBHOOK_BATCH_SIZE:
+                break
+    finally:
+        db.close()
+        worker_lock.release()
+    return handled
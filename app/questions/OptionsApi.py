@@ -2,6 +2,7 @@ import shutil
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from app.catalogCache import ANSWER_KEYS, bump_catalog
 from app.login.auth import JWTBearer
 from app.models import Options, Question
 from starlette import status
@@ -41,6 +42,7 @@ def create_options(create_option: CreateOptions, db: Session = Depends(get_db),
             created_by_id=1
         )
         db.add(add_option)
+        bump_catalog(db, ANSWER_KEYS)
         db.commit()
         db.close()
         return {"Message": "Options Created Successfully"}
@@ -65,6 +67,7 @@ def update_options(option_id:int, update_option: CreateOptions, db: Session = De
         option.score = update_option.score
         option.feedback = update_option.feedback
         option.question_id = update_option.question_id
+        bump_catalog(db, ANSWER_KEYS)
         db.commit()
         db.close()
         return {"Message": "Options Updated Successfully"}
@@ -1,11 +1,20 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import io
 import json
 import os
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from app.ai.api import aicall
+from app.catalogCache import ANSWER_KEYS, catalog_version
+from app.dashboard.leaderboard import leaderboard
+from app.dashboard.scoreRollup import record_paper_score
+from app.ai.grading import (
+    attach_pending_grading_results,
+    load_grading_results,
+    save_grading_results,
+)
 from app.models import (
     PaymentHistory,
     QuestionPaper,
@@ -17,6 +26,14 @@ from app.models import (
     UserResponse,
 )
 from app.params import DELETED, ESSAY_QUESTION_TYPE_ID, INITIAL_SCORE, OPTION_SCORE
+from app.questions.summary import (
+    build_result_summary,
+    load_answer_options,
+    result_summary_payload,
+    save_result_summary,
+)
+from app.questions.searchIndex import get_search_index
+from app.questions.tree import load_paper_question_tree, subtree_mark_totals
 from app.login.auth import JWTBearer
 from app.models import (
     QuestionPaper,
@@ -24,23 +41,29 @@ from app.models import (
     Section,
     Question,
     Options,
+    ResultSummary,
     Subject,
     UserResponse,
 )
 from app.params import DELETED, ESSAY_QUESTION_TYPE_ID
-from database import get_db
+from database import SessionLocal, get_db
 from starlette import status
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from bs4 import BeautifulSoup
 import base64
 import requests
 import json
 from PIL import Image
 import re
+import threading
+from cachetools import LRUCache
 
 question_route = APIRouter(prefix="/questions", tags=["Questions"])
 api_key = os.getenv("OPENAIKEY")
 BASE_URL = os.getenv("DOMAIN_URL")
+RESULT_VIEW_CACHE_SIZE = int(os.getenv("RESULT_VIEW_CACHE_SIZE", "1000"))
+result_view_cache = LRUCache(maxsize=max(RESULT_VIEW_CACHE_SIZE, 1))
+result_view_cache_lock = threading.Lock()
 
 
 @question_route.get("/")
@@ -76,22 +99,11 @@ def get_questions_with_options(
     information about question papers, sections, questions, options, and subquestions based on the
     provided criteria such as `paper_id`, `subject_id`, and `introtext_id`. The data structure includes
     details like paper ID, paper name, year, section name, section title, question ID, question text,
-    question type, options for
+    question type, options for. Every top level question also carries `total_score`, the sum of its
+    own mark and the marks of all of its subquestions at any depth.
     """
-    data = (
-        db.query(QuestionPaper, Section, Question, Options)
-        .join(Section, QuestionPaper.id == Section.question_paper_id)
-        .join(Question, Section.id == Question.section_id)
-        .outerjoin(Options, Question.id == Options.question_id)
-        .filter(
-            QuestionPaper.id == paper_id,
-            Question.subject_id == subject_id,
-            Question.deleted == DELETED,
-            Question.parent_id == None,
-            QuestionPaper.deleted == DELETED,
-        )
-        .all()
-    )
+    total_scores = subtree_mark_totals(db, paper_id)
+    paper, sections, tree = load_paper_question_tree(db, paper_id, subject_id)
     user_id = user_data["id"]
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -137,7 +149,7 @@ def get_questions_with_options(
                 response.status_code = status.HTTP_404_NOT_FOUND
                 return response
 
-    if not data:
+    if not sections:
         db.close()
         response = JSONResponse(
             content={
@@ -150,123 +162,61 @@ def get_questions_with_options(
         response.status_code = status.HTTP_404_NOT_FOUND
         return response
 
-    paper_sections = {}
-
-    subquestions_dict = {}
-    question_ids = [question.id for _, _, question, _ in data]
-    subquestions = db.query(Question).filter(Question.parent_id.in_(question_ids)).all()
-    options = (
-        db.query(Options)
-        .filter(Options.question_id.in_([q.id for q in subquestions]))
-        .all()
-    )
-
-    for subquestion in subquestions:
-        subquestions_dict.setdefault(subquestion.parent_id, []).append(subquestion)
-
-    options_dict = {}
-    for option in options:
-        options_dict.setdefault(option.question_id, []).append(option)
-
-    # Building the data structure
-    for paper, section, question, option in data:
-        if paper.id not in paper_sections:
-            paper_sections[paper.id] = {"paper_info": paper, "sections": {}}
-        if section.id not in paper_sections[paper.id]["sections"]:
-            paper_sections[paper.id]["sections"][section.id] = {
-                "section_info": section,
-                "questions": {},
-            }
-        if (
-            question.id
-            not in paper_sections[paper.id]["sections"][section.id]["questions"]
-        ):
-            paper_sections[paper.id]["sections"][section.id]["questions"][
-                question.id
-            ] = {"question_info": question, "options": [], "sub_questions": []}
-        # if option is not None:
-        #     paper_sections[paper.id]["sections"][section.id]["questions"][question.id]["options"].append({
-        #         "id": option.id,
-        #         "label": option.text,
-        #         "option_label":option.option_label,
-        #         "is_answer": 1 if option.is_correct else 0
-        #     })
-
-        if option is not None:
-            option_data = {
-                "id": option.id,
-                "label": option.text,
-                "option_label": option.option_label,
-            }
-            if mode == "instant":
-                option_data["is_answer"] = 1 if option.is_correct else 0
-            paper_sections[paper.id]["sections"][section.id]["questions"][question.id][
-                "options"
-            ].append(option_data)
-
-        # Using pre-fetched subquestions and options
-        subquestions_data = []
-        subqs = subquestions_dict.get(question.id, [])
-        for subquestion in subqs:
-            subquestion_options = options_dict.get(subquestion.id, [])
-            subquestions_data.append(
-                {
-                    "question_id": subquestion.id,
-                    # "is_first":subquestion.order,
-                    "question": subquestion.question_text,
-                    "source_text": subquestion.source_text,
-                    "score": subquestion.mark,
-                    "sub_question_label": subquestion.subquestion_label,
-                    "question_type": subquestion.question_type_id,
-                    "options": [
-                        {
-                            "id": opt.id,
-                            "label": opt.text,
-                            "option_label": opt.option_label,
-                            "is_answer": 1 if opt.is_correct else 0,
-                        }
-                        for opt in subquestion_options
-                    ],
-                }
-            )
-        paper_sections[paper.id]["sections"][section.id]["questions"][question.id][
-            "subquestions"
-        ] = subquestions_data
+    def option_payload(option, with_answer):
+        option_data = {
+            "id": option.id,
+            "label": option.text,
+            "option_label": option.option_label,
+        }
+        if with_answer:
+            option_data["is_answer"] = 1 if option.is_correct else 0
+        return option_data
 
-    # Formatting the result
+    roots_by_section = tree.roots_by_section()
     paper_sections_list = [
         {
-            "paper_id": paper_id,
-            "paper_name": paper_data["paper_info"].assessment_specification,
-            "year": paper_data["paper_info"].year,
+            "paper_id": paper.id,
+            "paper_name": paper.assessment_specification,
+            "year": paper.year,
             "sections": [
                 {
-                    "name": section_data["section_info"].name,
-                    "title": [section_data["section_info"].description],
+                    "name": section.name,
+                    "title": [section.description],
                     "questions": [
                         {
-                            "question_id": question_id,
-                            "question": question_data["question_info"].question_text,
-                            "score": question_data["question_info"].mark,
-                            "source_text": question_data["question_info"].source_text,
-                            "question_number": question_data[
-                                "question_info"
-                            ].question_number,
-                            "question_type": question_data[
-                                "question_info"
-                            ].question_type_id,
-                            "options": question_data["options"],
-                            "sub_questions": question_data["subquestions"],
+                            "question_id": question.id,
+                            "question": question.question_text,
+                            "score": question.mark,
+                            "total_score": total_scores.get(question.id, question.mark),
+                            "source_text": question.source_text,
+                            "question_number": question.question_number,
+                            "question_type": question.question_type_id,
+                            "options": [
+                                option_payload(option, mode == "instant")
+                                for option in tree.options_of(question.id)
+                            ],
+                            "sub_questions": [
+                                {
+                                    "question_id": subquestion.id,
+                                    "question": subquestion.question_text,
+                                    "source_text": subquestion.source_text,
+                                    "score": subquestion.mark,
+                                    "sub_question_label": subquestion.subquestion_label,
+                                    "question_type": subquestion.question_type_id,
+                                    "options": [
+                                        option_payload(option, True)
+                                        for option in tree.options_of(subquestion.id)
+                                    ],
+                                }
+                                for subquestion in tree.children_of(question.id)
+                            ],
                         }
-                        for question_id, question_data in section_data[
-                            "questions"
-                        ].items()
+                        for question in roots_by_section[section.id]
                     ],
                 }
-                for section_id, section_data in paper_data["sections"].items()
+                for section in sections
             ],
         }
-        for paper_id, paper_data in paper_sections.items()
     ]
     db.close()
     return paper_sections_list
@@ -362,13 +312,13 @@ def create_user_response(
 
         questions = db.query(Question).filter(Question.id.in_(question_ids)).all()
         question_types = db.query(QuestionType).all()
-        options = db.query(Options).all()
 
         question_dict = {question.id: question for question in questions}
         question_type_dict = {qt.id: qt for qt in question_types}
-        option_dict = {option.id: option for option in options}
+        option_dict = load_answer_options(db, responses)
 
         total_score = INITIAL_SCORE
+        essay_evaluations = []
         for response in responses:
             question_id = response["id"]
             answer = response["answer"]
@@ -417,6 +367,13 @@ def create_user_response(
                         response.status_code = status.HTTP_400_BAD_REQUEST
                         return response
                 total_score += rating
+                essay_evaluations.append(
+                    {
+                        "question_id": question_id,
+                        "rating": rating,
+                        "feedback": response.get("correctness"),
+                    }
+                )
             else:
                 try:
                     option_id = int(answer)
@@ -458,7 +415,29 @@ def create_user_response(
         )
 
         db.add(user_response)
+        db.flush()
+        attached = attach_pending_grading_results(
+            db,
+            user_id,
+            user_response.id,
+            [evaluation["question_id"] for evaluation in essay_evaluations],
+        )
+        save_grading_results(
+            db,
+            user_response.id,
+            [
+                evaluation
+                for evaluation in essay_evaluations
+                if evaluation["question_id"] not in attached
+            ],
+            user_id,
+            user_id=user_id,
+            prompt_versions={q.id: q.prompt_version for q in questions},
+        )
+        save_result_summary(db, user_response, user_response_json, option_dict)
+        record_paper_score(db, question_paper_id, user_id, total_score, user_id)
         db.commit()
+        leaderboard.record_score(question_paper_id, user_id, total_score)
         db.refresh(user_response)
         db.close()
         return {
@@ -548,7 +527,7 @@ async def create_user_response(
         questions = db.query(Question).filter(Question.id.in_(question_ids)).all()
         question_type_dict = {q.id: q.question_type_id for q in questions}
         question_score_dict = {q.id: q.mark for q in questions}
-        options_dict = {option.id: option for option in db.query(Options).all()}
+        options_dict = load_answer_options(db, responses)
 
         parent_question_ids = [q.parent_id for q in questions if q.parent_id]
         parent_questions = (
@@ -670,13 +649,24 @@ async def create_user_response(
             user_id=user_id,
             question_paper_id=question_paper_id,
             user_response=json.dumps(user_response_json, ensure_ascii=False),
-            ai_response=airesponse,
             year=year,
             created_by_id=1,
             total_score=option_scores,
         )
         db.add(user_response)
+        db.flush()
+        save_grading_results(
+            db,
+            user_response.id,
+            airesponse,
+            1,
+            user_id=user_id,
+            prompt_versions={q.id: q.prompt_version for q in questions},
+        )
+        save_result_summary(db, user_response, user_response_json, options_dict)
+        record_paper_score(db, question_paper_id, user_id, option_scores, 1)
         db.commit()
+        leaderboard.record_score(question_paper_id, user_id, option_scores)
         db.refresh(user_response)
 
         db.close()
@@ -693,42 +683,200 @@ async def create_user_response(
         )
 
 
+USER_RESPONSE_EXPORT_BATCH = 500
+
+
+def user_response_listing_query(
+    db: Session,
+    include_responses: bool,
+    user_id: Optional[int],
+    paper_id: Optional[int],
+    date_from: Optional[date],
+    date_to: Optional[date],
+):
+    """
+    Builds the projected, filtered query behind `/questions/alluser`. The large
+    `user_response` JSON column is only selected when it was asked for.
+    """
+    columns = [
+        UserResponse.id,
+        UserResponse.user_id,
+        UserResponse.question_paper_id,
+        UserResponse.subject_id,
+        UserResponse.year,
+        UserResponse.total_score,
+        UserResponse.created_at,
+    ]
+    if include_responses:
+        columns.append(UserResponse.user_response)
+    query = db.query(*columns)
+    if user_id is not None:
+        query = query.filter(UserResponse.user_id == user_id)
+    if paper_id is not None:
+        query = query.filter(UserResponse.question_paper_id == paper_id)
+    if date_from is not None:
+        query = query.filter(UserResponse.created_at >= date_from)
+    if date_to is not None:
+        query = query.filter(UserResponse.created_at < date_to + timedelta(days=1))
+    return query.order_by(UserResponse.id)
+
+
+def user_response_listing_item(row, include_responses: bool) -> Dict[str, Any]:
+    item = {
+        "id": row.id,
+        "user_id": row.user_id,
+        "question_paper_id": row.question_paper_id,
+        "subject_id": row.subject_id,
+        "year": row.year,
+        "total_score": row.total_score,
+        "created_at": row.created_at,
+    }
+    if include_responses:
+        user_response = row.user_response
+        if isinstance(user_response, str):
+            user_response = json.loads(user_response)
+        user_response["responses"] = [
+            {k: v for k, v in response_item.items() if k != "sub_questions"}
+            for response_item in user_response.get("responses", [])
+        ]
+        item["user_response"] = user_response
+    return item
+
+
+def export_user_responses(include_responses: bool, **filters):
+    """
+    Streams every matching user response as one JSON array, reading the table in
+    keyset batches so memory stays flat however many rows are exported.
+    """
+    db = SessionLocal()
+    try:
+        yield "["
+        query = user_response_listing_query(db, include_responses, **filters)
+        last_id = 0
+        first = True
+        while True:
+            rows = (
+                query.filter(UserResponse.id > last_id)
+                .limit(USER_RESPONSE_EXPORT_BATCH)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                item = user_response_listing_item(row, include_responses)
+                yield ("" if first else ",") + json.dumps(jsonable_encoder(item))
+                first = False
+            last_id = rows[-1].id
+            db.expunge_all()
+        yield "]"
+    finally:
+        db.close()
+
+
 @question_route.get("/alluser")
 def get_user_responses(
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: Optional[int] = None,
+    paper_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    include_responses: bool = False,
+    export: bool = False,
     db: Session = Depends(get_db),
     user_data: dict = Depends(JWTBearer()),
 ):
     """
-    The function retrieves all user responses from the database and processes them before returning the
-    results.
-
-    :param db: The `db` parameter in the `get_user_responses` function is of type `Session`, which is a
-    database session object. It is used to interact with the database and perform queries to retrieve
-    user responses stored in the database. The `Session` object is typically created using an ORM
-    (Object-
-    :type db: Session
-    :return: The code is defining a route `/alluser` with a GET method that retrieves all user responses
-    from the database. It then processes each user response by converting the `user_response` field from
-    JSON to a Python dictionary and modifies the structure of the responses by excluding the
-    "sub_questions" key from each response item. Finally, it returns the processed user responses. If
-    any exception occurs during this process,
+    The function lists user responses one page at a time, ordered by id.
+
+    :param cursor: The `next_cursor` returned by the previous page; the page starts after that id
+    :type cursor: int
+    :param limit: The maximum number of user responses returned in the page
+    :type limit: int
+    :param user_id: Only list the responses of this user
+    :param paper_id: Only list the responses to this question paper
+    :param date_from: Only list responses submitted on or after this date
+    :param date_to: Only list responses submitted on or before this date
+    :param include_responses: Include the submitted answers (the `user_response` JSON, without the
+    "sub_questions" of each item). They are left out by default because they are by far the largest
+    column of the table
+    :type include_responses: bool
+    :param export: Stream every matching response as a single JSON array instead of returning a page,
+    for admin exports
+    :type export: bool
+    :return: A dictionary with the page of user responses under "data" and the cursor of the next page
+    under "next_cursor" (None on the last page), or the streamed JSON array when `export` is set.
     """
+    filters = {
+        "user_id": user_id,
+        "paper_id": paper_id,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    if export:
+        db.close()
+        return StreamingResponse(
+            export_user_responses(include_responses, **filters),
+            media_type="application/json",
+        )
     try:
-        user_responses = db.query(UserResponse).all()
-
-        for response in user_responses:
-            response.user_response = json.loads(response.user_response)
-            response.user_response["responses"] = [
-                {k: v for k, v in response_item.items() if k != "sub_questions"}
-                for response_item in response.user_response.get("responses", [])
-            ]
+        query = user_response_listing_query(db, include_responses, **filters)
+        if cursor is not None:
+            query = query.filter(UserResponse.id > cursor)
+        rows = query.limit(limit).all()
+        user_responses = [
+            user_response_listing_item(row, include_responses) for row in rows
+        ]
         db.close()
-        return user_responses
+        return {
+            "data": user_responses,
+            "next_cursor": rows[-1].id if len(rows) == limit else None,
+        }
     except Exception as e:
         db.close()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@question_route.get("/search")
+def search_questions(
+    q: str = Query(..., min_length=2, max_length=200),
+    subject_id: Optional[int] = None,
+    paper_id: Optional[int] = None,
+    year: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    The function searches the question bank by wording: question text, source text and option text,
+    ranked by relevance. Served from the in-process index of `app.questions.searchIndex`, so no query
+    reaches the database.
+
+    :param q: The words to search for
+    :param subject_id: Only return questions of this subject
+    :param paper_id: Only return questions of this question paper
+    :param year: Only return questions of papers of this year
+    :param limit: The maximum number of questions returned
+    :return: A dictionary with the matching questions, best first, under "data". Each carries its
+    question, paper and subject ids, the paper year, the relevance score and the start of its text.
+    """
+    index = get_search_index()
+    if index is None:
+        response = JSONResponse(
+            content={
+                "success": False,
+                "message": "Search index is loading, try again shortly",
+                "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+            }
+        )
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return response
+    return {
+        "data": index.search(
+            q, subject_id=subject_id, paper_id=paper_id, year=year, limit=limit
+        )
+    }
+
+
 @question_route.get("/result/{user_response_id}")
 def get_question_options_text(
     user_response_id: int,
@@ -763,79 +911,32 @@ def get_question_options_text(
     - "correctAnswers": Total number of correct answers given by the user
     - "wrongAnswers": Total number of incorrect answers given by the user
     - "totalScore": Total score achieved by the user based on correct answers
-    - "time
+    - "score": Total score of the submission, as computed when it was stored; unlike "totalScore" it
+      includes the marks of graded essay answers
+    - "timeTaken": Time the user took for the question paper
+    - "user_response_id": ID of the user response
+    The summary is computed once when the submission is stored, so this is a single-row lookup.
     """
     try:
-        user_responses = (
-            db.query(UserResponse).filter(UserResponse.id == user_response_id).all()
-        )
-        if not user_responses:
-            raise HTTPException(status_code=404, detail="User response not found")
-
-        response_list = []
-        question_stats = {}
-        time_taken = 0
-
-        all_options = db.query(Options).all()
-        for user_response in user_responses:
-            response_json = json.loads(user_response.user_response)
-            time_taken = response_json.get("time")
-
-        for question_response in response_json.get("responses", []):
-            question_id = question_response.get("question_id")
-            answer = question_response.get("answer")
-            option_id = None
-            if answer is not None and answer.isdigit():
-                option_id = int(answer)
-
-                if question_id not in question_stats:
-                    question_stats[question_id] = {
-                        "total": 0,
-                        "correct": 0,
-                        "incorrect": 0,
-                    }
-
-                option = next((opt for opt in all_options if opt.id == option_id), None)
-                if option:
-                    is_correct = option.is_correct
-                    score = 1 if is_correct else 0
-                    response_list.append({"question_id": question_id, "score": score})
-                    question_stats[question_id]["total"] += 1
-                    if is_correct:
-                        question_stats[question_id]["correct"] += 1
-                    else:
-                        question_stats[question_id]["incorrect"] += 1
-                else:
-                    response_list.append(
-                        {
-                            "question_id": question_id,
-                            "option_id": option_id,
-                            "is_correct": None,
-                            "score": 0,
-                        }
-                    )
-
-        total_score = sum(stats["correct"] for stats in question_stats.values())
-        total_question_id = len(response_json.get("responses", []))
-        total_correct_answer = sum(
-            stats["correct"] for stats in question_stats.values()
-        )
-        total_wrong_answer = sum(
-            stats["incorrect"] for stats in question_stats.values()
+        summary = (
+            db.query(ResultSummary)
+            .filter(ResultSummary.user_response_id == user_response_id)
+            .first()
         )
-        user_response.total_score = total_score
-        db.commit()
+        if summary is None:
+            # Responses submitted before result summaries were stored
+            user_response = (
+                db.query(UserResponse).filter(UserResponse.id == user_response_id).first()
+            )
+            if not user_response:
+                db.close()
+                raise HTTPException(status_code=404, detail="User response not found")
+            summary = build_result_summary(db, user_response)
         db.close()
+        return result_summary_payload(summary)
 
-        return {
-            "totalAttempted": total_question_id,
-            "correctAnswers": total_correct_answer,
-            "wrongAnswers": total_wrong_answer,
-            "totalScore": total_score,
-            "timeTaken": time_taken,
-            "user_response_id": user_response_id,
-        }
-
+    except HTTPException:
+        raise
     except Exception as e:
         db.close()
         raise HTTPException(status_code=500, detail=str(e))
@@ -858,7 +959,18 @@ def get_response_result_view(
     :type db: Session
     :return: A dictionary containing answers, question paper ID, scores for each question, and total score.
     :rtype: Dict[str, Any]
+
+    Rendered views are kept in an in-process LRU cache of RESULT_VIEW_CACHE_SIZE entries (0
+    disables it). The correct answers, ratings and marks come from the current options and
+    questions, so entries are keyed by the answer key version that option edits bump.
     """
+    if RESULT_VIEW_CACHE_SIZE:
+        cache_key = (user_response_id, catalog_version(db, ANSWER_KEYS))
+        with result_view_cache_lock:
+            cached_view = result_view_cache.get(cache_key)
+        if cached_view is not None:
+            db.close()
+            return cached_view
     try:
         user_response = (
             db.query(UserResponse).filter(UserResponse.id == user_response_id).first()
@@ -882,42 +994,46 @@ def get_response_result_view(
         question_paper_id = response_json.get("paper_id")
         mode = response_json.get("exam_mode")
         response_list = []
-        all_questions = db.query(Question).all()
-        question_dict = {q.id: q for q in all_questions}
-        all_options = db.query(Options).all()
+        # Only the questions answered in this response, and their options, are needed
+        question_ids = {
+            question_response.get("id")
+            for question_response in response_json.get("responses", [])
+        }
+        question_ids.discard(None)
+        questions = db.query(Question).filter(Question.id.in_(question_ids)).all()
+        question_dict = {q.id: q for q in questions}
+        options = db.query(Options).filter(Options.question_id.in_(question_ids)).all()
         options_dict = {}
-        for option in all_options:
+        for option in options:
             if option.question_id not in options_dict:
                 options_dict[option.question_id] = []
             options_dict[option.question_id].append(option)
 
         if mode == "exam":
-            if isinstance(user_response.ai_response, str):
-                ai_response = json.loads(user_response.ai_response)
-            else:
-                ai_response = (
-                    user_response.ai_response if user_response.ai_response else []
-                )
+            evaluations = load_grading_results(db, user_response_id)
+            if not evaluations:
+                # Responses graded before the grading_result table only have the ai_response blob
+                if isinstance(user_response.ai_response, str):
+                    ai_response = json.loads(user_response.ai_response)
+                else:
+                    ai_response = (
+                        user_response.ai_response if user_response.ai_response else []
+                    )
+                evaluations = {
+                    item.get("question_id"): item for item in ai_response
+                }
 
             for question_response in response_json.get("responses", []):
                 question_id = question_response.get("id")
                 user_answer = question_response.get("answer")
                 question = question_dict.get(question_id)
-                get_question = question_dict.get(question_id)
-                mark = get_question.mark
                 if not question:
                     continue
+                mark = question.mark
 
                 question_type_id = question.question_type_id
                 if question_type_id == ESSAY_QUESTION_TYPE_ID:
-                    evaluation = next(
-                        (
-                            item
-                            for item in ai_response
-                            if item.get("question_id") == question_id
-                        ),
-                        {},
-                    )
+                    evaluation = evaluations.get(question_id, {})
                     correct_answer = None
                     explanation = evaluation.get(
                         "explanation", "Your answer does not have any explanation"
@@ -977,15 +1093,15 @@ def get_response_result_view(
 
         elif mode == "instant":
             correct_answers = {}
-            options = db.query(Options).filter(Options.is_correct == True).all()
             for option in options:
-                correct_answers.setdefault(option.question_id, []).append(option.id)
+                if option.is_correct:
+                    correct_answers.setdefault(option.question_id, []).append(option.id)
 
             for question_response in response_json.get("responses", []):
                 question_id = question_response.get("id")
                 option_id = question_response.get("answer")
                 get_question = question_dict.get(question_id)
-                mark = get_question.mark
+                mark = get_question.mark if get_question else None
                 correct_options = correct_answers.get(question_id, [])
                 correct_answer = next(
                     (
@@ -1023,10 +1139,14 @@ def get_response_result_view(
 
         db.close()
 
-        return {
+        result_view = {
             "answers": response_list,
             "question_paper_id": question_paper_id,
         }
+        if RESULT_VIEW_CACHE_SIZE:
+            with result_view_cache_lock:
+                result_view_cache[cache_key] = result_view
+        return result_view
 
     except Exception as e:
         db.close()
@@ -1061,22 +1181,9 @@ def get_essay_questions(
     details like paper ID, paper name, year, section name, section title, question ID, question text,
     question type, options for
     """
-    data = (
-        db.query(QuestionPaper, Section, Question, Options)
-        .join(Section, QuestionPaper.id == Section.question_paper_id)
-        .join(Question, Section.id == Question.section_id)
-        .outerjoin(Options, Question.id == Options.question_id)
-        .filter(
-            QuestionPaper.id == paper_id,
-            Question.subject_id == subject_id,
-            Question.deleted == DELETED,
-            QuestionPaper.deleted == DELETED,
-        )
-        .all()
-    )
+    paper, sections, tree = load_paper_question_tree(db, paper_id, subject_id)
     prompt = []
-    unique_prompts = set()
-    if not data:
+    if not sections:
         db.close()
         response = JSONResponse(
             content={
@@ -1088,123 +1195,53 @@ def get_essay_questions(
         response.status_code = status.HTTP_404_NOT_FOUND
         return response
 
-    subquestions = (
-        db.query(Question)
-        .filter(Question.parent_id.isnot(None), Question.deleted == DELETED)
-        .all()
-    )
-
-    subquestion_texts = {subquestion.id: subquestion for subquestion in subquestions}
-
-    paper_sections = {}
-
-    for paper, section, question, option in data:
-        if paper.id not in paper_sections:
-            paper_sections[paper.id] = {"paper_info": paper, "sections": {}}
-        if section.id not in paper_sections[paper.id]["sections"]:
-            paper_sections[paper.id]["sections"][section.id] = {
-                "section_info": section,
-                "questions": {},
-            }
-        if question.parent_id:
-            if (
-                question.parent_id
-                not in paper_sections[paper.id]["sections"][section.id]["questions"]
-            ):
-                parent_question = (
-                    db.query(Question).filter(Question.id == question.parent_id).first()
-                )
-                paper_sections[paper.id]["sections"][section.id]["questions"][
-                    question.parent_id
-                ] = {
-                    "question_info": parent_question,
-                    "options": [],
-                    "sub_questions": [],
-                    "question_text": (
-                        parent_question.question_text if parent_question else ""
-                    ),
-                }
-            parent_question_text = paper_sections[paper.id]["sections"][section.id][
-                "questions"
-            ][question.parent_id]["question_text"]
-            paper_sections[paper.id]["sections"][section.id]["questions"][
-                question.parent_id
-            ]["sub_questions"].append(
-                {
-                    "question_id": question.id,
-                    "question_text": question.question_text,
-                    # "parent_question_id": question.parent_id,
-                    # "parent_question_text": parent_question_text,
-                    "score": question.mark if question.mark else None,
-                    "source_text": (
-                        question.source_text if question.source_text else None
-                    ),
-                    "question_number": (
-                        question.question_number if question.question_number else None
-                    ),
-                    "question_type": (
-                        question.question_type_id if question.question_type_id else None
-                    ),
-                    "options": [],
-                }
-            )
-        elif question.question_type_id == ESSAY_QUESTION_TYPE_ID:
-            paper_sections[paper.id]["sections"][section.id]["questions"][
-                question.id
-            ] = {
-                "question_info": question,
-                "options": [],
-                "sub_questions": [],
-                "question_text": question.question_text,
-            }
-        if question.prompt_text and question.id not in unique_prompts:
+    section_ids = {section.id for section in sections}
+    for question in tree.questions.values():
+        if question.prompt_text and question.section_id in section_ids:
             prompt.append({"question_id": question.id, "value": question.prompt_text})
-            unique_prompts.add(question.id)
+
+    roots_by_section = tree.roots_by_section()
     paper_sections_list = [
         {
-            "paper_id": paper_id,
-            "paper_name": paper_data["paper_info"].assessment_specification,
-            "year": paper_data["paper_info"].year,
+            "paper_id": paper.id,
+            "paper_name": paper.assessment_specification,
+            "year": paper.year,
             "sections": [
                 {
-                    "name": section_data["section_info"].name,
-                    "title": section_data["section_info"].description,
+                    "name": section.name,
+                    "title": section.description,
                     "questions": [
                         {
-                            "question_id": question_id,
-                            "question_text": question_data["question_text"],
-                            "score": (
-                                question_data["question_info"].mark
-                                if question_data["question_info"]
-                                else None
-                            ),
-                            "source_text": (
-                                question_data["question_info"].source_text
-                                if question_data["question_info"]
-                                else None
-                            ),
-                            "question_number": (
-                                question_data["question_info"].question_number
-                                if question_data["question_info"]
-                                else None
-                            ),
-                            "question_type": (
-                                question_data["question_info"].question_type_id
-                                if question_data["question_info"]
-                                else None
-                            ),
-                            "options": question_data["options"],
-                            "sub_questions": question_data["sub_questions"],
+                            "question_id": question.id,
+                            "question_text": question.question_text,
+                            "score": question.mark,
+                            "source_text": question.source_text,
+                            "question_number": question.question_number,
+                            "question_type": question.question_type_id,
+                            "options": [],
+                            "sub_questions": [
+                                {
+                                    "question_id": subquestion.id,
+                                    "question_text": subquestion.question_text,
+                                    "score": subquestion.mark or None,
+                                    "source_text": subquestion.source_text or None,
+                                    "question_number": subquestion.question_number
+                                    or None,
+                                    "question_type": subquestion.question_type_id
+                                    or None,
+                                    "options": [],
+                                }
+                                for subquestion in tree.children_of(question.id)
+                            ],
                         }
-                        for question_id, question_data in section_data[
-                            "questions"
-                        ].items()
+                        for question in roots_by_section[section.id]
+                        if tree.children_of(question.id)
+                        or question.question_type_id == ESSAY_QUESTION_TYPE_ID
                     ],
                 }
-                for section_id, section_data in paper_data["sections"].items()
+                for section in sections
             ],
         }
-        for paper_id, paper_data in paper_sections.items()
     ]
 
     db.close()
@@ -1,30 +1,132 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from starlette import status
+from app.catalogCache import (
+    QUESTION_PAPERS,
+    SUBJECTS,
+    as_dicts,
+    bump_catalog,
+    cached_catalog,
+    catalog_version,
+)
 from app.login.auth import JWTBearer
 from app.models import *
+from app.pagination import ListSpec, PageParams, paginate
 from app.params import DELETED
 from app.questions.basemodel import CreateQuestionPaper
 from database import get_db
 
 questionpaperroute = APIRouter(prefix="/question-paper", tags=["Question Paper"])
 
+QUESTION_PAPER_LIST = ListSpec(
+    fields={
+        "id": QuestionPaper.id,
+        "assessment_specification": QuestionPaper.assessment_specification,
+        "topic_name": QuestionPaper.topic_name,
+        "year": QuestionPaper.year,
+        "subject_id": QuestionPaper.subject_id,
+        "created_at": QuestionPaper.created_at,
+    },
+    sort_keys=("id", "year", "subject_id"),
+)
+
+
+def load_paper_facets(db: Session):
+    """
+    The function `load_paper_facets` counts the live question papers of every (subject, year) pair
+    with one GROUP BY on the (deleted, subject_id, year) index.
+
+    :return: A dictionary with one entry per subject under "subjects", each with its years and paper
+    counts, and the distinct years of all subjects with their paper counts under "years".
+    """
+    rows = (
+        db.query(
+            QuestionPaper.subject_id,
+            Subject.subject_name,
+            Subject.subject_code,
+            QuestionPaper.year,
+            func.count(QuestionPaper.id).label("paper_count"),
+        )
+        .join(Subject, QuestionPaper.subject_id == Subject.id)
+        .filter(QuestionPaper.deleted == DELETED, Subject.deleted == DELETED)
+        .group_by(
+            QuestionPaper.subject_id,
+            Subject.subject_name,
+            Subject.subject_code,
+            QuestionPaper.year,
+        )
+        .order_by(QuestionPaper.subject_id, QuestionPaper.year)
+        .all()
+    )
+    subjects = {}
+    years = {}
+    for row in rows:
+        subject = subjects.setdefault(
+            row.subject_id,
+            {
+                "subject_id": row.subject_id,
+                "subject_name": row.subject_name,
+                "subject_code": row.subject_code,
+                "paper_count": 0,
+                "years": [],
+            },
+        )
+        subject["paper_count"] += row.paper_count
+        subject["years"].append({"year": row.year, "paper_count": row.paper_count})
+        years[row.year] = years.get(row.year, 0) + row.paper_count
+    return {
+        "subjects": list(subjects.values()),
+        "years": [{"year": year, "paper_count": years[year]} for year in sorted(years)],
+    }
+
+
+def paper_facets(db: Session):
+    # Subject names are part of the facets, so a subject write retires them as well
+    return cached_catalog(
+        db,
+        QUESTION_PAPERS,
+        ("facets", catalog_version(db, SUBJECTS)),
+        lambda: load_paper_facets(db),
+    )
+
+
+@questionpaperroute.get("/facets")
+def get_question_paper_facets(
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    Returns the whole question paper catalog in one call: every subject with the years it has papers
+    for and the number of papers of each year, plus the distinct years across subjects. Served from
+    the catalog cache, which paper and subject writes invalidate.
+    """
+    facets = paper_facets(db)
+    db.close()
+    return facets
+
 @questionpaperroute.get("/alldata")
 def get_question_papers(
+   page: PageParams = Depends(),
    db: Session = Depends(get_db),
    user_data: dict = Depends(JWTBearer()),
    ):
    """
-    This function retrieves all question papers from the database.
+    This function retrieves the question papers from the database one page at a time; see
+    `app.pagination` for the cursor, sort (id, year, subject_id) and fields parameters.
     :param db: The `db` parameter in the `get_question_papers` function is of type `Session`, which is
     likely referring to a database session object. This parameter is being injected using
     `Depends(get_db)`, which suggests that `get_db` is a dependency function that provides the database
     session to
     :type db: Session
-    :return: A list of all question papers stored in the database.
+    :return: A page of question papers under "data" and the cursor of the next page.
     """
-   papers = db.query(QuestionPaper).filter(QuestionPaper.deleted == DELETED).all()
+   papers = paginate(
+      db.query(QuestionPaper).filter(QuestionPaper.deleted == DELETED),
+      QUESTION_PAPER_LIST,
+      page,
+   )
    db.close()
    return papers
 
@@ -35,17 +137,19 @@ def get_question_papers(
     ):
     """
     The function `get_question_papers` retrieves a list of unique years from the QuestionPaper table in
-    the database.
+    the database. The years are taken from the cached facets; prefer `/question-paper/facets`, which
+    also returns the subjects and paper counts of each year. The years fit in a single page, so
+    `next_cursor` is always None.
     
     :param db: The `db` parameter in the `get_question_papers` function is of type `Session`, which is
     being injected into the function using `Depends(get_db)`. This parameter represents a database
     session that will be used to interact with the database when querying for question paper years
     :type db: Session
-    :return: A list of all the years for which question papers are available in the database.
+    :return: The years for which question papers are available in the database.
     """
-    paper_year = db.query(QuestionPaper.year).all()
+    paper_year = [{"year": item["year"]} for item in paper_facets(db)["years"]]
     db.close()
-    return paper_year
+    return {"data": paper_year, "next_cursor": None}
 
 
 @questionpaperroute.get("")
@@ -68,10 +172,17 @@ def get_question_papers(
     :return: A list of question papers that belong to the specified subject ID and have not been marked
     as deleted.
     """
-    question_papers = db.query(QuestionPaper).filter(
-        QuestionPaper.subject_id == subject_id,
-        QuestionPaper.deleted == DELETED
-    ).all()
+    question_papers = cached_catalog(
+        db,
+        QUESTION_PAPERS,
+        ("subject", subject_id),
+        lambda: as_dicts(
+            db.query(QuestionPaper).filter(
+                QuestionPaper.subject_id == subject_id,
+                QuestionPaper.deleted == DELETED
+            ).all()
+        ),
+    )
     db.close()
     return question_papers
 
@@ -95,10 +206,17 @@ def get_question_papers(
     :return: A list of question papers from the database that match the specified year and have not been
     marked as deleted.
     """
-    question_papers = db.query(QuestionPaper).filter(
-        QuestionPaper.year == year,
-        QuestionPaper.deleted == DELETED
-    ).all()
+    question_papers = cached_catalog(
+        db,
+        QUESTION_PAPERS,
+        ("year", year),
+        lambda: as_dicts(
+            db.query(QuestionPaper).filter(
+                QuestionPaper.year == year,
+                QuestionPaper.deleted == DELETED
+            ).all()
+        ),
+    )
     db.close()
     return question_papers
 
@@ -128,10 +246,17 @@ def get_question_papers(
     :return: A list of question papers that match the specified year and subject ID, and have not been
     deleted.
     """
-    question_papers = db.query(QuestionPaper).filter(
-        QuestionPaper.year == year,QuestionPaper.subject_id==subject_id,
-        QuestionPaper.deleted == DELETED
-    ).all()
+    question_papers = cached_catalog(
+        db,
+        QUESTION_PAPERS,
+        ("subject_year", subject_id, year),
+        lambda: as_dicts(
+            db.query(QuestionPaper).filter(
+                QuestionPaper.year == year,QuestionPaper.subject_id==subject_id,
+                QuestionPaper.deleted == DELETED
+            ).all()
+        ),
+    )
     db.close()
     return question_papers
 
@@ -192,6 +317,7 @@ async def create_question_paper(
         )
 
         db.add(question_paper)
+        bump_catalog(db, QUESTION_PAPERS)
         db.commit()
         db.close()
         return {"Message": "Question Paper Created Successfully"}
@@ -227,6 +353,7 @@ async def update_question_paper(
         question_paper.month = question_paper_update.month
         question_paper.subject_id = question_paper_update.subject_id
         
+        bump_catalog(db, QUESTION_PAPERS)
         db.commit()
         db.close()
         return {"Message": "Question Paper Updated Successfully"}
@@ -250,6 +377,7 @@ async def delete_question_paper(
             response.status_code = status.HTTP_404_NOT_FOUND
             return response
         question_paper.deleted = True
+        bump_catalog(db, QUESTION_PAPERS)
         db.commit()
         db.close()
         return {"Message": "Question Paper Deleted Successfully"}
@@ -0,0 +1,611 @@
+import gzip
+import heapq
+import html
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app.models import Options, Question, QuestionPaper, SearchChange
+from app.params import DELETED
+from database import Base, SessionLocal
+
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.json.gz")
+SEARCH_INDEX_FORMAT = 2
+SEARCH_BUILD_BATCH = 1000
+SEARCH_CHANGE_SETTLE_SECONDS = int(os.getenv("SEARCH_CHANGE_SETTLE_SECONDS", "60"))
+SEARCH_CHANGE_RETENTION_DAYS = int(os.getenv("SEARCH_CHANGE_RETENTION_DAYS", "7"))
+SNIPPET_LENGTH = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+SPACE_PATTERN = re.compile(r"\s+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what "
+    "which why with".split()
+)
+
+
+def strip_html(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    return SPACE_PATTERN.sub(" ", html.unescape(TAG_PATTERN.sub(" ", text))).strip()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(strip_html(text).lower())
+        if token not in STOPWORDS
+    ]
+
+
+class SearchIndex:
+    """
+    An inverted index over the question bank, ranked with BM25. Each question is one document made
+    of its stripped question text, its source text and the text of its options; options are kept
+    apart so a single option can be updated without reading the others.
+
+    `postings` maps a token to the term frequency of every question containing it, so a search only
+    touches the questions sharing a token with the query. All methods are thread safe.
+    """
+
+    def __init__(self):
+        self.documents: Dict[int, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+        # Year of every live question paper; questions of other papers are not returned
+        self.paper_years: Dict[int, int] = {}
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @staticmethod
+    def document_terms(document: Dict[str, Any]) -> Counter:
+        terms = Counter(document["terms"])
+        for option_terms in document["options"].values():
+            terms.update(option_terms)
+        return terms
+
+    def _unlink(self, question_id: int) -> Optional[Dict[str, Any]]:
+        document = self.documents.get(question_id)
+        if document is None:
+            return None
+        for token in self.document_terms(document):
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(question_id, None)
+                if not postings:
+                    del self.postings[token]
+        self.total_length -= self.lengths.pop(question_id, 0)
+        return document
+
+    def _link(self, question_id: int, document: Dict[str, Any]) -> None:
+        terms = self.document_terms(document)
+        for token, count in terms.items():
+            self.postings.setdefault(token, {})[question_id] = count
+        self.lengths[question_id] = sum(terms.values())
+        self.total_length += self.lengths[question_id]
+        self.documents[question_id] = document
+
+    def put_question(
+        self,
+        question_id: int,
+        paper_id: int,
+        subject_id: int,
+        question_text: Optional[str],
+        source_text: Optional[str],
+    ) -> None:
+        with self.lock:
+            previous = self._unlink(question_id)
+            self._link(
+                question_id,
+                {
+                    "paper_id": paper_id,
+                    "subject_id": subject_id,
+                    "snippet": strip_html(question_text)[:SNIPPET_LENGTH],
+                    "terms": Counter(tokenize(question_text) + tokenize(source_text)),
+                    "options": previous["options"] if previous else {},
+                },
+            )
+
+    def remove_question(self, question_id: int) -> None:
+        with self.lock:
+            self._unlink(question_id)
+            self.documents.pop(question_id, None)
+
+    def put_option(self, question_id: int, option_id: int, text: Optional[str]) -> None:
+        with self.lock:
+            document = self._unlink(question_id)
+            if document is None:
+                # The question is not indexed (deleted, or not committed yet)
+                return
+            terms = Counter(tokenize(text))
+            if terms:
+                document["options"][option_id] = terms
+            else:
+                document["options"].pop(option_id, None)
+            self._link(question_id, document)
+
+    def remove_option(self, question_id: int, option_id: int) -> None:
+        self.put_option(question_id, option_id, None)
+
+    def set_paper_year(self, paper_id: int, year: Optional[int]) -> None:
+        with self.lock:
+            if year is None:
+                self.paper_years.pop(paper_id, None)
+            else:
+                self.paper_years[paper_id] = year
+
+    def search(
+        self,
+        query: str,
+        subject_id: Optional[int] = None,
+        paper_id: Optional[int] = None,
+        year: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        The function `search` ranks the questions matching any token of `query` with BM25 and
+        returns the best `limit` of them, most relevant first.
+        """
+        tokens = set(tokenize(query))
+        with self.lock:
+            if not tokens or not self.documents:
+                return []
+            count = len(self.documents)
+            average_length = self.total_length / count or 1
+            scores: Dict[int, float] = {}
+            for token in tokens:
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for question_id, frequency in postings.items():
+                    document = self.documents[question_id]
+                    if subject_id is not None and document["subject_id"] != subject_id:
+                        continue
+                    if paper_id is not None and document["paper_id"] != paper_id:
+                        continue
+                    paper_year = self.paper_years.get(document["paper_id"])
+                    if paper_year is None or (year is not None and paper_year != year):
+                        continue
+                    norm = BM25_K1 * (
+                        1 - BM25_B + BM25_B * self.lengths[question_id] / average_length
+                    )
+                    scores[question_id] = scores.get(question_id, 0) + idf * (
+                        frequency * (BM25_K1 + 1) / (frequency + norm)
+                    )
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [
+                {
+                    "question_id": question_id,
+                    "paper_id": self.documents[question_id]["paper_id"],
+                    "subject_id": self.documents[question_id]["subject_id"],
+                    "year": self.paper_years[self.documents[question_id]["paper_id"]],
+                    "score": round(score, 4),
+                    "snippet": self.documents[question_id]["snippet"],
+                }
+                for question_id, score in best
+            ]
+
+    def to_json(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"paper_years": self.paper_years, "documents": self.documents}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SearchIndex":
+        index = cls()
+        index.paper_years = {int(k): v for k, v in data["paper_years"].items()}
+        for question_id, document in data["documents"].items():
+            document["terms"] = Counter(document["terms"])
+            document["options"] = {
+                int(option_id): Counter(terms)
+                for option_id, terms in document["options"].items()
+            }
+            index._link(int(question_id), document)
+        return index
+
+
+def build_search_index(db: Session) -> SearchIndex:
+    """
+    The function `build_search_index` indexes every live question and option, reading them in
+    batches.
+    """
+    index = SearchIndex()
+    papers = db.query(QuestionPaper.id, QuestionPaper.year).filter(
+        QuestionPaper.deleted == DELETED
+    )
+    for paper in papers:
+        index.set_paper_year(paper.id, paper.year)
+    questions = (
+        db.query(
+            Question.id,
+            Question.paper_id,
+            Question.subject_id,
+            Question.question_text,
+            Question.source_text,
+        )
+        .filter(Question.deleted == DELETED)
+        .yield_per(SEARCH_BUILD_BATCH)
+    )
+    for question in questions:
+        index.put_question(
+            question.id,
+            question.paper_id,
+            question.subject_id,
+            question.question_text,
+            question.source_text,
+        )
+    options = (
+        db.query(Options.question_id, Options.id, Options.text)
+        .filter(Options.deleted == DELETED)
+        .yield_per(SEARCH_BUILD_BATCH)
+    )
+    for option in options:
+        index.put_option(option.question_id, option.id, option.text)
+    return index
+
+
+def search_change_triggers() -> List[str]:
+    """
+    The statements creating the triggers that log every write to the indexed tables in
+    `search_change`. The same statements run on MySQL and SQLite.
+    """
+    logged = {
+        "question_paper": {"INSERT": ["NEW"], "UPDATE": ["NEW"], "DELETE": ["OLD"]},
+        "question": {"INSERT": ["NEW"], "UPDATE": ["NEW"], "DELETE": ["OLD"]},
+        # An option can move to another question, both are logged so the old one drops it
+        "option": {"INSERT": ["NEW"], "UPDATE": ["OLD", "NEW"], "DELETE": ["OLD"]},
+    }
+    statements = []
+    for table, actions in logged.items():
+        for action, rows in actions.items():
+            inserts = " ".join(
+                "INSERT INTO search_change (table_name, row_id, question_id) VALUES "
+                f"('{table}', {row}.id, {f'{row}.question_id' if table == 'option' else 'NULL'});"
+                for row in rows
+            )
+            statements.append(
+                f"CREATE TRIGGER search_change_{table}_{action.lower()} AFTER {action} ON `{table}` "
+                f"FOR EACH ROW BEGIN {inserts} END"
+            )
+    return statements
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_change_triggers(metadata, connection, tables=(), **kw):
+    # Only when the log is created with this call, an existing one already has its triggers
+    if SearchChange.__table__ in tables:
+        for statement in search_change_triggers():
+            connection.exec_driver_sql(statement)
+
+
+def settled_change_position(db: Session, position: int) -> int:
+    """
+    The highest logged change id below which every change is committed. Ids are handed out when a
+    transaction writes, not when it commits, so changes younger than SEARCH_CHANGE_SETTLE_SECONDS
+    may still be joined by lower ids; they stay after the position and are read again.
+    """
+    now = db.query(func.now()).scalar()
+    settled = (
+        db.query(func.max(SearchChange.id))
+        .filter(
+            SearchChange.id > position,
+            SearchChange.created_at
+            <= now - timedelta(seconds=SEARCH_CHANGE_SETTLE_SECONDS),
+        )
+        .scalar()
+    )
+    return settled or position
+
+
+def change_log_reaches(db: Session, position: int) -> bool:
+    # False when changes after the position were pruned, the index then has to be rebuilt
+    first = db.query(func.min(SearchChange.id)).scalar()
+    return first is None or first <= position + 1
+
+
+def prune_search_changes(db: Session) -> None:
+    # The newest change is always kept, so the log shows that older ones were pruned
+    now = db.query(func.now()).scalar()
+    newest = db.query(func.max(SearchChange.id)).scalar()
+    if newest is None:
+        return
+    db.query(SearchChange).filter(
+        SearchChange.created_at < now - timedelta(days=SEARCH_CHANGE_RETENTION_DAYS),
+        SearchChange.id < newest,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def batches(ids, size: int = SEARCH_BUILD_BATCH):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+def reindex_rows(
+    db: Session,
+    index: SearchIndex,
+    paper_ids: Set[int],
+    question_ids: Set[int],
+    option_questions: Dict[int, Set[int]],
+) -> None:
+    """
+    The function `reindex_rows` reads the current state of the given papers, questions and options
+    and puts it in the index; rows that are gone or deleted are removed from it. Reading the same
+    rows again is harmless.
+    """
+    for batch in batches(paper_ids):
+        years = dict(
+            db.query(QuestionPaper.id, QuestionPaper.year).filter(
+                QuestionPaper.id.in_(batch), QuestionPaper.deleted == DELETED
+            )
+        )
+        for paper_id in batch:
+            index.set_paper_year(paper_id, years.get(paper_id))
+    for batch in batches(question_ids):
+        questions = {
+            question.id: question
+            for question in db.query(
+                Question.id,
+                Question.paper_id,
+                Question.subject_id,
+                Question.question_text,
+                Question.source_text,
+            ).filter(Question.id.in_(batch), Question.deleted == DELETED)
+        }
+        for question_id in batch:
+            question = questions.get(question_id)
+            if question is None:
+                index.remove_question(question_id)
+            else:
+                index.put_question(*question)
+        # A question that was not indexed before comes in without its options
+        options = db.query(Options.question_id, Options.id, Options.text).filter(
+            Options.question_id.in_(list(questions)), Options.deleted == DELETED
+        )
+        for option in options:
+            index.put_option(*option)
+    for batch in batches(option_questions):
+        options = {
+            option.id: option
+            for option in db.query(Options.question_id, Options.id, Options.text).filter(
+                Options.id.in_(batch), Options.deleted == DELETED
+            )
+        }
+        for option_id in batch:
+            option = options.get(option_id)
+            for question_id in option_questions[option_id]:
+                if option is None or question_id != option.question_id:
+                    index.remove_option(question_id, option_id)
+            if option is not None:
+                index.put_option(*option)
+
+
+def catch_up_search_index(db: Session, index: SearchIndex, position: int) -> Tuple[int, int]:
+    """
+    Applies the changes logged after `position` to the index and returns the new position and the
+    number of changes read.
+    """
+    settled = settled_change_position(db, position)
+    paper_ids: Set[int] = set()
+    question_ids: Set[int] = set()
+    option_questions: Dict[int, Set[int]] = {}
+    count = 0
+    changes = (
+        db.query(SearchChange.table_name, SearchChange.row_id, SearchChange.question_id)
+        .filter(SearchChange.id > position)
+        .yield_per(SEARCH_BUILD_BATCH)
+    )
+    for change in changes:
+        count += 1
+        if change.table_name == "question_paper":
+            paper_ids.add(change.row_id)
+        elif change.table_name == "question":
+            question_ids.add(change.row_id)
+        else:
+            option_questions.setdefault(change.row_id, set()).add(change.question_id)
+    reindex_rows(db, index, paper_ids, question_ids, option_questions)
+    return settled, count
+
+
+def save_search_index(index: SearchIndex, position: int, path: str) -> None:
+    partial_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(partial_path, "wt", encoding="utf-8") as f:
+        json.dump(
+            {"format": SEARCH_INDEX_FORMAT, "position": position, "index": index.to_json()}, f
+        )
+    os.replace(partial_path, path)
+
+
+def load_search_index(path: str) -> Tuple[Optional[SearchIndex], int]:
+    """
+    Returns the persisted index and the change log position it was saved at, or None when there is
+    no usable file.
+    """
+    if not os.path.exists(path):
+        return None, 0
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != SEARCH_INDEX_FORMAT:
+            return None, 0
+        return SearchIndex.from_json(data["index"]), int(data["position"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring unreadable search index {path}: {e}")
+        return None, 0
+
+
+# The index serving searches, None until it is loaded, and the position in the change log it is
+# caught up to. Changes committed while it is being built are kept in `pending_changes` and
+# replayed on the new index.
+search_index: Optional[SearchIndex] = None
+search_index_position = 0
+pending_changes: Optional[List[Tuple]] = None
+search_index_lock = threading.Lock()
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    return search_index
+
+
+def apply_change(index: SearchIndex, change: Tuple) -> None:
+    kind, *args = change
+    getattr(index, kind)(*args)
+
+
+def apply_changes(changes: List[Tuple]) -> None:
+    with search_index_lock:
+        if pending_changes is not None:
+            pending_changes.extend(changes)
+            return
+        index = search_index
+    if index is not None:
+        for change in changes:
+            apply_change(index, change)
+
+
+def load_or_build_search_index(path: str = SEARCH_INDEX_PATH) -> None:
+    """
+    Loads the persisted index and catches it up with the change log, or builds it from the database
+    and persists it for the next start when there is no file or the log no longer reaches back to
+    it.
+    """
+    global search_index, search_index_position, pending_changes
+    with search_index_lock:
+        pending_changes = []
+    db = SessionLocal()
+    try:
+        index, position = load_search_index(path)
+        if index is None or not change_log_reaches(db, position):
+            # Taken before the build, changes logged while it reads are applied again below
+            position = settled_change_position(db, 0)
+            index = build_search_index(db)
+            try:
+                save_search_index(index, position, path)
+            except OSError as e:
+                print(f"Failed to save search index {path}: {e}")
+        position, _ = catch_up_search_index(db, index, position)
+    except Exception as e:
+        print(f"Failed to build search index: {e}")
+        with search_index_lock:
+            pending_changes = None
+        return
+    finally:
+        db.close()
+    with search_index_lock:
+        for change in pending_changes:
+            apply_change(index, change)
+        search_index = index
+        search_index_position = position
+        pending_changes = None
+    print(f"Search index ready with {len(index)} questions.")
+
+
+def refresh_search_index(path: str = SEARCH_INDEX_PATH) -> bool:
+    """
+    Applies the changes logged since the last refresh to the index and returns whether there were
+    any. Commits of this process reach the index as they happen; those of other processes, and
+    changes made directly in the database, are picked up here. The index is only rebuilt when the
+    log was pruned past its position.
+    """
+    global search_index_position
+    with search_index_lock:
+        if pending_changes is not None:
+            # A build is already in progress
+            return False
+        index, position = search_index, search_index_position
+    if index is None:
+        load_or_build_search_index(path)
+        return True
+    db = SessionLocal()
+    try:
+        rebuild = not change_log_reaches(db, position)
+        if not rebuild:
+            position, count = catch_up_search_index(db, index, position)
+            prune_search_changes(db)
+    except Exception as e:
+        print(f"Failed to refresh search index: {e}")
+        return False
+    finally:
+        db.close()
+    if rebuild:
+        load_or_build_search_index(path)
+        return True
+    with search_index_lock:
+        if search_index is index:
+            search_index_position = position
+    return count > 0
+
+
+def start_search_index() -> threading.Thread:
+    # Built in the background so the application starts serving at once; searches wait for it
+    thread = threading.Thread(
+        target=load_or_build_search_index, name="search-index", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def search_changes(session: Session) -> List[Tuple]:
+    return session.info.setdefault("search_index_changes", [])
+
+
+@event.listens_for(Session, "after_flush")
+def collect_search_changes(session, flush_context):
+    """
+    Records the index changes of the questions, options and papers written by a flush. They are
+    applied once the transaction commits and dropped if it rolls back.
+    """
+    papers, questions, options = [], [], []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, (Question, Options, QuestionPaper)):
+            continue
+        # Read from the loaded state: a server default expired by the flush would cost a SELECT
+        removed = obj in session.deleted or bool(obj.__dict__.get("deleted"))
+        if isinstance(obj, Question):
+            if removed:
+                questions.append(("remove_question", obj.id))
+            else:
+                questions.append(
+                    (
+                        "put_question",
+                        obj.id,
+                        obj.paper_id,
+                        obj.subject_id,
+                        obj.question_text,
+                        obj.source_text,
+                    )
+                )
+        elif isinstance(obj, Options):
+            if removed:
+                options.append(("remove_option", obj.question_id, obj.id))
+            else:
+                options.append(("put_option", obj.question_id, obj.id, obj.text))
+        elif isinstance(obj, QuestionPaper):
+            papers.append(("set_paper_year", obj.id, None if removed else obj.year))
+    # Options attach to their question, so questions written in the same flush go first
+    search_changes(session).extend(papers + questions + options)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_search_changes(session):
+    changes = session.info.pop("search_index_changes", None)
+    if changes:
+        apply_changes(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_search_changes(session, previous_transaction):
+    session.info.pop("search_index_changes", None)
@@ -0,0 +1,115 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from app.models import Options, ResultSummary, UserResponse
+
+
+def answer_option_id(answer: Any) -> Optional[int]:
+    """
+    The function `answer_option_id` returns the option id chosen in an answer. Answers are sent either
+    as a numeric string or as a list whose first item is the numeric string; anything else (essay text,
+    empty answers) has no option id.
+    """
+    if isinstance(answer, list):
+        answer = answer[0] if answer else None
+    if isinstance(answer, int):
+        return answer
+    if isinstance(answer, str) and answer.isdigit():
+        return int(answer)
+    return None
+
+
+def load_answer_options(db: Session, responses: Iterable[Dict[str, Any]]) -> Dict[int, Options]:
+    """
+    This function loads only the options chosen in the given responses, keyed by option id.
+    """
+    option_ids = {
+        option_id
+        for option_id in (answer_option_id(response.get("answer")) for response in responses)
+        if option_id is not None
+    }
+    if not option_ids:
+        return {}
+    options = db.query(Options).filter(Options.id.in_(option_ids)).all()
+    return {option.id: option for option in options}
+
+
+def summarize_responses(
+    responses: List[Dict[str, Any]], options_by_id: Dict[int, Options]
+) -> Dict[str, int]:
+    """
+    The function `summarize_responses` counts the attempted questions and the correct and wrong option
+    answers of a submission.
+    """
+    correct = 0
+    wrong = 0
+    for response in responses:
+        option = options_by_id.get(answer_option_id(response.get("answer")))
+        if option is None:
+            continue
+        if option.is_correct:
+            correct += 1
+        else:
+            wrong += 1
+    return {"attempted": len(responses), "correct": correct, "wrong": wrong}
+
+
+def save_result_summary(
+    db: Session,
+    user_response: UserResponse,
+    response_json: Dict[str, Any],
+    options_by_id: Dict[int, Options],
+) -> ResultSummary:
+    """
+    This function stores the result summary of a submission next to its user response. It is called
+    once when the submission is saved; the row is committed together with the user response.
+    """
+    counts = summarize_responses(response_json.get("responses", []), options_by_id)
+    summary = ResultSummary(
+        user_response_id=user_response.id,
+        user_id=user_response.user_id,
+        question_paper_id=user_response.question_paper_id,
+        subject_id=user_response.subject_id,
+        year=user_response.year,
+        score=user_response.total_score,
+        time_taken=response_json.get("time"),
+        created_by_id=user_response.created_by_id,
+        **counts,
+    )
+    db.add(summary)
+    return summary
+
+
+def build_result_summary(db: Session, user_response: UserResponse) -> ResultSummary:
+    """
+    The function `build_result_summary` computes, without saving it, the summary of a user response
+    submitted before result summaries were stored.
+    """
+    response_json = user_response.user_response
+    if isinstance(response_json, str):
+        response_json = json.loads(response_json)
+    responses = response_json.get("responses", [])
+    counts = summarize_responses(responses, load_answer_options(db, responses))
+    return ResultSummary(
+        user_response_id=user_response.id,
+        user_id=user_response.user_id,
+        question_paper_id=user_response.question_paper_id,
+        subject_id=user_response.subject_id,
+        year=user_response.year,
+        score=user_response.total_score,
+        time_taken=response_json.get("time"),
+        **counts,
+    )
+
+
+def result_summary_payload(summary: ResultSummary) -> Dict[str, Any]:
+    # totalScore has always been the number of correct answers, the stored score is sent as score
+    return {
+        "totalAttempted": summary.attempted,
+        "correctAnswers": summary.correct,
+        "wrongAnswers": summary.wrong,
+        "totalScore": summary.correct,
+        "score": summary.score,
+        "timeTaken": summary.time_taken,
+        "user_response_id": summary.user_response_id,
+    }
@@ -0,0 +1,257 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import String, bindparam, event, func, inspect, literal, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models import Options, Question, QuestionPaper, Section
+from app.params import DELETED
+
+PATH_SEGMENT_WIDTH = 10
+PATH_SEGMENT_LENGTH = PATH_SEGMENT_WIDTH + 1
+QUESTION_ORDERING = (
+    Question.question_number,
+    Question.subquestion_label,
+    Question.order,
+    Question.id,
+)
+question_table = Question.__table__
+
+
+def path_segment(question_id: int) -> str:
+    return f"{question_id:0{PATH_SEGMENT_WIDTH}d}/"
+
+
+def parent_path(connection, parent_id: Optional[int]) -> Tuple[Optional[str], int]:
+    """
+    Returns the path and depth a child of `parent_id` starts from. Top level questions start from an
+    empty path; the children of a parent without a path get none until `fill_missing_paths` runs.
+    """
+    if parent_id is None:
+        return "", 0
+    parent = connection.execute(
+        select(question_table.c.path, question_table.c.depth).where(
+            question_table.c.id == parent_id
+        )
+    ).first()
+    if parent is None or parent.path is None:
+        return None, 0
+    return parent.path, parent.depth + 1
+
+
+@event.listens_for(Question, "after_insert")
+def set_question_path(mapper, connection, target):
+    """
+    Fills the materialized path of a new question once its id is known.
+    """
+    prefix, depth = parent_path(connection, target.parent_id)
+    path = None if prefix is None else prefix + path_segment(target.id)
+    connection.execute(
+        update(question_table)
+        .where(question_table.c.id == target.id)
+        .values(path=path, depth=depth)
+    )
+    set_committed_value(target, "path", path)
+    set_committed_value(target, "depth", depth)
+
+
+@event.listens_for(Question, "after_update")
+def move_question_subtree(mapper, connection, target):
+    """
+    Rewrites the path of a question and of its whole subtree with one range update when the question
+    is moved under another parent.
+    """
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+    old_path, old_depth = target.path, target.depth
+    prefix, depth = parent_path(connection, target.parent_id)
+    if prefix is None or old_path is None:
+        return
+    if prefix.startswith(old_path):
+        raise ValueError(
+            f"Question {target.id} cannot be moved under one of its own subquestions"
+        )
+    path = prefix + path_segment(target.id)
+    connection.execute(
+        update(question_table)
+        .where(question_table.c.path.like(old_path + "%"))
+        .values(
+            path=literal(path, String)
+            + func.substr(question_table.c.path, len(old_path) + 1),
+            depth=question_table.c.depth + (depth - old_depth),
+        )
+    )
+    set_committed_value(target, "path", path)
+    set_committed_value(target, "depth", depth)
+
+
+class QuestionTree:
+    """
+    The question hierarchy of one question paper: top level questions, their subquestions and the
+    options of every question, grouped in memory after two queries. Subquestions whose parent is
+    deleted are not reachable from the roots, as before.
+    """
+
+    def __init__(self, questions: List[Question], options: List[Options]):
+        self.questions: Dict[int, Question] = {q.id: q for q in questions}
+        self.children: Dict[int, List[Question]] = {}
+        self.roots: List[Question] = []
+        for question in questions:
+            if question.parent_id is None:
+                self.roots.append(question)
+            else:
+                self.children.setdefault(question.parent_id, []).append(question)
+        self.options: Dict[int, List[Options]] = {}
+        for option in options:
+            self.options.setdefault(option.question_id, []).append(option)
+
+    def __bool__(self) -> bool:
+        return bool(self.questions)
+
+    def children_of(self, question_id: int) -> List[Question]:
+        return self.children.get(question_id, [])
+
+    def options_of(self, question_id: int) -> List[Options]:
+        return self.options.get(question_id, [])
+
+    def roots_by_section(self) -> Dict[int, List[Question]]:
+        sections = {}
+        for root in self.roots:
+            sections.setdefault(root.section_id, []).append(root)
+        return sections
+
+
+def load_question_tree(
+    db: Session, paper_id: int, subject_id: Optional[int] = None
+) -> QuestionTree:
+    """
+    The function `load_question_tree` fetches exactly the question hierarchy of a paper: one query for
+    every question of the paper (top level questions and subquestions share the paper_id) and one
+    batched IN query for their options.
+
+    :param paper_id: The question paper whose questions are loaded
+    :type paper_id: int
+    :param subject_id: When given, only questions of this subject are loaded
+    :type subject_id: int
+    :return: A `QuestionTree` of the paper's questions, ordered by question number, subquestion label
+    and order.
+    """
+    query = db.query(Question).filter(
+        Question.paper_id == paper_id, Question.deleted == DELETED
+    )
+    if subject_id is not None:
+        query = query.filter(Question.subject_id == subject_id)
+    questions = query.order_by(*QUESTION_ORDERING).all()
+    if not questions:
+        return QuestionTree([], [])
+    options = (
+        db.query(Options)
+        .filter(Options.question_id.in_([q.id for q in questions]))
+        .order_by(Options.id)
+        .all()
+    )
+    return QuestionTree(questions, options)
+
+
+def load_paper_question_tree(
+    db: Session, paper_id: int, subject_id: Optional[int] = None
+) -> Tuple[Optional[QuestionPaper], List[Section], QuestionTree]:
+    """
+    The function `load_paper_question_tree` loads a question paper, its sections and its question tree
+    with four queries in total, whatever the number of questions.
+
+    :return: The paper (None when it does not exist or is deleted), the sections of the paper that
+    hold at least one top level question, in section order, and the `QuestionTree` of the paper.
+    """
+    paper = (
+        db.query(QuestionPaper)
+        .filter(QuestionPaper.id == paper_id, QuestionPaper.deleted == DELETED)
+        .first()
+    )
+    if not paper:
+        return None, [], QuestionTree([], [])
+    tree = load_question_tree(db, paper.id, subject_id)
+    if not tree:
+        return paper, [], tree
+    roots_by_section = tree.roots_by_section()
+    sections = (
+        db.query(Section)
+        .filter(Section.question_paper_id == paper.id)
+        .order_by(Section.id)
+        .all()
+    )
+    return paper, [s for s in sections if s.id in roots_by_section], tree
+
+
+def fill_missing_paths(db: Session, paper_id: int) -> None:
+    """
+    The function `fill_missing_paths` computes the path and depth of the questions of a paper that
+    have none. Questions imported outside the application skip the ORM listeners, so the readers of
+    paths call this first; when every path is set it costs one indexed query. Filled paths are
+    committed, so call it before loading the objects a request works with.
+    """
+    missing = (
+        db.query(Question.id, Question.parent_id)
+        .filter(Question.paper_id == paper_id, Question.path.is_(None))
+        .all()
+    )
+    if not missing:
+        return
+    missing_ids = {row.id for row in missing}
+    parent_ids = {row.parent_id for row in missing if row.parent_id is not None} - missing_ids
+    known = {}
+    if parent_ids:
+        known = {
+            row.id: (row.path, row.depth)
+            for row in db.query(Question.id, Question.path, Question.depth).filter(
+                Question.id.in_(parent_ids), Question.path.isnot(None)
+            )
+        }
+    # Parents first: each pass places the questions whose parent already has a path
+    pending = list(missing)
+    values = []
+    while pending:
+        remaining = []
+        for row in pending:
+            if row.parent_id is None:
+                prefix, depth = "", 0
+            elif row.parent_id in known:
+                parent_path, parent_depth = known[row.parent_id]
+                prefix, depth = parent_path, parent_depth + 1
+            else:
+                remaining.append(row)
+                continue
+            known[row.id] = (prefix + path_segment(row.id), depth)
+            values.append({"question_id": row.id, "path": known[row.id][0], "depth": depth})
+        if len(remaining) == len(pending):
+            # Orphans, or children of a question outside the paper, keep no path
+            break
+        pending = remaining
+    if values:
+        db.execute(
+            update(question_table)
+            .where(question_table.c.id == bindparam("question_id"))
+            .values(path=bindparam("path"), depth=bindparam("depth")),
+            values,
+        )
+        db.commit()
+
+
+def subtree_mark_totals(db: Session, paper_id: int) -> Dict[int, float]:
+    """
+    The function `subtree_mark_totals` adds up the marks of every top level question of a paper and
+    all of its descendants in one grouped range query.
+
+    :return: The total mark of each subtree, keyed by the id of its top level question.
+    """
+    fill_missing_paths(db, paper_id)
+    root_segment = func.substr(Question.path, 1, PATH_SEGMENT_LENGTH)
+    rows = (
+        db.query(root_segment, func.sum(Question.mark))
+        .filter(
+            Question.paper_id == paper_id,
+            Question.path.isnot(None),
+            Question.deleted == DELETED,
+        )
+        .group_by(root_segment)
+        .all()
+    )
+    return {int(segment[:PATH_SEGMENT_WIDTH]): total or 0 for segment, total in rows}
@@ -3,9 +3,10 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from requests import Session
 from sqlalchemy.orm import Session
-from sqlalchemy import select, join
+from sqlalchemy import select, update
 from app.login.auth import JWTBearer
 from app.models import Role, User
+from app.pagination import ListSpec, PageParams, paginate
 from database import get_db
 from pydantic import BaseModel
 
@@ -17,6 +18,17 @@ class UserRoleUpdate(BaseModel):
 
 rolemanager = APIRouter(prefix="/role")
 
+USER_ROLE_LIST = ListSpec(
+    fields={
+        "name": User.name,
+        "email": User.email,
+        "id": User.id,
+        "role_id": User.role_id,
+        "role_name": Role.name,
+    },
+    sort_keys=("id", "email"),
+)
+
 
 """
     The function `listuser` retrieves user data including name, email, id, role_id, and role name by
@@ -39,13 +51,14 @@ rolemanager = APIRouter(prefix="/role")
 
 
 @rolemanager.get("/list_user")
-def listuser(db: Session = Depends(get_db), user_data: dict = Depends(JWTBearer())):
-    stmt = select(
-        User.name, User.email, User.id, User.role_id, Role.name.label("role_name")
-    ).select_from(join(User, Role, User.role_id == Role.id))
-    result = db.execute(stmt).all()
-
-    return {"data": result}
+def listuser(
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    return paginate(
+        db.query(User).join(Role, User.role_id == Role.id), USER_ROLE_LIST, page
+    )
 
 
 @rolemanager.get("/rolelist")
@@ -95,26 +108,49 @@ def update_user_roles(request: List[UserRoleUpdate],db: Session = Depends(get_db
     list of dictionaries with "user_id" and "error" keys for any errors encountered during
     """
     response = {"updated": [], "errors": []}
+    if not request:
+        return {"data": response}
 
-    for update in request:
-        user = db.query(User).filter(User.id == update.user_id).first()
-        if not user:
+    user_ids = {item.user_id for item in request}
+    role_ids = {item.new_role_id for item in request}
+    existing_users = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+    existing_roles = set(db.scalars(select(Role.id).where(Role.id.in_(role_ids))))
+
+    new_roles = {}
+    for item in request:
+        if item.user_id not in existing_users:
             response["errors"].append(
-                {"user_id": update.user_id, "error": "User not found"}
+                {"user_id": item.user_id, "error": "User not found"}
             )
             continue
 
-        role = db.query(Role).filter(Role.id == update.new_role_id).first()
-        if not role:
+        if item.new_role_id not in existing_roles:
             response["errors"].append(
-                {"user_id": update.user_id, "error": "Role not found"}
+                {"user_id": item.user_id, "error": "Role not found"}
             )
             continue
 
-        user.role_id = update.new_role_id
-        db.commit()
+        # As before, the last entry for a user wins
+        new_roles[item.user_id] = item.new_role_id
         response["updated"].append(
-            {"user_id": update.user_id, "new_role_id": update.new_role_id}
+            {"user_id": item.user_id, "new_role_id": item.new_role_id}
         )
 
+    users_by_role = {}
+    for user_id, role_id in new_roles.items():
+        users_by_role.setdefault(role_id, []).append(user_id)
+    try:
+        # One UPDATE per target role, all in one transaction
+        for role_id, role_user_ids in users_by_role.items():
+            db.execute(
+                update(User)
+                .where(User.id.in_(role_user_ids))
+                .values(role_id=role_id)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
     return {"data": response}
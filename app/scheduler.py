@@ -0,0 +1,53 @@
+import os
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.dashboard.itemAnalysis import run_item_analysis
+from app.payment.webhookWorker import process_pending_events
+from app.questions.searchIndex import refresh_search_index
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+ITEM_ANALYSIS_INTERVAL_HOURS = int(os.getenv("ITEM_ANALYSIS_INTERVAL_HOURS", "24"))
+WEBHOOK_WORKER_INTERVAL_SECONDS = int(os.getenv("WEBHOOK_WORKER_INTERVAL_SECONDS", "60"))
+SEARCH_INDEX_CHECK_INTERVAL_SECONDS = int(os.getenv("SEARCH_INDEX_CHECK_INTERVAL_SECONDS", "300"))
+
+# One instance of each job at a time; runs missed while the process was busy are merged into one
+scheduler = BackgroundScheduler(job_defaults={"coalesce": True, "max_instances": 1})
+
+
+def start_scheduler() -> None:
+    """
+    Registers the periodic background jobs and starts the scheduler. Set SCHEDULER_ENABLED=0 on all
+    but one instance when several application processes run against the same database; the search
+    index check still runs there, since every process keeps its own index.
+    """
+    if scheduler.running:
+        return
+    # Picks up question bank changes committed by other processes
+    scheduler.add_job(
+        refresh_search_index,
+        "interval",
+        seconds=SEARCH_INDEX_CHECK_INTERVAL_SECONDS,
+        id="search_index_check",
+        replace_existing=True,
+    )
+    if SCHEDULER_ENABLED:
+        scheduler.add_job(
+            run_item_analysis,
+            "interval",
+            hours=ITEM_ANALYSIS_INTERVAL_HOURS,
+            id="item_analysis",
+            replace_existing=True,
+        )
+        # Picks up webhook events waiting for a retry and any the request-time run missed
+        scheduler.add_job(
+            process_pending_events,
+            "interval",
+            seconds=WEBHOOK_WORKER_INTERVAL_SECONDS,
+            id="stripe_webhook_worker",
+            replace_existing=True,
+        )
+    scheduler.start()
+
+
+def stop_scheduler() -> None:
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
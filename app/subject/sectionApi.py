@@ -2,8 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from starlette import status
+from app.catalogCache import SECTIONS, as_dicts, bump_catalog, cached_catalog
 from app.login.auth import JWTBearer
 from app.models import QuestionPaper, Section
+from app.pagination import ListSpec, PageParams, paginate
 from app.params import DELETED
 from app.subject.basemodel import CreateSection
 from database import get_db
@@ -13,16 +15,46 @@ from sqlalchemy.orm import joinedload
 sectionapiroute = APIRouter(prefix="/section", tags=["section"])
 
 
+SECTION_LIST = ListSpec(
+    fields={
+        "id": Section.id,
+        "name": Section.name,
+        "description": Section.description,
+        "question_paper_id": Section.question_paper_id,
+        "created_at": Section.created_at,
+        "deleted": Section.deleted,
+    },
+    sort_keys=("id", "question_paper_id"),
+)
+
+
 @sectionapiroute.get("/all")
-def get_sections(db: Session = Depends(get_db), user_data: dict = Depends(JWTBearer())):
-    get_section = db.query(Section).all()
+def get_sections(
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    Lists every section one page at a time; see `app.pagination` for the cursor, sort and fields
+    parameters. Sort keys: id, question_paper_id.
+    """
+    sections = paginate(db.query(Section), SECTION_LIST, page)
     db.close()
-    return get_section
+    return sections
 
 @sectionapiroute.get("/")
 def get_section_by_question_paper(question_paper_id:int, db: Session =Depends(get_db), user_data: dict = Depends(JWTBearer())):
     try:
-        question_paper = db.query(Section).filter(Section.question_paper_id == question_paper_id, Section.deleted == DELETED).all()
+        question_paper = cached_catalog(
+            db,
+            SECTIONS,
+            ("question_paper", question_paper_id),
+            lambda: as_dicts(
+                db.query(Section)
+                .filter(Section.question_paper_id == question_paper_id, Section.deleted == DELETED)
+                .all()
+            ),
+        )
         if not question_paper:
             response = JSONResponse(content={"success": False, "message": "Question Paper not found", "status": status.HTTP_404_NOT_FOUND})
             response.status_code = status.HTTP_404_NOT_FOUND
@@ -43,6 +75,7 @@ def create_section(create_section: CreateSection, db: Session = Depends(get_db),
             return response        
         section = Section(name = create_section.name, description = create_section.description, question_paper_id = create_section.question_paper_id, created_by_id=1)
         db.add(section)
+        bump_catalog(db, SECTIONS)
         db.commit()
         db.close()
         return {"Message" : "Section Created Successfully"}
@@ -68,6 +101,7 @@ def update_section(section_id: int, update_section: CreateSection, db: Session =
         sectionId.name = update_section.name
         sectionId.description = update_section.description
         sectionId.question_paper_id = update_section.question_paper_id
+        bump_catalog(db, SECTIONS)
         db.commit()
         db.close()
         return {"Message" : "Section Updated Successfully"}
@@ -87,6 +121,7 @@ def delete_section(section_id: int, db: Session = Depends(get_db), user_data: di
             return response        
         # db.delete(section)
         section.deleted=True
+        bump_catalog(db, SECTIONS)
         db.commit()
         db.close()
         return {"Message": " Section Deleted Successfully"}
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from app.catalogCache import SUBJECTS, bump_catalog, cached_catalog
 from app.login.auth import JWTBearer
 from app.models import Subject
+from app.pagination import ListSpec, PageParams, paginate
 from app.params import DELETED
 from app.subject.basemodel import SubjectCreate
 from database import get_db
@@ -12,9 +14,35 @@ subjectroute = APIRouter(prefix="/subject", tags=["subject"])
 subjectpaperroute = APIRouter(prefix="/subjectpaperroute", tags=["subject paper"])
 
 
+SUBJECT_LIST = ListSpec(
+    fields={
+        "id": Subject.id,
+        "subject_name": Subject.subject_name,
+        "subject_code": Subject.subject_code,
+        "created_at": Subject.created_at,
+    },
+    sort_keys=("id", "subject_name"),
+)
+
+
 @subjectroute.get("/get")
-def get_subject(db: Session = Depends(get_db), user_data: dict = Depends(JWTBearer())):
-    subjects = db.query(Subject).filter(Subject.deleted == DELETED).all()
+def get_subject(
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(JWTBearer()),
+):
+    """
+    Lists the subjects one page at a time; see `app.pagination` for the cursor, sort and fields
+    parameters. Sort keys: id, subject_name. Pages are served from the catalog cache.
+    """
+    subjects = cached_catalog(
+        db,
+        SUBJECTS,
+        ("list", page.cursor, page.limit, page.sort, page.fields),
+        lambda: paginate(
+            db.query(Subject).filter(Subject.deleted == DELETED), SUBJECT_LIST, page
+        ),
+    )
     db.close()
     return subjects
 
@@ -32,6 +60,7 @@ async def create_subject(
             created_by_id=1,
         )
         db.add(subject)
+        bump_catalog(db, SUBJECTS)
         db.commit()
         db.close()
         return {"Message": "Subject Created Successfully"}
@@ -67,6 +96,7 @@ async def update_subject(
         subject.subject_code = subject_update_request.subject_code
         subject.updated_by_id = 2
 
+        bump_catalog(db, SUBJECTS)
         db.commit()
         db.close()
         return {"Message": "Subject Updated Successfully"}
@@ -95,6 +125,7 @@ async def delete_subject(
 
         subject.deleted = True
 
+        bump_catalog(db, SUBJECTS)
         db.commit()
         db.close()
         return {"Message": "Subject Deleted Successfully"}
@@ -0,0 +1,71 @@
+"""
+Measures how fast reportlab renders invoice PDFs, to size INVOICE_RENDER_WORKERS for a batch
+regeneration of every invoice.
+
+    python -m benchmarks.invoice_pdf_benchmark --count 500 --workers 1 2 4
+
+Only the custom reportlab invoice is rendered; no database or Stripe calls are made.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("database_url", "sqlite://")
+from app.payment.invoice import create_invoice_pdf, invoice_filename  # noqa: E402
+
+
+def sample_invoice(number: int) -> dict:
+    return {
+        "Invoice Number": f"in_benchmark{number:06d}",
+        "Date": "01 January 2026",
+        "Subscription Plan": "Yearly",
+        "Subscription Period": "01 January 2026 - 01 January 2027",
+        "Total Amount Paid": 49.0,
+        "Transaction ID": f"pi_benchmark{number:06d}",
+        "Subscription Expiry Date": "01 January 2027",
+        "Status": "active",
+    }
+
+
+def render(args) -> None:
+    directory, number = args
+    invoice_data = sample_invoice(number)
+    create_invoice_pdf(
+        os.path.join(directory, invoice_filename(invoice_data["Invoice Number"])),
+        invoice_data,
+    )
+
+
+def run(executor_class, workers: int, count: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = [(directory, number) for number in range(count)]
+        started = time.perf_counter()
+        if executor_class is None:
+            for job in jobs:
+                render(job)
+        else:
+            with executor_class(max_workers=workers) as executor:
+                list(executor.map(render, jobs, chunksize=max(1, count // (workers * 8))))
+        return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200, help="invoices rendered per run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    elapsed = run(None, 1, args.count)
+    print(f"{'sequential':<12}{1:>8}{args.count / elapsed:>12.1f} invoices/s")
+    for name, executor_class in (("threads", ThreadPoolExecutor), ("processes", ProcessPoolExecutor)):
+        for workers in args.workers:
+            elapsed = run(executor_class, workers, args.count)
+            print(f"{name:<12}{workers:>8}{args.count / elapsed:>12.1f} invoices/s")
+
+
+if __name__ == "__main__":
+    main()
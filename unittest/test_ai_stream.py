@@ -0,0 +1,86 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import json
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.ai import api, grading
+from app.models import GradingResult, Question
+from database import Base
+
+
+def test_stream_saves_the_evaluation_for_the_authenticated_user(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Question.__table__])
+    streamed = []
+    monkeypatch.setattr(
+        api,
+        "stream_evaluation",
+        lambda question_id, user_id, payload, prompt_version=None: streamed.append(user_id)
+        or iter(()),
+    )
+    request = {"questionId": 1, "questionText": "q", "answer": "a", "max_score": 5, "user_id": 99}
+
+    api.ai_model_stream(request, db=sessionmaker(bind=engine)(), user_data={"id": 7})
+
+    assert streamed == [7]
+
+
+class FakeStreamedResponse:
+    status_code = 200
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_lines(self, decode_unicode=False):
+        yield ": keep-alive"
+        for chunk in self.chunks:
+            yield "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]})
+            yield ""
+        yield "data: [DONE]"
+
+
+def parse_events(body):
+    events = []
+    for block in body.split("\n\n"):
+        if not block:
+            continue
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def test_stream_relays_tokens_and_rating_and_saves_the_evaluation(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine, tables=[GradingResult.__table__])
+    sessions = sessionmaker(bind=engine)
+    monkeypatch.setattr(grading, "SessionLocal", sessions)
+    chunks = ["### Answer Evaluation\nMostly right.\n", "### Rating\n", "4", "\n", "### Explanation\nGood."]
+    requests_sent = []
+    monkeypatch.setattr(
+        api.requests,
+        "post",
+        lambda url, headers, json, stream: requests_sent.append(json) or FakeStreamedResponse(chunks),
+    )
+
+    events = parse_events("".join(api.stream_evaluation(3, 7, {"stream": True}, prompt_version=2)))
+
+    assert requests_sent == [{"stream": True}]
+    assert events[:4] == [("token", {"delta": chunk}) for chunk in chunks[:4]]
+    # The rating is sent as soon as the line holding it is complete, before the rest of the text
+    assert events[4] == ("rating", {"rating": 4})
+    assert events[5] == ("token", {"delta": chunks[4]})
+    assert events[6] == (
+        "done",
+        {"question_id": 3, "evaluation": {"correctness": "".join(chunks), "rating": 4}},
+    )
+    assert len(events) == 7
+
+    saved = sessions().query(GradingResult).one()
+    assert (saved.user_id, saved.question_id, saved.user_response_id) == (7, 3, None)
+    assert (saved.rating, saved.prompt_version, saved.created_by_id) == (4, 2, 7)
+    assert saved.feedback == "".join(chunks)
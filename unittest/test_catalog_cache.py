@@ -0,0 +1,145 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from app import catalogCache
+from app.models import CatalogVersion, QuestionPaper, Section, Subject
+from app.questions.questionPaperApi import get_question_paper_facets
+from app.subject.basemodel import CreateSection
+from app.subject.sectionApi import create_section, get_section_by_question_paper
+
+
+@pytest.fixture
+def db():
+    catalogCache.catalog_cache.clear()
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[CatalogVersion.__table__, QuestionPaper.__table__, Section.__table__],
+    )
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(
+        QuestionPaper(
+            id=1,
+            assessment_specification="spec",
+            topic_name="topic",
+            year=2020,
+            subject_id=1,
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+        )
+    )
+    session.add(
+        Section(
+            id=1,
+            name="A",
+            description="Section A",
+            question_paper_id=1,
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+        )
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_reads_are_served_from_memory_until_a_write(db):
+    statements = []
+    event.listen(
+        db.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    for _ in range(3):
+        sections = get_section_by_question_paper(1, db=db, user_data={})
+    assert [section["name"] for section in sections] == ["A"]
+    # One version lookup per read, the sections themselves are loaded once
+    assert len(statements) == 4
+
+    create_section(
+        CreateSection(name="B", description="Section B", question_paper_id=1),
+        db=db,
+        user_data={},
+    )
+    statements.clear()
+    sections = get_section_by_question_paper(1, db=db, user_data={})
+    assert [section["name"] for section in sections] == ["A", "B"]
+    assert len(statements) == 2
+
+
+def test_write_in_another_process_retires_cached_entries(db):
+    writer = sessionmaker(bind=db.get_bind())()
+    assert catalogCache.cached_catalog(db, "test", "key", lambda: "old") == "old"
+
+    # Another worker writes; it shares the database but not this process's cache
+    writer.add(CatalogVersion(namespace="test", version=0))
+    writer.commit()
+    catalogCache.bump_catalog(writer, "test")
+    writer.commit()
+    writer.close()
+
+    assert catalogCache.cached_catalog(db, "test", "key", lambda: "new") == "new"
+    assert catalogCache.cached_catalog(db, "test", "key", lambda: "newer") == "new"
+
+
+def test_value_loaded_during_a_write_is_not_served(db):
+    def load_while_writing():
+        # A write commits while this read is still loading
+        catalogCache.bump_catalog(db, "test")
+        db.commit()
+        return "old"
+
+    assert catalogCache.cached_catalog(db, "test", "key", load_while_writing) == "old"
+    assert catalogCache.cached_catalog(db, "test", "key", lambda: "new") == "new"
+    assert catalogCache.cached_catalog(db, "test", "key", lambda: "newer") == "new"
+
+
+def test_facets_count_papers_per_subject_and_year(db):
+    Base.metadata.create_all(db.get_bind(), tables=[Subject.__table__])
+    db.add_all(
+        [
+            Subject(id=1, subject_name="Maths", subject_code="M", created_by_id=1),
+            Subject(id=2, subject_name="Physics", subject_code="P", created_by_id=1),
+        ]
+    )
+    db.add_all(
+        QuestionPaper(
+            id=paper_id,
+            assessment_specification="spec",
+            topic_name="topic",
+            year=year,
+            subject_id=subject_id,
+            deleted=deleted,
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+        )
+        for paper_id, subject_id, year, deleted in (
+            (2, 1, 2020, 0),
+            (3, 1, 2021, 0),
+            (4, 2, 2021, 0),
+            (5, 2, 2021, 1),
+        )
+    )
+    catalogCache.bump_catalog(db, catalogCache.QUESTION_PAPERS)
+    db.commit()
+
+    facets = get_question_paper_facets(db=db, user_data={})
+
+    assert facets["years"] == [
+        {"year": 2020, "paper_count": 2},
+        {"year": 2021, "paper_count": 2},
+    ]
+    assert [
+        (subject["subject_name"], subject["paper_count"], subject["years"])
+        for subject in facets["subjects"]
+    ] == [
+        ("Maths", 3, [{"year": 2020, "paper_count": 2}, {"year": 2021, "paper_count": 1}]),
+        ("Physics", 1, [{"year": 2021, "paper_count": 1}]),
+    ]
@@ -0,0 +1,151 @@
+import os
+import threading
+
+os.environ.setdefault("database_url", "sqlite://")
+
+from datetime import date, datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from types import SimpleNamespace
+from app.models import Invoice, PaymentHistory
+from app.payment import invoice, invoiceRenderer, paymentApi
+from database import Base
+
+
+def test_concurrent_requests_share_one_render(monkeypatch, tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def retrieve(invoice_id):
+        calls.append(invoice_id)
+        release.wait(5)
+        (tmp_path / f"invoice_{invoice_id}.pdf").write_bytes(b"%PDF")
+        return f"invoice_{invoice_id}.pdf"
+
+    monkeypatch.setattr(invoiceRenderer, "retrieve_invoice_pdf", retrieve)
+    monkeypatch.setattr(
+        invoiceRenderer,
+        "invoice_path",
+        lambda invoice_id: os.path.join(tmp_path, f"invoice_{invoice_id}.pdf"),
+    )
+
+    futures = [invoiceRenderer.submit_invoice_pdf("in_123") for _ in range(5)]
+    assert all(future is futures[0] for future in futures)
+    release.set()
+
+    assert invoiceRenderer.ensure_invoice_pdf("in_123") == os.path.join(
+        tmp_path, "invoice_in_123.pdf"
+    )
+    # The file is on disk now, so later requests do not render again
+    assert invoiceRenderer.ensure_invoice_pdf("in_123") is not None
+    assert calls == ["in_123"]
+    assert "in_123" not in invoiceRenderer.in_flight
+
+
+def test_failed_render_is_reported_and_retried(monkeypatch, tmp_path):
+    calls = []
+
+    def retrieve(invoice_id):
+        calls.append(invoice_id)
+        return None
+
+    monkeypatch.setattr(invoiceRenderer, "retrieve_invoice_pdf", retrieve)
+    monkeypatch.setattr(
+        invoiceRenderer,
+        "invoice_path",
+        lambda invoice_id: os.path.join(tmp_path, f"invoice_{invoice_id}.pdf"),
+    )
+
+    assert invoiceRenderer.ensure_invoice_pdf("in_missing") is None
+    assert invoiceRenderer.ensure_invoice_pdf("in_missing") is None
+    assert calls == ["in_missing", "in_missing"]
+
+
+def test_invoice_id_from_filename():
+    assert invoiceRenderer.invoice_id_from_filename("invoice_in_1Abc.pdf") == "in_1Abc"
+    assert invoiceRenderer.invoice_id_from_filename("invoice_in_1Abc_20240101.pdf") is None
+    assert invoiceRenderer.invoice_id_from_filename("../invoice_in_1.pdf") is None
+
+
+def test_download_only_renders_known_invoices_of_the_caller(monkeypatch, tmp_path):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Invoice.__table__])
+    db = sessionmaker(bind=engine)()
+    db.add(
+        Invoice(
+            payment_id=1,
+            payment_date=date(2024, 1, 1),
+            status="paid",
+            created_by_id=1,
+            stripe_invoice_id="in_1",
+            file_path="invoice_in_1.pdf",
+        )
+    )
+    db.commit()
+    rendered = []
+
+    def render(invoice_id):
+        rendered.append(invoice_id)
+        path = tmp_path / f"invoice_{invoice_id}.pdf"
+        path.write_bytes(b"%PDF")
+        return str(path)
+
+    monkeypatch.setattr(paymentApi, "ensure_invoice_pdf", render)
+    monkeypatch.chdir(tmp_path)
+
+    for filename, user_id in (
+        ("invoice_in_1.pdf", 2),
+        ("invoice_in_unknown.pdf", 1),
+        ("../invoice_in_1.pdf", 1),
+    ):
+        with pytest.raises(HTTPException) as error:
+            paymentApi.get_invoice(filename, db=db, user_data={"id": user_id})
+        assert error.value.status_code == 404
+    assert rendered == []
+
+    response = paymentApi.get_invoice("invoice_in_1.pdf", db=db, user_data={"id": 1})
+    assert rendered == ["in_1"]
+    assert response.path.endswith("invoice_in_1.pdf")
+
+
+def test_failed_write_removes_the_partial_file(monkeypatch, tmp_path):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[PaymentHistory.__table__])
+    sessions = sessionmaker(bind=engine)
+    db = sessions()
+    db.add(
+        PaymentHistory(
+            payment_date=date(2026, 1, 1),
+            next_payment_date=date(2027, 1, 1),
+            total_amount=100,
+            status="paid",
+            created_by_id=1,
+            stripe_checkout_id="cs_1",
+            stripe_transaction_status="paid",
+            stripe_invoice_id="in_1",
+            # The string server defaults are stored as text by SQLite
+            created_at=datetime(2026, 1, 1),
+            updated_at=datetime(2026, 1, 1),
+        )
+    )
+    db.commit()
+    db.close()
+    monkeypatch.setattr(invoice, "SessionLocal", sessions)
+    monkeypatch.setattr(
+        invoice.stripe.Invoice,
+        "retrieve",
+        lambda invoice_id: SimpleNamespace(id=invoice_id, invoice_pdf=None, period_start=0),
+    )
+
+    def create_invoice_pdf(file_path, invoice_data):
+        with open(file_path, "wb") as f:
+            f.write(b"%PDF")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(invoice, "create_invoice_pdf", create_invoice_pdf)
+
+    with pytest.raises(OSError):
+        invoice.retrieve_invoice_pdf("in_1", str(tmp_path))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,104 @@
+import json
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.dashboard.itemAnalysis import analyse_paper, item_flags, item_statistics
+from app.models import ItemStatistic, Options, Question, UserResponse
+from database import Base
+
+
+def test_statistics_match_per_item_correlations():
+    rng = np.random.default_rng(3)
+    ability = rng.normal(size=200)
+    difficulty = np.array([-2.0, -0.5, 0.0, 0.5, 1.5])
+    matrix = (ability[:, None] - difficulty + rng.normal(size=(200, 5)) > 0).astype(np.uint8)
+    matrix[:, 4] = 1 - matrix[:, 4]
+
+    p_values, point_biserial = item_statistics(matrix)
+
+    for item in range(matrix.shape[1]):
+        rest = matrix.sum(axis=1) - matrix[:, item]
+        assert p_values[item] == pytest.approx(matrix[:, item].mean())
+        assert point_biserial[item] == pytest.approx(np.corrcoef(matrix[:, item], rest)[0, 1])
+    assert point_biserial[4] < 0
+
+
+def test_constant_items_have_no_correlation():
+    p_values, point_biserial = item_statistics(np.array([[1, 0], [1, 1], [1, 0]]))
+
+    assert p_values.tolist() == pytest.approx([1.0, 1 / 3])
+    assert np.isnan(point_biserial[0])
+
+
+def test_flags_need_enough_responses():
+    assert item_flags(0.95, -0.3, 100) == ["too_easy", "negative_discrimination"]
+    assert item_flags(0.1, 0.4, 100) == ["too_hard"]
+    assert item_flags(0.95, -0.3, 5) == []
+
+
+def test_analyse_paper_scores_streamed_responses():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            Question.__table__,
+            Options.__table__,
+            UserResponse.__table__,
+            ItemStatistic.__table__,
+        ],
+    )
+    db = sessionmaker(bind=engine)()
+    for question_id in (1, 2):
+        db.add(
+            Question(
+                id=question_id,
+                paper_id=7,
+                question_text="",
+                question_type_id=1,
+                question_number=question_id,
+                subquestion_label="",
+                subject_id=1,
+                section_id=1,
+                mark=1,
+                source_text="",
+                created_by_id=1,
+            )
+        )
+        for offset, is_correct in ((0, True), (1, False)):
+            db.add(
+                Options(
+                    id=question_id * 10 + offset,
+                    question_id=question_id,
+                    is_correct=is_correct,
+                    score=1,
+                    created_by_id=1,
+                )
+            )
+    answers = [("10", "20"), ("10", "21"), ("11", "21"), ("10", None)]
+    for first, second in answers:
+        responses = [{"id": 1, "answer": first}, {"id": 2, "answer": second}]
+        db.add(
+            UserResponse(
+                question_paper_id=7,
+                user_response=json.dumps({"responses": responses}),
+                created_by_id=1,
+            )
+        )
+    db.commit()
+
+    analyse_paper(db, 7)
+    db.commit()
+
+    statistics = {s.question_id: s for s in db.query(ItemStatistic).all()}
+    assert statistics[1].response_count == 4
+    assert statistics[1].p_value == pytest.approx(0.75)
+    assert statistics[2].p_value == pytest.approx(0.25)
+    assert statistics[2].point_biserial == pytest.approx(
+        np.corrcoef([1, 0, 0, 0], [1, 1, 0, 1])[0, 1]
+    )
+    db.close()
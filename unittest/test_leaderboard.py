@@ -0,0 +1,67 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.dashboard.leaderboard import Leaderboard, PaperDistribution
+from app.models import PaperScore
+from database import Base
+
+
+def test_percentile_rank_counts_ties_as_half():
+    distribution = PaperDistribution({1: 10.0, 2: 20.0, 3: 20.0, 4: 30.0})
+
+    assert distribution.percentile_rank(20.0) == 50.0
+    assert distribution.percentile_rank(30.0) == 87.5
+    assert distribution.percentile_rank(5.0) == 0.0
+    assert distribution.rank(20.0) == 2
+    assert distribution.rank(30.0) == 1
+
+
+def test_only_a_better_score_moves_a_student():
+    distribution = PaperDistribution({1: 10.0, 2: 20.0, 3: 15.0})
+
+    distribution.record(1, 5.0)
+    distribution.record(1, 25.0)
+    distribution.record(4, 12.0)
+
+    assert distribution.top(2) == [(1, 25.0), (2, 20.0)]
+    assert distribution.sorted[0].tolist() == [12.0, 15.0, 20.0, 25.0]
+    assert len(distribution) == 4
+
+
+def test_incremental_updates_match_a_full_rebuild():
+    rng = np.random.default_rng(7)
+    best = {}
+    distribution = PaperDistribution({})
+    for user_id, score in zip(rng.integers(0, 50, 500), rng.integers(0, 100, 500)):
+        user_id, score = int(user_id), float(score)
+        distribution.record(user_id, score)
+        best[user_id] = max(score, best.get(user_id, score))
+
+    rebuilt = PaperDistribution(best)
+    assert distribution.sorted[0].tolist() == rebuilt.sorted[0].tolist()
+    assert sorted(distribution.top(len(best))) == sorted(rebuilt.top(len(best)))
+    counts, edges = distribution.histogram(5, (0, 100))
+    assert counts == np.histogram(list(best.values()), bins=5, range=(0, 100))[0].tolist()
+    assert edges == [0, 20, 40, 60, 80, 100]
+
+
+def test_leaderboard_loads_from_rollups_and_applies_new_attempts():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[PaperScore.__table__])
+    db = sessionmaker(bind=engine)()
+    for user_id, best in ((None, 9.0), (1, 4.0), (2, 9.0)):
+        db.add(PaperScore(paper_id=1, user_id=user_id, best_score=best, created_by_id=1))
+    db.commit()
+    board = Leaderboard()
+
+    board.record_score(1, 3, 7.0)
+    assert board.distribution(db, 1).top(5) == [(2, 9.0), (1, 4.0)]
+    board.record_score(1, 3, 7.0)
+
+    assert board.distribution(db, 1).top(5) == [(2, 9.0), (3, 7.0), (1, 4.0)]
+    db.close()
@@ -0,0 +1,186 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+from datetime import date, datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from app.dashboard.teacherDashboard import get_user_response_details
+from app.models import Invoice, PaymentHistory, QuestionPaper, ResultSummary, Subject
+from app.pagination import PageParams, encode_cursor, paginate
+from app.payment.paymentApi import get_invoices
+from app.questions.questionPaperApi import QUESTION_PAPER_LIST
+from app.subject.subjectApi import SUBJECT_LIST
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine, tables=[Subject.__table__, QuestionPaper.__table__]
+    )
+    session = sessionmaker(bind=engine)()
+    session.add(Subject(id=1, subject_name="Maths", subject_code="M", created_by_id=1))
+    session.add_all(
+        QuestionPaper(
+            id=paper_id,
+            assessment_specification="spec",
+            topic_name=f"paper {paper_id}",
+            year=2015 + paper_id % 4,
+            subject_id=1,
+            deleted=1 if paper_id == 7 else 0,
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+        )
+        for paper_id in range(1, 24)
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+def page(cursor=None, limit=5, sort=None, fields=None):
+    return PageParams(cursor=cursor, limit=limit, sort=sort, fields=fields)
+
+
+def walk(db, sort, fields=None):
+    query = db.query(QuestionPaper).filter(QuestionPaper.deleted == 0)
+    items, cursor = [], None
+    while True:
+        result = paginate(query, QUESTION_PAPER_LIST, page(cursor, sort=sort, fields=fields))
+        items += result["data"]
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_cursor_walk_returns_every_row_once_in_order(db):
+    ids = [item["id"] for item in walk(db, "id")]
+    assert ids == [i for i in range(1, 24) if i != 7]
+
+    by_year = walk(db, "-year", fields="id,year")
+    assert [(item["year"], item["id"]) for item in by_year] == sorted(
+        ((2015 + i % 4, i) for i in range(1, 24) if i != 7), reverse=True
+    )
+    assert set(by_year[0]) == {"id", "year"}
+
+
+def test_equal_sort_values_are_split_by_the_tiebreaker(db):
+    db.add_all(
+        Subject(id=subject_id, subject_name=name, subject_code=name[0], created_by_id=1)
+        for subject_id, name in ((2, "Biology"), (3, "Maths"), (4, "Biology"), (5, "Art"))
+    )
+    db.commit()
+    query = db.query(Subject)
+    for sort, expected in (
+        ("subject_name", [5, 2, 4, 1, 3]),
+        ("-subject_name", [3, 1, 4, 2, 5]),
+    ):
+        ids, cursor = [], None
+        while True:
+            result = paginate(query, SUBJECT_LIST, page(cursor, limit=2, sort=sort, fields="id"))
+            ids += [item["id"] for item in result["data"]]
+            cursor = result["next_cursor"]
+            if cursor is None:
+                break
+        assert ids == expected
+
+
+def test_bad_parameters_are_rejected(db):
+    query = db.query(QuestionPaper)
+    for params in (
+        page(sort="topic_name"),
+        page(fields="id,secret"),
+        page(cursor="not a cursor"),
+        # A cursor only continues the sort it was issued for
+        page(cursor=encode_cursor("id", [3]), sort="year"),
+    ):
+        with pytest.raises(HTTPException) as error:
+            paginate(query, QUESTION_PAPER_LIST, params)
+        assert error.value.status_code == 400
+
+
+def walk_endpoint(endpoint, **kwargs):
+    items, cursor = [], None
+    while True:
+        result = endpoint(page=page(cursor, limit=2), user_data={"id": 1}, **kwargs)
+        items += result["data"]
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_invoice_list_walks_newest_first(db):
+    Base.metadata.create_all(
+        db.get_bind(), tables=[PaymentHistory.__table__, Invoice.__table__]
+    )
+    db.add(
+        PaymentHistory(
+            id=1,
+            payment_date=date(2024, 1, 1),
+            total_amount=10,
+            status="paid",
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+            stripe_checkout_id="cs_1",
+            stripe_transaction_status="complete",
+        )
+    )
+    for invoice_id, user_id, payment_date in (
+        (1, 1, date(2024, 1, 1)),
+        (2, 1, date(2024, 3, 1)),
+        (3, 2, date(2024, 5, 1)),
+        (4, 1, date(2024, 3, 1)),
+        (5, 1, date(2024, 2, 1)),
+    ):
+        db.add(
+            Invoice(
+                id=invoice_id,
+                payment_id=1,
+                payment_date=payment_date,
+                status="paid",
+                created_by_id=user_id,
+                stripe_invoice_id=f"in_{invoice_id}",
+            )
+        )
+    db.commit()
+
+    invoices = walk_endpoint(get_invoices, user_id=1, db=db)
+
+    assert [item["invoice"]["id"] for item in invoices] == [4, 2, 5, 1]
+    assert invoices[0]["amount_paid"] == 10
+
+
+def test_student_dashboard_walks_newest_attempt_first(db):
+    Base.metadata.create_all(db.get_bind(), tables=[ResultSummary.__table__])
+    for summary_id, user_id, created_at in (
+        (1, 1, datetime(2024, 1, 1)),
+        (2, 1, datetime(2024, 1, 3)),
+        (3, 1, datetime(2024, 1, 3)),
+        (4, 2, datetime(2024, 1, 4)),
+        (5, 1, datetime(2024, 1, 2)),
+    ):
+        db.add(
+            ResultSummary(
+                id=summary_id,
+                user_response_id=summary_id * 10,
+                user_id=user_id,
+                question_paper_id=1,
+                subject_id=1,
+                attempted=1,
+                correct=1,
+                wrong=0,
+                created_at=created_at,
+                updated_at=created_at,
+                created_by_id=user_id,
+            )
+        )
+    db.commit()
+
+    attempts = walk_endpoint(get_user_response_details, user_id=1, db=db)
+
+    assert [item["result_id"] for item in attempts] == [30, 20, 50, 10]
+    assert attempts[0]["subject_name"] == "Maths"
@@ -0,0 +1,53 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from app.models import StripePayload
+from app.payment.payloadArchive import (
+    CHECKOUT_SESSION_PAYLOAD,
+    PAYMENT_HISTORY_OWNER,
+    PAYMENT_INTENT_PAYLOAD,
+    archive_payload,
+    compress_payload,
+    decompress_payload,
+    load_payloads,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[StripePayload.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_payload_round_trip_is_smaller_than_json():
+    payload = {
+        "id": "cs_1",
+        "object": "checkout.session",
+        "line_items": [{"price": "price_1", "quantity": 1}] * 50,
+    }
+    data = compress_payload(payload)
+    assert decompress_payload(data) == payload
+    assert len(data) < len(str(payload)) / 4
+
+
+def test_payloads_are_loaded_per_owner(db):
+    archive_payload(db, PAYMENT_HISTORY_OWNER, 1, CHECKOUT_SESSION_PAYLOAD, {"id": "cs_1"})
+    archive_payload(db, PAYMENT_HISTORY_OWNER, 1, PAYMENT_INTENT_PAYLOAD, {"id": "pi_1"})
+    archive_payload(db, PAYMENT_HISTORY_OWNER, 2, CHECKOUT_SESSION_PAYLOAD, {"id": "cs_2"})
+    db.commit()
+
+    assert load_payloads(db, PAYMENT_HISTORY_OWNER, 1) == {
+        "checkout_session": {"id": "cs_1"},
+        "payment_intent": {"id": "pi_1"},
+    }
+    assert db.query(StripePayload.stripe_object_id).filter(
+        StripePayload.owner_id == 2
+    ).scalar() == "cs_2"
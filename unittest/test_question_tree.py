@@ -0,0 +1,264 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.models import Options, Question, QuestionPaper, Section
+from app.params import ESSAY_QUESTION_TYPE_ID
+from app.questions.question import get_essay_questions
+from app.questions.tree import (
+    load_paper_question_tree,
+    load_question_tree,
+    path_segment,
+    subtree_mark_totals,
+)
+from database import Base
+
+MULTIPLE_CHOICE_TYPE_ID = 1
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            QuestionPaper.__table__,
+            Section.__table__,
+            Question.__table__,
+            Options.__table__,
+        ],
+    )
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def query_count(db):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", count)
+    yield statements
+    event.remove(db.get_bind(), "before_cursor_execute", count)
+
+
+def add_question(db, paper, section, number, parent=None, label="", **fields):
+    question = Question(
+        paper_id=paper.id,
+        parent_id=parent.id if parent else None,
+        question_text=f"Question {number}{label}",
+        question_type_id=fields.pop("question_type_id", ESSAY_QUESTION_TYPE_ID),
+        question_number=number,
+        subquestion_label=label,
+        subject_id=paper.subject_id,
+        section_id=section.id,
+        mark=fields.pop("mark", 2),
+        source_text="",
+        created_by_id=1,
+        **fields,
+    )
+    db.add(question)
+    db.flush()
+    return question
+
+
+def seed_paper(db, subject_id=1, questions=3):
+    paper = QuestionPaper(
+        assessment_specification="Paper 1",
+        topic_name="Topic",
+        year=2023,
+        subject_id=subject_id,
+        created_by_id=1,
+    )
+    db.add(paper)
+    db.flush()
+    section = Section(
+        name="Section A", description="Answer all", question_paper_id=paper.id, created_by_id=1
+    )
+    db.add(section)
+    db.flush()
+    for number in range(questions, 0, -1):
+        parent = add_question(db, paper, section, number, prompt_text=f"Prompt {number}")
+        for label in ("a", "b"):
+            child = add_question(
+                db,
+                paper,
+                section,
+                number,
+                parent=parent,
+                label=label,
+                question_type_id=MULTIPLE_CHOICE_TYPE_ID,
+            )
+            for option_label, is_correct in (("A", True), ("B", False)):
+                db.add(
+                    Options(
+                        text=f"{option_label} of {child.id}",
+                        option_label=option_label,
+                        is_correct=is_correct,
+                        score=1,
+                        question_id=child.id,
+                        created_by_id=1,
+                    )
+                )
+    db.commit()
+    return paper
+
+
+def test_tree_loads_only_the_papers_questions_in_two_queries(db, query_count):
+    paper = seed_paper(db, questions=5)
+    other = seed_paper(db, questions=2)
+    query_count.clear()
+
+    tree = load_question_tree(db, paper.id, paper.subject_id)
+
+    assert len(query_count) == 2
+    assert [q.question_number for q in tree.roots] == [1, 2, 3, 4, 5]
+    assert all(q.paper_id == paper.id for q in tree.questions.values())
+    assert not set(tree.questions) & set(load_question_tree(db, other.id).questions)
+    first = tree.roots[0]
+    assert [q.subquestion_label for q in tree.children_of(first.id)] == ["a", "b"]
+    assert [o.option_label for o in tree.options_of(tree.children_of(first.id)[0].id)] == [
+        "A",
+        "B",
+    ]
+
+
+def test_query_count_does_not_grow_with_the_number_of_questions(db, query_count):
+    small = seed_paper(db, questions=1)
+    large = seed_paper(db, questions=20)
+
+    query_count.clear()
+    load_paper_question_tree(db, small.id, small.subject_id)
+    small_queries = len(query_count)
+    query_count.clear()
+    load_paper_question_tree(db, large.id, large.subject_id)
+
+    assert small_queries == len(query_count) == 4
+
+
+def test_deleted_parent_hides_its_subquestions(db):
+    paper = seed_paper(db, questions=2)
+    tree = load_question_tree(db, paper.id)
+    tree.roots[0].deleted = 1
+    db.commit()
+
+    tree = load_question_tree(db, paper.id)
+
+    assert [q.question_number for q in tree.roots] == [2]
+    assert {
+        child.question_number
+        for root in tree.roots
+        for child in tree.children_of(root.id)
+    } == {2}
+
+
+def test_get_essay_questions_groups_subquestions_under_their_parent(db, query_count):
+    paper = seed_paper(db, questions=2)
+    seed_paper(db, questions=2)
+    query_count.clear()
+
+    result = get_essay_questions(paper.id, paper.subject_id, user_data={}, db=db)
+
+    assert len(query_count) == 4
+    [paper_data] = result["data"]["questions"]
+    [section] = paper_data["sections"]
+    assert [q["question_text"] for q in section["questions"]] == [
+        "Question 1",
+        "Question 2",
+    ]
+    assert [s["question_text"] for s in section["questions"][0]["sub_questions"]] == [
+        "Question 1a",
+        "Question 1b",
+    ]
+    assert [p["value"] for p in result["prompt"]] == ["Prompt 1", "Prompt 2"]
+
+
+def test_get_essay_questions_unknown_paper_returns_404(db):
+    response = get_essay_questions(999, 1, user_data={}, db=db)
+
+    assert response.status_code == 404
+
+
+def test_paths_are_maintained_on_insert_and_move(db):
+    paper = seed_paper(db, questions=2)
+    first, second = load_question_tree(db, paper.id).roots
+    part = load_question_tree(db, paper.id).children_of(first.id)[0]
+    section = db.query(Section).first()
+    sub_part = add_question(db, paper, section, 1, parent=part, label="i", mark=3)
+    db.commit()
+
+    assert first.path == path_segment(first.id)
+    assert part.path == first.path + path_segment(part.id)
+    assert (sub_part.path, sub_part.depth) == (part.path + path_segment(sub_part.id), 2)
+
+    part.parent_id = second.id
+    db.commit()
+    db.expire_all()
+
+    assert part.path == second.path + path_segment(part.id)
+    assert (sub_part.path, sub_part.depth) == (part.path + path_segment(sub_part.id), 2)
+
+
+def test_question_cannot_move_under_its_own_subquestion(db):
+    paper = seed_paper(db, questions=1)
+    tree = load_question_tree(db, paper.id)
+    root = tree.roots[0]
+    root.parent_id = tree.children_of(root.id)[0].id
+
+    with pytest.raises(ValueError):
+        db.commit()
+
+
+def test_subtree_mark_totals_are_a_single_query(db, query_count):
+    paper = seed_paper(db, questions=2)
+    tree = load_question_tree(db, paper.id)
+    first = tree.roots[0]
+    part = tree.children_of(first.id)[0]
+    section = db.query(Section).first()
+    add_question(db, paper, section, 1, parent=part, label="i", mark=3)
+    db.commit()
+    query_count.clear()
+
+    totals = subtree_mark_totals(db, paper.id)
+
+    # One query finds no missing path, one adds up the marks
+    assert len(query_count) == 2
+    assert totals == {first.id: 9, tree.roots[1].id: 6}
+
+
+def test_questions_imported_without_paths_are_filled_before_totals(db):
+    paper = seed_paper(db, questions=1)
+    section = db.query(Section).first()
+    root_id = load_question_tree(db, paper.id).roots[0].id
+    imported = {
+        "paper_id": paper.id,
+        "parent_id": None,
+        "question_text": "Imported",
+        "question_type_id": ESSAY_QUESTION_TYPE_ID,
+        "subject_id": paper.subject_id,
+        "section_id": section.id,
+        "source_text": "",
+        "created_by_id": 1,
+    }
+    # Written with plain SQL, as an external import does, so no listener sets the paths
+    db.execute(
+        Question.__table__.insert(),
+        [
+            dict(imported, id=100, question_number=2, subquestion_label="", mark=1),
+            dict(imported, id=101, parent_id=100, question_number=2, subquestion_label="a", mark=4),
+            dict(imported, id=102, parent_id=101, question_number=2, subquestion_label="i", mark=5),
+            dict(imported, id=103, parent_id=root_id, question_number=1, subquestion_label="c", mark=7),
+        ],
+    )
+    db.commit()
+
+    assert subtree_mark_totals(db, paper.id) == {root_id: 13, 100: 10}
+    paths = dict(db.query(Question.id, Question.path).filter(Question.id >= 100))
+    assert paths[102] == path_segment(100) + path_segment(101) + path_segment(102)
+    assert paths[103] == path_segment(root_id) + path_segment(103)
@@ -0,0 +1,187 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import asyncio
+import csv
+import io
+import tempfile
+import zipfile
+from datetime import date, datetime
+import pytest
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.dashboard import resultExport
+from app.dashboard.teacherDashboard import export_class_results
+from app.models import QuestionPaper, ResultSummary, Subject, User
+from database import Base
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    metadata = MetaData()
+    user_table = User.__table__.to_metadata(metadata)
+    # SQLite has no ON UPDATE clause
+    user_table.c.updated_at.server_default = None
+    metadata.create_all(engine)
+    Base.metadata.create_all(
+        engine,
+        tables=[Subject.__table__, QuestionPaper.__table__, ResultSummary.__table__],
+    )
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.execute(
+        User.__table__.insert(),
+        [
+            {"id": 1, "name": "Ada", "email": "ada@example.com", "authentication_type": "google"},
+            {"id": 2, "name": "Alan", "email": "alan@example.com", "authentication_type": "google"},
+        ],
+    )
+    db.add_all(
+        [
+            Subject(id=1, subject_name="Physics", subject_code="PHY", created_by_id=1),
+            Subject(id=2, subject_name="Biology", subject_code="BIO", created_by_id=1),
+            QuestionPaper(
+                id=1,
+                assessment_specification="Paper 1",
+                topic_name="Topic",
+                year=2023,
+                subject_id=1,
+                created_by_id=1,
+            ),
+            QuestionPaper(
+                id=2,
+                assessment_specification="Paper 2",
+                topic_name="Topic",
+                year=2024,
+                subject_id=2,
+                created_by_id=1,
+            ),
+        ]
+    )
+    for user_response_id, user_id, subject_id, paper_id, submitted_at in (
+        (10, 1, 1, 1, datetime(2026, 3, 1, 9, 30)),
+        (11, 2, 1, 1, datetime(2026, 3, 2, 23, 59)),
+        (12, 1, 2, 2, datetime(2026, 3, 3, 8, 0)),
+    ):
+        db.add(
+            ResultSummary(
+                user_response_id=user_response_id,
+                user_id=user_id,
+                question_paper_id=paper_id,
+                subject_id=subject_id,
+                year=2023,
+                attempted=5,
+                correct=3,
+                wrong=2,
+                score=6.0,
+                time_taken={"minutes": 12},
+                created_at=submitted_at,
+                updated_at=submitted_at,
+                created_by_id=user_id,
+            )
+        )
+    db.commit()
+    db.close()
+    monkeypatch.setattr(resultExport, "SessionLocal", session_factory)
+    return session_factory
+
+
+def read_csv(**filters):
+    return list(csv.reader(io.StringIO("".join(resultExport.export_results_csv(**filters)))))
+
+
+def streamed_body(response):
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(collect())
+    return b"".join(chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in chunks)
+
+
+def test_csv_export_has_a_header_and_one_row_per_result(sessions):
+    rows = read_csv()
+
+    assert rows[0] == resultExport.EXPORT_COLUMNS
+    assert rows[1] == [
+        "10",
+        "1",
+        "Ada",
+        "ada@example.com",
+        "Physics",
+        "Paper 1",
+        "2023",
+        "5",
+        "3",
+        "2",
+        "6.0",
+        '{"minutes": 12}',
+        "2026-03-01 09:30:00",
+    ]
+    assert [row[0] for row in rows[1:]] == ["10", "11", "12"]
+
+
+def test_csv_export_is_flushed_in_batches(sessions, monkeypatch):
+    monkeypatch.setattr(resultExport, "EXPORT_BATCH_SIZE", 2)
+
+    chunks = list(resultExport.export_results_csv())
+
+    assert len(chunks) == 2
+    assert len(list(csv.reader(io.StringIO("".join(chunks))))) == 4
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"subject_id": 1}, ["10", "11"]),
+        ({"paper_id": 2}, ["12"]),
+        ({"date_from": date(2026, 3, 2)}, ["11", "12"]),
+        ({"date_to": date(2026, 3, 2)}, ["10", "11"]),
+        ({"subject_id": 1, "date_from": date(2026, 3, 2)}, ["11"]),
+    ],
+)
+def test_csv_export_filters(sessions, filters, expected):
+    assert [row[0] for row in read_csv(**filters)[1:]] == expected
+
+
+def test_xlsx_export_is_a_workbook_and_its_temporary_file_is_removed(sessions, monkeypatch):
+    created = []
+    real_mkstemp = tempfile.mkstemp
+
+    def mkstemp(**kwargs):
+        handle, path = real_mkstemp(**kwargs)
+        created.append(path)
+        return handle, path
+
+    monkeypatch.setattr(resultExport.tempfile, "mkstemp", mkstemp)
+
+    content = b"".join(resultExport.export_results_xlsx(subject_id=1))
+
+    with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+    # Constant memory mode writes inline strings into the sheet
+    assert sheet.count("<row ") == 3
+    assert "Ada" in sheet and "Alan" in sheet and "Biology" not in sheet
+    # XlsxWriter creates temporary files of its own through the same function
+    assert created[0].endswith(".xlsx")
+    assert not any(os.path.exists(path) for path in created)
+
+
+def test_export_endpoint_streams_the_requested_format(sessions):
+    response = export_class_results(
+        file_format="csv", subject_id=None, paper_id=2, date_from=None, date_to=None, user_data={}
+    )
+    assert response.media_type == "text/csv"
+    rows = list(csv.reader(io.StringIO(streamed_body(response).decode())))
+    assert [row[0] for row in rows] == ["Result ID", "12"]
+
+    response = export_class_results(
+        file_format="xlsx", subject_id=None, paper_id=None, date_from=None, date_to=None, user_data={}
+    )
+    assert response.headers["content-disposition"] == 'attachment; filename="class_results.xlsx"'
+    with zipfile.ZipFile(io.BytesIO(streamed_body(response))) as workbook:
+        assert workbook.read("xl/worksheets/sheet1.xml").decode().count("<row ") == 4
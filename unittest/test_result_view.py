@@ -0,0 +1,103 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import CatalogVersion, Options, Question, ResultSummary, UserResponse
+from app.questions import question as question_module
+from app.questions.OptionsApi import update_options
+from app.questions.basemodel import CreateOptions
+from app.questions.question import get_response_result_view
+from app.questions.summary import result_summary_payload
+from database import Base
+
+
+@pytest.fixture
+def db():
+    question_module.result_view_cache.clear()
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            CatalogVersion.__table__,
+            Question.__table__,
+            Options.__table__,
+            UserResponse.__table__,
+        ],
+    )
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(
+        Question(
+            id=1,
+            paper_id=1,
+            question_text="<p>Which gas do plants absorb?</p>",
+            question_type_id=1,
+            question_number=1,
+            subquestion_label="",
+            subject_id=1,
+            section_id=1,
+            mark=2,
+            source_text="",
+            created_by_id=1,
+        )
+    )
+    session.flush()
+    session.add_all(
+        [
+            Options(id=1, text="Oxygen", is_correct=True, score=1, question_id=1, created_by_id=1),
+            Options(id=2, text="Carbon dioxide", is_correct=False, score=0, question_id=1, created_by_id=1),
+            UserResponse(
+                id=10,
+                user_id=1,
+                question_paper_id=1,
+                user_response={
+                    "paper_id": 1,
+                    "exam_mode": "instant",
+                    "responses": [{"id": 1, "answer": 2}],
+                },
+                created_by_id=1,
+            ),
+        ]
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_cached_view_follows_answer_key_edits(db):
+    view = get_response_result_view(10, db=db, user_data={})
+    assert view["answers"][0]["correct_answer"] == 1
+    assert view["answers"][0]["rating"] == 0
+    assert get_response_result_view(10, db=db, user_data={}) is view
+
+    # The wrong key is corrected after the response was graded
+    for option_id, text, is_correct in ((1, "Oxygen", False), (2, "Carbon dioxide", True)):
+        update_options(
+            option_id,
+            CreateOptions(
+                text=text,
+                option_label="",
+                is_correct=is_correct,
+                score=1 if is_correct else 0,
+                feedback="",
+                question_id=1,
+            ),
+            db=db,
+            user_data={},
+        )
+
+    view = get_response_result_view(10, db=db, user_data={})
+    assert view["answers"][0]["correct_answer"] == 2
+    assert view["answers"][0]["rating"] == 1
+    assert view["answers"][0]["mark"] == 2
+
+
+def test_summary_keeps_total_score_as_the_correct_count():
+    summary = ResultSummary(
+        user_response_id=10, attempted=4, correct=3, wrong=1, score=7.5, time_taken="00:10"
+    )
+    payload = result_summary_payload(summary)
+    assert payload["totalScore"] == 3
+    assert payload["score"] == 7.5
@@ -0,0 +1,92 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.login import auth
+from app.models import Endpoint, Role, User
+from app.rolemanagement.api import UserRoleUpdate, update_user_roles
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    user_table = User.__table__.to_metadata(metadata)
+    # SQLite has no ON UPDATE clause
+    user_table.c.updated_at.server_default = None
+    Role.__table__.to_metadata(metadata)
+    Endpoint.__table__.to_metadata(metadata)
+    metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(
+        Role.__table__.insert(),
+        [
+            {"id": role_id, "name": f"role {role_id}", "created_by_id": 1}
+            for role_id in (1, 2, 3)
+        ],
+    )
+    session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "id": user_id,
+                "email": f"user{user_id}@example.com",
+                "authentication_type": "google",
+                "role_id": 1,
+                "deleted": 0,
+                "record_status": 1,
+            }
+            for user_id in range(1, 101)
+        ],
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_roster_is_updated_with_a_fixed_number_of_statements(db):
+    statements = []
+    event.listen(
+        db.get_bind(),
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    request = [
+        UserRoleUpdate(user_id=user_id, new_role_id=2 if user_id % 2 else 3)
+        for user_id in range(1, 101)
+    ]
+    request += [
+        UserRoleUpdate(user_id=500, new_role_id=2),
+        UserRoleUpdate(user_id=1, new_role_id=9),
+    ]
+
+    response = update_user_roles(request, db=db, user_data={})["data"]
+
+    assert len(response["updated"]) == 100
+    assert response["errors"] == [
+        {"user_id": 500, "error": "User not found"},
+        {"user_id": 1, "error": "Role not found"},
+    ]
+    # Two lookups and one UPDATE per target role
+    assert len(statements) == 4
+    roles = dict(db.query(User.id, User.role_id).all())
+    assert roles[1] == 2 and roles[2] == 3
+
+
+def test_role_changes_apply_to_the_next_request(db):
+    db.add(Endpoint(url="/students/list", default_role_access_id=1, created_by_id=1))
+    db.commit()
+    request = SimpleNamespace(url=SimpleNamespace(path="/students/list"))
+    bearer = auth.JWTBearer()
+    bearer.has_permissions(1, request, db)
+
+    update_user_roles([UserRoleUpdate(user_id=1, new_role_id=2)], db=db, user_data={})
+
+    with pytest.raises(HTTPException) as error:
+        bearer.has_permissions(1, request, db)
+    assert error.value.status_code == 400
@@ -0,0 +1,69 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.dashboard.scoreRollup import apply_score, record_paper_score, score_std_dev
+from app.dashboard.teacherDashboard import get_class_statistics
+from app.models import PaperScore, QuestionPaper
+from database import Base
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine, tables=[QuestionPaper.__table__, PaperScore.__table__]
+    )
+    session = sessionmaker(bind=engine)()
+    session.add(
+        QuestionPaper(
+            id=1,
+            assessment_specification="Paper 1",
+            topic_name="Topic",
+            year=2023,
+            subject_id=3,
+            created_by_id=1,
+        )
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_running_mean_and_variance_match_a_full_recomputation():
+    scores = [12.0, 7.5, 19.0, 3.0, 7.5, 14.25]
+    rollup = PaperScore()
+    for score in scores:
+        apply_score(rollup, score)
+
+    assert rollup.attempt_count == len(scores)
+    assert rollup.best_score == max(scores)
+    assert rollup.latest_score == scores[-1]
+    assert rollup.mean_score == pytest.approx(np.mean(scores))
+    assert score_std_dev(rollup) == pytest.approx(np.std(scores))
+
+
+def test_submissions_update_student_and_paper_rollups(db):
+    attempts = [(10, 4.0), (10, 9.0), (11, 6.0), (12, 2.0), (11, 1.0)]
+    for user_id, score in attempts:
+        record_paper_score(db, 1, user_id, score, user_id)
+        db.commit()
+    record_paper_score(db, 1, 13, None, 13)
+    db.commit()
+
+    student = db.query(PaperScore).filter_by(paper_id=1, user_id=11).one()
+    assert (student.attempt_count, student.best_score, student.latest_score) == (2, 6.0, 1.0)
+
+    [paper] = get_class_statistics(subject_id=3, db=db, user_data={})
+    scores = [score for _, score in attempts]
+    assert paper["student_count"] == 3
+    assert paper["attempt_count"] == len(scores)
+    assert paper["best_score"] == 9.0
+    assert paper["latest_score"] == 1.0
+    assert paper["mean_score"] == pytest.approx(np.mean(scores))
+    assert paper["std_dev"] == pytest.approx(np.std(scores))
+    assert get_class_statistics(subject_id=4, db=db, user_data={}) == []
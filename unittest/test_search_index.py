@@ -0,0 +1,207 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models import Options, Question, QuestionPaper, SearchChange
+from app.questions import searchIndex
+from app.questions.searchIndex import SearchIndex, build_search_index, tokenize
+from database import Base
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            QuestionPaper.__table__,
+            Question.__table__,
+            Options.__table__,
+            SearchChange.__table__,
+        ],
+    )
+    sessions = sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(searchIndex, "SessionLocal", sessions)
+    monkeypatch.setattr(searchIndex, "search_index", None)
+    monkeypatch.setattr(searchIndex, "search_index_position", 0)
+    # Every change is committed at once here
+    monkeypatch.setattr(searchIndex, "SEARCH_CHANGE_SETTLE_SECONDS", 0)
+    return sessions
+
+
+def add_paper(db, paper_id, year, subject_id=1):
+    db.add(
+        QuestionPaper(
+            id=paper_id,
+            assessment_specification="spec",
+            topic_name="topic",
+            year=year,
+            subject_id=subject_id,
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+        )
+    )
+
+
+def add_question(db, question_id, paper_id, text, subject_id=1, source_text=""):
+    db.add(
+        Question(
+            id=question_id,
+            paper_id=paper_id,
+            question_text=text,
+            question_type_id=1,
+            question_number=question_id,
+            subquestion_label="",
+            subject_id=subject_id,
+            section_id=1,
+            mark=1,
+            source_text=source_text,
+            created_at=datetime(2024, 1, 1),
+            created_by_id=1,
+        )
+    )
+
+
+def seed(db):
+    add_paper(db, 1, 2020)
+    add_paper(db, 2, 2021, subject_id=2)
+    add_question(db, 1, 1, "<p>Explain <b>photosynthesis</b> in plants.</p>")
+    add_question(db, 2, 1, "<p>Photosynthesis and respiration: photosynthesis stores energy</p>")
+    add_question(db, 3, 2, "<p>Describe the water cycle</p>", subject_id=2, source_text="Rain")
+    db.flush()
+    db.add(
+        Options(id=1, text="Chlorophyll", is_correct=True, score=1, question_id=3, created_by_id=1)
+    )
+    db.commit()
+
+
+def test_tokenize_strips_html_and_stopwords():
+    assert tokenize("<p>The &amp; <i>Water</i>-cycle of 2020</p>") == ["water", "cycle", "2020"]
+
+
+def test_search_ranks_and_filters(sessions):
+    db = sessions()
+    seed(db)
+    index = build_search_index(db)
+
+    results = index.search("photosynthesis")
+    assert [result["question_id"] for result in results] == [2, 1]
+    assert results[0]["snippet"].startswith("Photosynthesis and respiration")
+    assert [r["question_id"] for r in index.search("chlorophyll rain")] == [3]
+    assert index.search("photosynthesis", year=2021) == []
+    assert index.search("water", subject_id=2)[0]["year"] == 2021
+    assert index.search("water", paper_id=1) == []
+
+
+def test_committed_writes_update_the_index(sessions):
+    db = sessions()
+    seed(db)
+    searchIndex.search_index = build_search_index(db)
+
+    question = db.query(Question).get(1)
+    question.question_text = "<p>Explain osmosis</p>"
+    db.add(Options(id=2, text="Osmosis membrane", is_correct=True, score=1, question_id=2, created_by_id=1))
+    db.commit()
+    assert [r["question_id"] for r in searchIndex.search_index.search("osmosis")] == [1, 2]
+    assert [r["question_id"] for r in searchIndex.search_index.search("photosynthesis")] == [2]
+
+    db.query(Question).get(2).deleted = 1
+    db.commit()
+    assert [r["question_id"] for r in searchIndex.search_index.search("osmosis")] == [1]
+
+    # Rolled back writes never reach the index
+    db.query(Question).get(1).question_text = "<p>Volcanoes</p>"
+    db.flush()
+    db.rollback()
+    assert searchIndex.search_index.search("volcanoes") == []
+
+
+def test_persisted_index_is_caught_up_with_the_change_log(sessions, tmp_path, monkeypatch):
+    path = str(tmp_path / "index.json.gz")
+    db = sessions()
+    seed(db)
+
+    searchIndex.load_or_build_search_index(path)
+    assert os.path.exists(path)
+    assert len(searchIndex.search_index) == 3
+
+    # Written while this process was down
+    add_question(db, 4, 1, "<p>Explain osmosis</p>")
+    db.commit()
+
+    def build_search_index(db):
+        raise AssertionError("the persisted index should be reused")
+
+    monkeypatch.setattr(searchIndex, "build_search_index", build_search_index)
+    searchIndex.search_index = None
+    searchIndex.load_or_build_search_index(path)
+    assert len(searchIndex.search_index) == 4
+    assert searchIndex.search_index.search("osmosis")[0]["question_id"] == 4
+    assert searchIndex.search_index.search("chlorophyll")[0]["question_id"] == 3
+
+
+def test_refresh_applies_changes_made_elsewhere_without_rebuilding(sessions, tmp_path, monkeypatch):
+    path = str(tmp_path / "index.json.gz")
+    db = sessions()
+    seed(db)
+    searchIndex.load_or_build_search_index(path)
+    builds = []
+    monkeypatch.setattr(
+        searchIndex, "build_search_index", lambda db: builds.append(1) or SearchIndex()
+    )
+
+    assert searchIndex.refresh_search_index(path) is False
+
+    # Written by another process, so the after-commit hook of this one never sees it. The text
+    # keeps the length of the old one.
+    db.execute(
+        Question.__table__.update()
+        .where(Question.id == 3)
+        .values(question_text="<p>Describe the ozone layer</p>")
+    )
+    db.execute(Options.__table__.update().where(Options.id == 1).values(question_id=1))
+    db.commit()
+    assert searchIndex.search_index.search("ozone") == []
+
+    assert searchIndex.refresh_search_index(path) is True
+    assert searchIndex.search_index.search("ozone")[0]["question_id"] == 3
+    assert searchIndex.search_index.search("chlorophyll")[0]["question_id"] == 1
+    assert searchIndex.refresh_search_index(path) is False
+
+    # Commits of this process are in the index at once and only read again, never rebuilt
+    db.query(Question).get(2).question_text = "<p>Explain osmosis</p>"
+    db.commit()
+    assert searchIndex.search_index.search("osmosis")[0]["question_id"] == 2
+    assert searchIndex.refresh_search_index(path) is True
+    assert searchIndex.refresh_search_index(path) is False
+    assert builds == []
+
+
+def test_pruned_change_log_rebuilds_the_index(sessions, tmp_path, monkeypatch):
+    path = str(tmp_path / "index.json.gz")
+    db = sessions()
+    seed(db)
+    searchIndex.load_or_build_search_index(path)
+
+    add_question(db, 4, 1, "<p>Explain osmosis</p>")
+    add_question(db, 5, 1, "<p>Explain diffusion</p>")
+    db.commit()
+    # Pruned up to a change after the position of the persisted index
+    pruned = (
+        db.query(func.max(SearchChange.id))
+        .filter(SearchChange.table_name == "question", SearchChange.row_id == 4)
+        .scalar()
+    )
+    db.query(SearchChange).filter(SearchChange.id <= pruned).delete()
+    db.commit()
+
+    searchIndex.search_index = None
+    searchIndex.load_or_build_search_index(path)
+    assert searchIndex.search_index.search("osmosis")[0]["question_id"] == 4
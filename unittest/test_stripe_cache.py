@@ -0,0 +1,43 @@
+import stripe
+from app.payment import stripeCache
+
+
+def counting(objects):
+    calls = []
+
+    def retrieve(object_id):
+        calls.append(object_id)
+        return stripe.StripeObject.construct_from(objects[object_id], "sk_test")
+
+    return retrieve, calls
+
+
+def test_only_final_objects_are_cached(monkeypatch):
+    stripeCache.stripe_cache.clear()
+    retrieve, calls = counting(
+        {
+            "pi_done": {"id": "pi_done", "status": "succeeded"},
+            "pi_open": {"id": "pi_open", "status": "processing"},
+        }
+    )
+    monkeypatch.setattr(stripe.PaymentIntent, "retrieve", retrieve)
+
+    for _ in range(3):
+        assert stripeCache.retrieve_payment_intent("pi_done")["status"] == "succeeded"
+        stripeCache.retrieve_payment_intent("pi_open")
+
+    assert calls == ["pi_done", "pi_open", "pi_open", "pi_open"]
+
+
+def test_sessions_are_cached_once_complete(monkeypatch):
+    stripeCache.stripe_cache.clear()
+    sessions = {"cs_1": {"id": "cs_1", "status": "open"}}
+    retrieve, calls = counting(sessions)
+    monkeypatch.setattr(stripe.checkout.Session, "retrieve", retrieve)
+
+    stripeCache.retrieve_checkout_session("cs_1")
+    sessions["cs_1"]["status"] = "complete"
+    stripeCache.retrieve_checkout_session("cs_1")
+    stripeCache.retrieve_checkout_session("cs_1")
+
+    assert calls == ["cs_1", "cs_1"]
@@ -0,0 +1,171 @@
+import os
+
+os.environ.setdefault("database_url", "sqlite://")
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+import stripe
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models import PaymentHistory, StripeEvent, StripePayload
+from app.payment import webhookWorker
+from database import Base
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine, tables=[StripeEvent.__table__])
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(webhookWorker, "SessionLocal", session_factory)
+    return session_factory
+
+
+def stored_event(event_id, created, event_type="checkout.session.completed"):
+    payload = {
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "created": created,
+        "data": {"object": {"customer": "cus_1"}},
+    }
+    return stripe.Event.construct_from(payload, "sk_test"), payload
+
+
+@pytest.fixture(autouse=True)
+def clear_recent_event_ids():
+    webhookWorker.recent_event_ids.clear()
+
+
+def test_events_are_handled_oldest_first(sessions, monkeypatch):
+    handled = []
+    monkeypatch.setattr(
+        webhookWorker, "handle_stripe_event", lambda db, event: handled.append(event["id"])
+    )
+    for event_id, created in (("evt_2", 200), ("evt_1", 100), ("evt_3", 300)):
+        webhookWorker.store_stripe_event(*stored_event(event_id, created))
+
+    assert webhookWorker.process_pending_events() == 3
+
+    assert handled == ["evt_1", "evt_2", "evt_3"]
+    db = sessions()
+    assert {e.status for e in db.query(StripeEvent)} == {webhookWorker.EVENT_PROCESSED}
+    assert webhookWorker.process_pending_events() == 0
+
+
+def test_failed_event_is_retried_with_backoff_then_given_up(sessions, monkeypatch):
+    def fail(db, event):
+        raise webhookWorker.WebhookEventError("USER NOT FOUND")
+
+    monkeypatch.setattr(webhookWorker, "handle_stripe_event", fail)
+    monkeypatch.setattr(webhookWorker, "WEBHOOK_MAX_ATTEMPTS", 2)
+    webhookWorker.store_stripe_event(*stored_event("evt_1", 100))
+
+    webhookWorker.process_pending_events()
+    db = sessions()
+    event = db.query(StripeEvent).one()
+    assert (event.status, event.attempts) == (webhookWorker.EVENT_PENDING, 1)
+    assert event.next_attempt_at > datetime.now()
+    assert event.last_error == "USER NOT FOUND"
+
+    # Not due yet
+    assert webhookWorker.process_pending_events() == 0
+    event.next_attempt_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+    webhookWorker.process_pending_events()
+    db.expire_all()
+    assert (event.status, event.attempts) == (webhookWorker.EVENT_FAILED, 2)
+
+
+def test_stale_processing_event_is_picked_up_again(sessions, monkeypatch):
+    handled = []
+    monkeypatch.setattr(
+        webhookWorker, "handle_stripe_event", lambda db, event: handled.append(event["id"])
+    )
+    webhookWorker.store_stripe_event(*stored_event("evt_1", 100))
+    webhookWorker.store_stripe_event(*stored_event("evt_2", 200))
+    db = sessions()
+    first, second = db.query(StripeEvent).order_by(StripeEvent.id).all()
+    first.status = second.status = webhookWorker.EVENT_PROCESSING
+    first.locked_at = datetime.now() - timedelta(hours=1)
+    second.locked_at = datetime.now()
+    db.commit()
+
+    webhookWorker.process_pending_events()
+
+    assert handled == ["evt_1"]
+
+
+def test_redelivered_event_is_stored_once(sessions, monkeypatch):
+    assert webhookWorker.store_stripe_event(*stored_event("evt_1", 100)) is not None
+    assert webhookWorker.store_stripe_event(*stored_event("evt_1", 100)) is None
+
+    # Another process, or a restart, without the cached id still hits the unique index
+    webhookWorker.recent_event_ids.clear()
+    assert webhookWorker.store_stripe_event(*stored_event("evt_1", 100)) is None
+    assert sessions().query(StripeEvent).count() == 1
+
+
+def test_applied_checkout_skips_every_stripe_call(sessions, monkeypatch):
+    engine = sessions.kw["bind"]
+    Base.metadata.create_all(engine, tables=[PaymentHistory.__table__])
+    db = sessions()
+    db.add(
+        PaymentHistory(
+            payment_date=datetime.now().date(),
+            total_amount=10,
+            status="paid",
+            created_at=datetime.now(),
+            created_by_id=1,
+            stripe_checkout_id="cs_1",
+            stripe_transaction_status="complete",
+        )
+    )
+    db.commit()
+
+    def no_stripe_call(*args, **kwargs):
+        raise AssertionError("Stripe must not be called")
+
+    monkeypatch.setattr(stripe.Customer, "retrieve", no_stripe_call)
+    event, _ = stored_event("evt_1", 100)
+    event["data"]["object"]["id"] = "cs_1"
+
+    webhookWorker.handle_stripe_event(db, event)
+
+
+def test_checkout_invoice_is_created_with_an_idempotency_key(sessions, monkeypatch):
+    engine = sessions.kw["bind"]
+    Base.metadata.create_all(
+        engine, tables=[PaymentHistory.__table__, StripePayload.__table__]
+    )
+    calls = []
+
+    def create_invoice(**kwargs):
+        calls.append(kwargs)
+        return stripe.Invoice.construct_from({"id": "in_1"}, "sk_test")
+
+    monkeypatch.setattr(stripe.Invoice, "create", create_invoice)
+    monkeypatch.setattr(
+        webhookWorker,
+        "retrieve_payment_intent",
+        lambda payment_intent_id: {
+            "id": payment_intent_id,
+            "amount_received": 1000,
+            "payment_method_types": ["card"],
+        },
+    )
+    event, _ = stored_event("evt_1", 100)
+    event["data"]["object"].update(
+        {"id": "cs_1", "payment_intent": "pi_1", "payment_status": "paid", "status": "complete"}
+    )
+    user_details = SimpleNamespace(id=1, stripe_id=None)
+    db = sessions()
+
+    webhookWorker.handle_checkout_completed(db, event, user_details)
+
+    assert calls[0]["idempotency_key"] == "checkout-invoice-cs_1"
+    assert db.query(PaymentHistory.stripe_invoice_id).scalar() == "in_1"